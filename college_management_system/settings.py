@@ -95,6 +95,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main_app.context_processors.inbox',
             ],
         },
     },
@@ -162,6 +163,26 @@ MEDIA_URL = '/media/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 AUTH_USER_MODEL = 'main_app.CustomUser'
+
+# Seconds to cache each student's dashboard (0 disables it). Use a cache
+# backend shared by all workers (e.g. Redis) so invalidation reaches them.
+STUDENT_DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('STUDENT_DASHBOARD_CACHE_TIMEOUT', 0))
+# Seconds to cache student transcripts and course rank lists (0 disables it);
+# the same shared-backend advice applies.
+TRANSCRIPT_CACHE_TIMEOUT = int(os.environ.get('TRANSCRIPT_CACHE_TIMEOUT', 0))
+
+# Push notifications are queued in NotificationOutbox and sent by
+# `python manage.py notification_worker`. Point NOTIFICATION_TRANSPORT at
+# main_app.notifications.LocalTransport to keep them in memory instead.
+NOTIFICATION_TRANSPORT = os.environ.get('NOTIFICATION_TRANSPORT', 'main_app.notifications.FCMTransport')
+FCM_SERVER_KEY = os.environ.get(
+    'FCM_SERVER_KEY',
+    'AAAA3Bm8j_M:APA91bElZlOLetwV696SoEtgzpJr2qbxBfxVBfDWFiopBWzfCfzQp2nRyC7_A2mlukZEHV4g1AmyC6P_HonvSkY2YyliKt5tT3fe_1lrKod2Daigzhb2xnYQMxUWjCAIQcUexAMPZePB',
+)
+
+# Chatbot ranking: 'legacy' (Jaccard + keywords) or 'bm25'. Compare them with
+# `python manage.py evaluate_chatbot`.
+CHATBOT_RANKER = os.environ.get('CHATBOT_RANKER', 'legacy')
 AUTHENTICATION_BACKENDS = ['main_app.EmailBackend.EmailBackend']
 TIME_ZONE = 'Asia/Kolkata'
 
@@ -4,11 +4,15 @@ from django.shortcuts import get_object_or_404, render
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-from .models import Subject, Student, StudentResult
+from .grading import grade_result
+from .middleware import get_profile
+from .models import Staff, Subject, Student, StudentResult
+from .permissions import STAFF, roles
 
+@roles(STAFF)
 class EditResultView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
-        staff = request.user.staff
+        staff = get_profile(request, Staff)
         subjects = Subject.objects.filter(staff=staff)
         context = {
             'subjects': subjects,
@@ -25,8 +29,6 @@ class EditResultView(LoginRequiredMixin, View):
             internal_marks = float(request.POST.get('internal_marks', 0))
             external_marks = float(request.POST.get('external_marks', 0))
             practical_marks = float(request.POST.get('practical_marks', 0))
-            total_marks = float(request.POST.get('total_marks', 0))
-            grade = request.POST.get('grade')
 
             # Validate required fields
             if not all([subject_id, student_id, semester, academic_year]):
@@ -40,35 +42,29 @@ class EditResultView(LoginRequiredMixin, View):
             student = get_object_or_404(Student, id=student_id)
 
             # Check if staff is authorized to edit this subject's results
-            if subject.staff != request.user.staff:
+            if subject.staff_id != get_profile(request, Staff).id:
                 return JsonResponse({
                     'status': 'error',
                     'message': 'You are not authorized to edit results for this subject'
                 }, status=403)
 
-            # Get or create result
-            result, created = StudentResult.objects.get_or_create(
+            # Get or create result; total and grade come from the grading engine
+            result = StudentResult.objects.filter(
                 student=student,
                 subject=subject,
                 semester=semester,
-                academic_year=academic_year,
-                defaults={
-                    'internal_marks': internal_marks,
-                    'external_marks': external_marks,
-                    'practical_marks': practical_marks,
-                    'total_marks': total_marks,
-                    'grade': grade
-                }
+                academic_year=academic_year
+            ).first() or StudentResult(
+                student=student,
+                subject=subject,
+                semester=semester,
+                academic_year=academic_year
             )
-
-            if not created:
-                # Update existing result
-                result.internal_marks = internal_marks
-                result.external_marks = external_marks
-                result.practical_marks = practical_marks
-                result.total_marks = total_marks
-                result.grade = grade
-                result.save()
+            result.internal_marks = internal_marks
+            result.external_marks = external_marks
+            result.practical_marks = practical_marks
+            grade_result(result)
+            result.save()
 
             return JsonResponse({
                 'status': 'success',
@@ -17,3 +17,7 @@ admin.site.register(IssuedBook)
 admin.site.register(Library)
 admin.site.register(Subject)
 admin.site.register(Session)
+admin.site.register(GradingScheme)
+admin.site.register(PendingRegrade)
+admin.site.register(PendingPregeneration)
+admin.site.register(NotificationOutbox)
@@ -0,0 +1,146 @@
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .hashing import hash_passwords
+from .models import GENDER_CHOICES, Course, CustomUser, Session, Student
+
+# Accepted header spellings for each field; read_spreadsheet() lower-cases headers
+STUDENT_COLUMNS = {
+    'email': ('email', 'e-mail'),
+    'first_name': ('first_name', 'first name', 'firstname'),
+    'last_name': ('last_name', 'last name', 'lastname', 'surname'),
+    'gender': ('gender', 'sex'),
+    'address': ('address',),
+    'password': ('password',),
+    'course': ('course',),
+    'session': ('session',),
+}
+STUDENT_IMPORT_HEADER = ['Email', 'First Name', 'Last Name', 'Gender', 'Address', 'Password', 'Course', 'Session']
+_GENDERS = {key.lower(): key for key, _ in GENDER_CHOICES} | {label.lower(): key for key, label in GENDER_CHOICES}
+
+
+class StudentImportError(ValueError):
+    """Raised when an uploaded student list is rejected; `errors` lists the problem for each row"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def session_label(session):
+    return f'{session.start_year.year}-{session.end_year.year}'
+
+
+def _lookup(records, field):
+    names = STUDENT_COLUMNS[field]
+    return [next((record[name] for name in names if record.get(name)), '') for record in records]
+
+
+def _resolve(values, by_id, by_name, default, label):
+    """(id, error) for each course/session cell: an id, a name, or blank for the default"""
+    resolved = []
+    for value in values:
+        key = value.strip().lower()
+        found = (by_id.get(key) or by_name.get(key)) if key else default
+        if found is None:
+            resolved.append((None, f'{label} is missing' if not key else f'Unknown {label.lower()} "{value}"'))
+        else:
+            resolved.append((found, None))
+    return resolved
+
+
+def import_student_sheet(records, course=None, session=None, workers=1):
+    """
+    Validate and create a whole list of students.
+
+    `records` are dicts as returned by spreadsheets.read_spreadsheet().
+    Course and session cells may hold an id or a name ("2023-2027" for a
+    session); blank cells fall back to `course`/`session`. Every row is
+    checked in one pass before anything is written, and a single bad row
+    rejects the list with a StudentImportError listing all problems.
+
+    Passwords are hashed in this process unless `workers` asks for a
+    process pool (None: one per CPU, see hashing.py); only the
+    import_students command does, since a web worker must not fork. Rows
+    without a password get an unusable one, to be set through password
+    reset. Users and profiles are then written with two bulk_create
+    calls, so the per-user post_save profile signals never run.
+    Returns {'created': n}.
+    """
+    if not records:
+        raise StudentImportError('The sheet has no student rows')
+    header = set(records[0])
+    missing = [field for field in ('email', 'first_name', 'last_name')
+               if not any(name in header for name in STUDENT_COLUMNS[field])]
+    if missing:
+        raise StudentImportError('The sheet needs Email, First Name and Last Name columns')
+
+    columns = {field: _lookup(records, field) for field in STUDENT_COLUMNS}
+    rows = [record['_row'] for record in records]
+    emails = [CustomUser.objects.normalize_email(email.strip()) for email in columns['email']]
+    courses = Course.objects.all()
+    sessions = Session.objects.all()
+    course_ids = _resolve(
+        columns['course'], {str(c.id): c.id for c in courses}, {c.name.lower(): c.id for c in courses},
+        course.id if course else None, 'Course')
+    session_ids = _resolve(
+        columns['session'], {str(s.id): s.id for s in sessions}, {session_label(s): s.id for s in sessions},
+        session.id if session else None, 'Session')
+    taken = set(CustomUser.objects.annotate(lower_email=Lower('email')).filter(
+        lower_email__in={email.lower() for email in emails}
+    ).values_list('lower_email', flat=True))
+
+    errors = []
+    seen = set()
+    for index, (row, email) in enumerate(zip(rows, emails)):
+        problems = []
+        if not email:
+            problems.append('Email is missing')
+        else:
+            try:
+                validate_email(email)
+            except ValidationError:
+                problems.append('Email is not valid')
+            if email.lower() in seen:
+                problems.append('Email listed more than once')
+            elif email.lower() in taken:
+                problems.append('A user with this email already exists')
+            seen.add(email.lower())
+        for field, label in (('first_name', 'First name'), ('last_name', 'Last name')):
+            if not columns[field][index]:
+                problems.append(f'{label} is missing')
+        gender = columns['gender'][index]
+        if gender and gender.lower() not in _GENDERS:
+            problems.append(f'Gender must be one of {", ".join(key for key, _ in GENDER_CHOICES)}')
+        problems += [problem for _, problem in (course_ids[index], session_ids[index]) if problem]
+        errors += [{'row': row, 'email': email, 'error': problem} for problem in problems]
+    if errors:
+        raise StudentImportError('Students were not imported', errors)
+
+    passwords = columns['password']
+    given = [index for index, password in enumerate(passwords) if password]
+    hashed = dict(zip(given, hash_passwords([passwords[index] for index in given], workers)))
+    users = [
+        CustomUser(
+            email=email, first_name=first_name, last_name=last_name, user_type='3',
+            gender=_GENDERS.get(gender.lower(), ''), address=address,
+            password=hashed.get(index) or make_password(None),
+        )
+        for index, (email, first_name, last_name, gender, address) in enumerate(zip(
+            emails, columns['first_name'], columns['last_name'], columns['gender'], columns['address']))
+    ]
+    with transaction.atomic():
+        CustomUser.objects.bulk_create(users, batch_size=1000)
+        if any(user.pk is None for user in users):
+            # Backends that cannot return ids from a bulk insert
+            ids = dict(CustomUser.objects.filter(email__in=emails).values_list('email', 'id'))
+            for user in users:
+                user.pk = ids[user.email]
+        Student.objects.bulk_create([
+            Student(admin_id=user.pk, course_id=course_id, session_id=session_id, gender=user.gender or None)
+            for user, (course_id, _), (session_id, _) in zip(users, course_ids, session_ids)
+        ], batch_size=1000)
+    return {'created': len(users)}
@@ -0,0 +1,197 @@
+import re
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from .grading import SchemeResolver, grade_result
+from .models import Course, KTApplication, Notification, StudentResult, Subject
+from .pagination import InvalidCursor, keyset_paginate
+from .transcripts import invalidate_transcripts
+
+APPLICATION_STATUSES = ('pending', 'approved', 'rejected')
+QUEUE_PAGE_SIZE = 25
+MARK_FIELDS = ('internal_marks', 'external_marks', 'practical_marks')
+_MARKS_KEY = re.compile(r'^(?:internal|external|practical)_marks_(\d+)$')
+
+
+def filter_applications(model, status=None, semester=None, subject_id=None, course_id=None):
+    """KT or revaluation applications matching the queue filters, with everything the queue shows loaded"""
+    applications = model.objects.select_related('student__admin', 'subject')
+    if status:
+        applications = applications.filter(status=status)
+    if semester:
+        applications = applications.filter(semester=semester)
+    if subject_id:
+        applications = applications.filter(subject_id=subject_id)
+    if course_id:
+        applications = applications.filter(subject__course_id=course_id)
+    return applications
+
+
+class ApplicationDecisionError(ValueError):
+    """Raised when a batch of decisions cannot be applied; `errors` lists the offending applications"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def queue_filters(params, prefix=''):
+    """The queue filters from GET/POST data, with unusable values dropped"""
+    status, subject, course = (params.get(f'{prefix}{name}', '') for name in ('status', 'subject', 'course'))
+    return {
+        'status': status if status in APPLICATION_STATUSES else '',
+        'semester': params.get(f'{prefix}semester', '').strip(),
+        'subject': subject if subject.isdigit() else '',
+        'course': course if course.isdigit() else '',
+    }
+
+
+def application_queue(model, params, per_page=QUEUE_PAGE_SIZE):
+    """
+    Context for a staff/admin application queue: one keyset page of the
+    filtered applications, newest first, plus the filter values and their
+    choices. `params` is request.GET; a stale or tampered cursor falls
+    back to the first page.
+    """
+    filters = queue_filters(params)
+    applications = filter_applications(
+        model, filters['status'], filters['semester'], filters['subject'], filters['course'])
+    try:
+        page = keyset_paginate(applications, after=params.get('after'), before=params.get('before'),
+                               per_page=per_page)
+    except InvalidCursor:
+        page = keyset_paginate(applications, per_page=per_page)
+
+    return {
+        'page': page,
+        'filters': filters,
+        'filter_query': urlencode({name: value for name, value in filters.items() if value}),
+        'statuses': APPLICATION_STATUSES,
+        'subjects': Subject.objects.order_by('name').values_list('id', 'name'),
+        'courses': Course.objects.order_by('name').values_list('id', 'name'),
+    }
+
+
+def _latest_results(applications):
+    """{application id: the StudentResult it revalues}, from one query"""
+    results = StudentResult.objects.filter(
+        student_id__in={application.student_id for application in applications},
+        subject_id__in={application.subject_id for application in applications},
+        semester__in={application.semester for application in applications},
+    ).select_related('subject')
+    by_key = {}
+    for result in results.order_by('academic_year'):
+        by_key[result.student_id, result.subject_id, result.semester] = result
+    return {
+        application.id: by_key.get((application.student_id, application.subject_id, application.semester))
+        for application in applications
+    }
+
+
+def decide_applications(applications, status, remarks='', marks=None):
+    """
+    Set the status of every KT or revaluation application in the
+    queryset, in one transaction.
+
+    Statuses go out in one bulk_update and the students' notifications in
+    one bulk_create. Approving revaluations also re-grades the results
+    they refer to in the same batch: `marks` may map an application id to
+    new (internal, external, practical) marks, and every approved result
+    gets its total and grade recomputed by the grading engine. If any
+    approved revaluation has no result, nothing is changed and an
+    ApplicationDecisionError lists them. Returns
+    {'updated': n, 'regraded': n}.
+    """
+    if status not in APPLICATION_STATUSES:
+        raise ApplicationDecisionError(f'Unknown status {status!r}')
+    marks = marks or {}
+    model = applications.model
+    kind = 'kt' if model is KTApplication else 'revaluation'
+
+    with transaction.atomic():
+        applications = list(applications.select_related('student__admin', 'subject').select_for_update(of=('self',)))
+        results = _latest_results(applications) if kind == 'revaluation' and status == 'approved' else {}
+        missing = [application for application in applications if application.id in results and not results[application.id]]
+        if missing:
+            raise ApplicationDecisionError('Some applications have no result to revalue', [
+                {'application': application.id, 'student': str(application.student), 'subject': application.subject.name}
+                for application in missing
+            ])
+
+        now = timezone.now()
+        resolver = SchemeResolver() if results else None
+        for application in applications:
+            application.status, application.remarks, application.updated_at = status, remarks, now
+            result = results.get(application.id)
+            if result is not None:
+                if application.id in marks:
+                    result.internal_marks, result.external_marks, result.practical_marks = marks[application.id]
+                grade_result(result, resolver)
+                result.updated_at = now
+        model.objects.bulk_update(applications, ['status', 'remarks', 'updated_at'], batch_size=500)
+
+        regraded = [result for result in results.values() if result is not None]
+        if regraded:
+            StudentResult.objects.bulk_update(
+                regraded, ['internal_marks', 'external_marks', 'practical_marks', 'total_marks', 'grade', 'updated_at'],
+                batch_size=500)
+            student_ids = [result.student_id for result in regraded]
+            course_ids = [result.subject.course_id for result in regraded]
+            transaction.on_commit(lambda: invalidate_transcripts(student_ids, course_ids))
+
+        Notification.objects.bulk_create([
+            _decision_notification(kind, application, status, remarks, results.get(application.id))
+            for application in applications
+        ], batch_size=500)
+    return {'updated': len(applications), 'regraded': len(regraded)}
+
+
+def _decision_notification(kind, application, status, remarks, result):
+    if kind == 'kt':
+        title = 'KT Application Update'
+        message = f'Your KT application for {application.subject.name} has been {status}. Remarks: {remarks}'
+    elif result is not None:
+        title = 'Revaluation Result Update'
+        message = (f'Your revaluation application for {application.subject.name} has been {status}. '
+                   f'New total marks: {result.total_marks}. Grade: {result.grade}. Remarks: {remarks}')
+    else:
+        title = 'Revaluation Application Update'
+        message = f'Your revaluation application for {application.subject.name} has been {status}. Remarks: {remarks}'
+    return Notification(user=application.student.admin, title=title, message=message, notification_type=kind)
+
+
+def revaluation_marks(params, suffix=''):
+    """(internal, external, practical) marks from form data; blank fields count as 0"""
+    return tuple(float(params.get(f'{name}{suffix}') or 0) for name in MARK_FIELDS)
+
+
+def bulk_decide_applications(model, params):
+    """
+    Apply one decision from the bulk form to many applications: the ticked
+    `application` ids, or with scope=filtered the pending applications
+    matching the queue filters (sent as filter_semester, filter_subject,
+    filter_course). The filtered scope needs at least one of those filters
+    and never touches applications that already have a decision.
+    Revalued marks may be sent per application as internal_marks_<id> etc.
+    Returns decide_applications()' counts.
+    """
+    if params.get('scope') == 'filtered':
+        filters = queue_filters(params, 'filter_')
+        if not any(filters[name] for name in ('semester', 'subject', 'course')):
+            raise ApplicationDecisionError('Filter by semester, subject or course before deciding everything matching')
+        applications = filter_applications(
+            model, 'pending', filters['semester'], filters['subject'], filters['course'])
+    else:
+        ids = [value for value in params.getlist('application') if value.isdigit()]
+        if not ids:
+            raise ApplicationDecisionError('Select at least one application')
+        applications = model.objects.filter(id__in=ids)
+
+    status = params.get('decision')
+    marks = {}
+    if model is not KTApplication and status == 'approved':
+        for application_id in {int(match.group(1)) for match in map(_MARKS_KEY.match, params) if match}:
+            marks[application_id] = revaluation_marks(params, f'_{application_id}')
+    return decide_applications(applications, status, params.get('remarks', ''), marks)
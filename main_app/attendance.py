@@ -0,0 +1,226 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .dashboard import invalidate_student_dashboards
+from .models import Attendance, AttendanceReport, AttendanceSummary, Student
+
+
+class AttendanceValidationError(ValueError):
+    """Raised when a submitted register is rejected; `errors` lists the problem for each student"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def parse_status(value):
+    """Normalise a submitted attendance status (bool, 'true', '1', ...) to a bool"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'on', 'yes')
+    return bool(value)
+
+
+def apply_attendance_changes(subject_id, session_id, changes):
+    """
+    Update the AttendanceSummary rollup for one subject/session.
+    `changes` is an iterable of (student_id, old_status, new_status) where
+    old_status is None for newly created reports.
+    Rows are incremented in place with F() expressions, one UPDATE per
+    distinct delta, so the cost does not depend on the class size.
+    """
+    deltas = defaultdict(list)
+    for student_id, old_status, new_status in changes:
+        present = int(new_status is True) - int(old_status is True)
+        absent = int(new_status is False) - int(old_status is False)
+        if present or absent:
+            deltas[(present, absent)].append(student_id)
+    if not deltas:
+        return
+
+    student_ids = [student_id for ids in deltas.values() for student_id in ids]
+    with transaction.atomic():
+        AttendanceSummary.objects.bulk_create([
+            AttendanceSummary(student_id=student_id, subject_id=subject_id, session_id=session_id)
+            for student_id in student_ids
+        ], ignore_conflicts=True)
+        for (present, absent), ids in deltas.items():
+            AttendanceSummary.objects.filter(
+                subject_id=subject_id, session_id=session_id, student_id__in=ids
+            ).update(present=F('present') + present, absent=F('absent') + absent)
+        transaction.on_commit(lambda: invalidate_student_dashboards(student_ids))
+
+
+def save_attendance_register(subject, date, entries):
+    """
+    Create an Attendance for `subject` on `date` with one report per entry
+    ({'student_id': ..., 'status': ...}). All students are validated against
+    the subject's course in one query and the reports are inserted with
+    bulk_create inside a single transaction, so either the whole register is
+    saved or nothing is.
+    """
+    if not entries:
+        raise AttendanceValidationError('No students provided')
+
+    errors = []
+    statuses = {}
+    for entry in entries:
+        raw_id = entry.get('student_id')
+        try:
+            student_id = int(raw_id)
+        except (TypeError, ValueError):
+            errors.append({'student_id': raw_id, 'error': 'Invalid student ID'})
+            continue
+        if student_id in statuses:
+            errors.append({'student_id': student_id, 'error': 'Student listed more than once'})
+            continue
+        statuses[student_id] = parse_status(entry.get('status'))
+
+    sessions = dict(Student.objects.filter(
+        id__in=statuses, course_id=subject.course_id
+    ).values_list('id', 'session_id'))
+    for student_id in statuses:
+        if student_id not in sessions:
+            errors.append({'student_id': student_id, 'error': "Student is not enrolled in this subject's course"})
+        elif sessions[student_id] is None:
+            errors.append({'student_id': student_id, 'error': 'Student has no session assigned'})
+    if errors:
+        raise AttendanceValidationError('Attendance was not saved', errors)
+
+    # The register belongs to the session of the first student, as before
+    session_id = sessions[next(iter(statuses))]
+    with transaction.atomic():
+        attendance = Attendance.objects.create(subject=subject, date=date, session_id=session_id)
+        AttendanceReport.objects.bulk_create([
+            AttendanceReport(student_id=student_id, attendance=attendance, status=status)
+            for student_id, status in statuses.items()
+        ])
+        apply_attendance_changes(subject.id, session_id, [
+            (student_id, None, status) for student_id, status in statuses.items()
+        ])
+    return attendance
+
+
+def correct_attendance(attendance, entries, partial=True):
+    """
+    Apply corrections ({'id': student_id, 'status': ...}) to an existing register.
+    Existing reports are loaded in one query, locked with select_for_update
+    inside the transaction that writes them; only rows whose status actually
+    changes are written (bulk_update), and students without a report are
+    created (bulk_create) if they belong to the subject's course.
+    Returns a dict with updated/created/unchanged counts and per-student errors.
+    With partial=False nothing is written unless every entry is valid, and
+    an AttendanceValidationError lists the errors instead.
+    """
+    errors = []
+    statuses = {}
+    for entry in entries:
+        raw_id = entry.get('id')
+        try:
+            statuses[int(raw_id)] = parse_status(entry.get('status'))
+        except (TypeError, ValueError):
+            errors.append({'student_id': raw_id, 'error': 'Invalid student ID'})
+
+    with transaction.atomic():
+        # Lock the register, then its reports, so a concurrent correction waits and computes
+        # its deltas from the statuses committed here rather than applying the same delta twice
+        list(Attendance.objects.select_for_update().filter(id=attendance.id).values_list('id'))
+        reports = {
+            report.student_id: report
+            for report in AttendanceReport.objects.select_for_update().filter(
+                attendance=attendance, student_id__in=statuses)
+        }
+        missing = [student_id for student_id in statuses if student_id not in reports]
+        enrolled = set()
+        if missing:
+            enrolled = set(Student.objects.filter(
+                id__in=missing, course__subject__id=attendance.subject_id
+            ).values_list('id', flat=True))
+
+        now = timezone.now()
+        changed, new_reports, changes = [], [], []
+        unchanged = 0
+        for student_id, status in statuses.items():
+            report = reports.get(student_id)
+            if report is None:
+                if student_id not in enrolled:
+                    errors.append({'student_id': student_id,
+                                   'error': "Student is not enrolled in this subject's course"})
+                    continue
+                new_reports.append(AttendanceReport(student_id=student_id, attendance=attendance, status=status))
+                changes.append((student_id, None, status))
+            elif report.status == status:
+                unchanged += 1
+            else:
+                changes.append((student_id, report.status, status))
+                report.status = status
+                report.updated_at = now
+                changed.append(report)
+        if errors and not partial:
+            raise AttendanceValidationError('Attendance was not updated', errors)
+
+        if changed:
+            AttendanceReport.objects.bulk_update(changed, ['status', 'updated_at'])
+        if new_reports:
+            AttendanceReport.objects.bulk_create(new_reports)
+        apply_attendance_changes(attendance.subject_id, attendance.session_id, changes)
+
+    return {
+        'updated': len(changed),
+        'created': len(new_reports),
+        'unchanged': unchanged,
+        'errors': errors,
+    }
+
+
+def compute_attendance_summary():
+    """Return {(student_id, subject_id, session_id): (present, absent)} computed from AttendanceReport"""
+    rows = AttendanceReport.objects.order_by().values_list(
+        'student_id', 'attendance__subject_id', 'attendance__session_id'
+    ).annotate(
+        present=Count('id', filter=Q(status=True)),
+        absent=Count('id', filter=Q(status=False)),
+    )
+    return {
+        (student_id, subject_id, session_id): (present, absent)
+        for student_id, subject_id, session_id, present, absent in rows
+    }
+
+
+def stored_attendance_summary():
+    """Return the current rollup in the same shape as compute_attendance_summary()"""
+    rows = AttendanceSummary.objects.values_list('student_id', 'subject_id', 'session_id', 'present', 'absent')
+    return {
+        (student_id, subject_id, session_id): (present, absent)
+        for student_id, subject_id, session_id, present, absent in rows
+    }
+
+
+def find_attendance_drift():
+    """List (key, stored, expected) for every rollup row that disagrees with the raw reports"""
+    expected = compute_attendance_summary()
+    stored = stored_attendance_summary()
+    drift = []
+    for key in expected.keys() | stored.keys():
+        actual = stored.get(key, (0, 0))
+        wanted = expected.get(key, (0, 0))
+        if actual != wanted:
+            drift.append((key, actual, wanted))
+    return sorted(drift)
+
+
+@transaction.atomic
+def rebuild_attendance_summary(batch_size=1000):
+    """Replace the rollup with totals recomputed from AttendanceReport. Returns the number of rows written."""
+    expected = compute_attendance_summary()
+    AttendanceSummary.objects.all().delete()
+    AttendanceSummary.objects.bulk_create([
+        AttendanceSummary(
+            student_id=student_id, subject_id=subject_id, session_id=session_id,
+            present=present, absent=absent
+        )
+        for (student_id, subject_id, session_id), (present, absent) in expected.items()
+    ], batch_size=batch_size)
+    return len(expected)
@@ -0,0 +1,364 @@
+import math
+import re
+import threading
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import ChatBot
+
+# NumPy ships in requirements.txt; without it BM25 falls back to a pure-Python accumulator with the same ranking
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RANKERS = ('legacy', 'bm25')
+
+# Keywords that earn a question a bonus when the query mentions its category
+CATEGORY_KEYWORDS = {
+    'academic': [
+        'cgpa', 'attendance', 'kt', 'atkt', 'leave', 'internal', 'grade', 'result',
+        'marks', 'score', 'study', 'exam', 'test', 'assignment', 'project', 'semester',
+        'course', 'subject', 'class', 'lecture', 'teacher', 'professor', 'faculty'
+    ],
+    'library': [
+        'book', 'library', 'borrow', 'fine', 'return', 'study', 'read', 'textbook',
+        'reference', 'journal', 'magazine', 'research', 'paper', 'publication',
+        'digital', 'online', 'database', 'catalog', 'shelf', 'librarian'
+    ],
+    'exams': [
+        'exam', 'hall ticket', 'grade', 'result', 'paper', 'question', 'test',
+        'midterm', 'final', 'semester', 'schedule', 'date', 'time', 'venue',
+        'room', 'hall', 'seat', 'admit card', 'marksheet', 'answer sheet'
+    ],
+    'fees': [
+        'fee', 'payment', 'money', 'pay', 'receipt', 'scholarship', 'tuition',
+        'cost', 'expense', 'charge', 'due', 'installment', 'refund', 'discount',
+        'concession', 'financial', 'bank', 'transaction', 'online payment'
+    ],
+    'hostel': [
+        'hostel', 'room', 'mess', 'food', 'stay', 'accommodation', 'boarding',
+        'lodging', 'residence', 'dormitory', 'meal', 'dining', 'laundry',
+        'facility', 'amenity', 'furniture', 'maintenance', 'security'
+    ],
+    'technical': [
+        'portal', 'password', 'login', 'access', 'website', 'app', 'system',
+        'computer', 'internet', 'network', 'email', 'account', 'profile',
+        'settings', 'update', 'download', 'upload', 'file', 'document'
+    ],
+    'general': [
+        'support', 'help', 'contact', 'profile', 'id card', 'document',
+        'information', 'guide', 'assistance', 'service', 'office', 'department',
+        'staff', 'admin', 'head', 'principal', 'campus', 'facility'
+    ]
+}
+
+
+@lru_cache(maxsize=4096)
+def _word_category_matches(word):
+    """Number of keywords per category that contain `word` or are contained in it"""
+    return tuple(
+        (category, sum(1 for keyword in keywords if word in keyword or keyword in word))
+        for category, keywords in CATEGORY_KEYWORDS.items()
+    )
+
+
+def category_scores(query):
+    """
+    Keyword score of `query` for every category, computed once per query
+    instead of once per FAQ entry: +1 for every keyword found in the query
+    and +0.5 for every (word, keyword) pair where one contains the other.
+    """
+    scores = {}
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        scores[category] = sum(1 for keyword in keywords if keyword in query)
+    for word in query.split():
+        for category, matches in _word_category_matches(word):
+            scores[category] += 0.5 * matches
+    return scores
+
+
+def question_similarity(query, query_words, query_set, question, words, word_set):
+    """Jaccard similarity plus a word-order bonus; 1.0 when one text contains the other"""
+    intersection = len(query_set & word_set)
+    union = len(query_set) + len(word_set) - intersection
+    if union == 0:
+        return 0
+    if query in question or question in query:
+        return 1.0
+    order_similarity = sum(
+        1 for a, b in zip(query_words, words) if a == b
+    ) / max(len(query_words), len(words))
+    return (intersection / union) + (order_similarity * 0.2)
+
+
+class ChatbotIndex:
+    """
+    In-memory retrieval index over the ChatBot table.
+
+    Questions are tokenized once, an inverted index maps every word to the
+    entries using it and the category keyword scores are shared between
+    entries, so a query only scores the entries that can actually win.
+    Entries keep the model's default ordering, which decides ties.
+    """
+
+    def __init__(self, entries, stamp=None):
+        self.stamp = stamp
+        self.entries = list(entries)
+        self.questions = [entry.question.lower() for entry in self.entries]
+        self.words = [question.split() for question in self.questions]
+        self.word_sets = [set(words) for words in self.words]
+
+        self.postings = {}
+        self.first_with_word = {}
+        self.first_in_category = {}
+        self.by_category = {}
+        for position, (entry, word_set) in enumerate(zip(self.entries, self.word_sets)):
+            self.by_category.setdefault(entry.category, []).append(position)
+            self.first_in_category.setdefault(entry.category, position)
+            for word in word_set:
+                self.postings.setdefault(word, []).append(position)
+                self.first_with_word.setdefault(word, {}).setdefault(entry.category, position)
+        self.max_word_length = max(map(len, self.postings), default=0)
+
+        # All questions in one string, so containment of the query is found with str.find
+        self.corpus = '\n'.join(self.questions)
+        self.offsets = []
+        offset = 0
+        for question in self.questions:
+            self.offsets.append(offset)
+            offset += len(question) + 1
+        self.by_length = sorted(range(len(self.questions)), key=lambda position: len(self.questions[position]))
+        self.lengths = [len(self.questions[position]) for position in self.by_length]
+        self._bm25 = None
+
+    @classmethod
+    def build(cls, stamp=None):
+        return cls(ChatBot.objects.all(), stamp)
+
+    def _contained_words(self, query):
+        """Indexed words that occur anywhere inside the query"""
+        found = set()
+        for start in range(len(query)):
+            for end in range(start + 1, min(len(query), start + self.max_word_length) + 1):
+                if query[start:end] in self.postings:
+                    found.add(query[start:end])
+        return found
+
+    def _phrase_matches(self, query):
+        """Positions whose question contains the query or is contained in it"""
+        if not query:
+            return set(range(len(self.entries)))
+        matches = set()
+        index = self.corpus.find(query)
+        while index != -1:
+            matches.add(bisect_right(self.offsets, index) - 1)
+            index = self.corpus.find(query, index + 1)
+        for position in self.by_length[:bisect_right(self.lengths, len(query))]:
+            if self.questions[position] in query:
+                matches.add(position)
+        return matches
+
+    def score(self, position, query, query_words, query_set, categories):
+        """Score one entry exactly as the original linear scan did"""
+        question, words = self.questions[position], self.words[position]
+        similarity = question_similarity(query, query_words, query_set, question, words, self.word_sets[position])
+        similarity += categories.get(self.entries[position].category, 0) * 0.1
+        if any(word in query for word in words):
+            similarity += 0.2
+        return similarity
+
+    def best_match(self, query, ranker=None):
+        """
+        Return (entry, score) for the best FAQ using `ranker` ('legacy' or
+        'bm25', default settings.CHATBOT_RANKER), or (None, 0) if nothing
+        matches. Both rankers score on a scale where 0.3 is a usable answer.
+        """
+        ranker = ranker or settings.CHATBOT_RANKER
+        if ranker == 'legacy':
+            return self.legacy_match(query)
+        if ranker == 'bm25':
+            if self._bm25 is None:
+                self._bm25 = BM25Ranker(self.entries)
+            return self._bm25.best_match(query)
+        raise ValueError(f"Unknown chatbot ranker {ranker!r}, expected one of {', '.join(RANKERS)}")
+
+    def legacy_match(self, query):
+        """
+        Jaccard + word order + category keyword ranking of the original view.
+
+        Entries that share no word with the query and do not contain it can
+        only score their category bonus plus the context bonus, so for those
+        just the first entry of each category (with and without the context
+        bonus) is scored. Entries sharing words are scored in decreasing
+        order of overlap and skipped once their upper bound cannot win.
+        """
+        query_words = query.split()
+        query_set = set(query_words)
+        categories = category_scores(query)
+
+        phrases = self._phrase_matches(query)
+        candidates = set(self.first_in_category.values())
+        for word in self._contained_words(query):
+            candidates.update(self.first_with_word[word].values())
+
+        overlap = Counter()
+        for word in query_set:
+            overlap.update(self.postings.get(word, ()))
+
+        best, best_score = None, 0
+
+        def consider(position):
+            nonlocal best, best_score
+            similarity = self.score(position, query, query_words, query_set, categories)
+            if similarity > best_score or (similarity == best_score and best is not None and position < best):
+                best, best_score = position, similarity
+
+        # Containment scores a flat 1.0, which the overlap bound below does not cover
+        for position in sorted((candidates - overlap.keys()) | phrases):
+            consider(position)
+
+        # Sharing a word always earns the context bonus. Jaccard is at most
+        # shared / len(query_set) and at most shared words plus the query's
+        # repeated words can line up, which bounds the word-order bonus.
+        max_category = max(categories.values(), default=0) * 0.1
+        repeated = len(query_words) - len(query_set)
+        for position, shared in overlap.most_common():
+            bound = (
+                shared / len(query_set)
+                + 0.2 * (shared + repeated) / len(query_words)
+                + max_category + 0.2
+            )
+            if bound + 1e-9 < best_score:
+                break
+            if position in phrases:
+                continue
+            # The same bound with this entry's own size and category
+            words = self.words[position]
+            bound = (
+                shared / (len(query_set) + len(self.word_sets[position]) - shared)
+                + 0.2 * (shared + repeated) / max(len(query_words), len(words))
+                + categories.get(self.entries[position].category, 0) * 0.1 + 0.2
+            )
+            if bound + 1e-9 >= best_score:
+                consider(position)
+
+        if best is None:
+            return None, 0
+        return self.entries[best], best_score
+
+    def related(self, entry, limit=3):
+        """Other entries of the same category, in the model's default ordering"""
+        return [
+            self.entries[position] for position in self.by_category.get(entry.category, [])
+            if self.entries[position].id != entry.id
+        ][:limit]
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+class BM25Ranker:
+    """
+    Okapi BM25 over question and answer text, question words counting
+    `question_weight` times. Every (term, entry) weight is query independent
+    and precomputed, so scoring a query is a sum of a few weight vectors:
+    one NumPy scatter-add per query term, or a dict accumulator without NumPy.
+    Scores are divided by the query's ideal score, which puts them in [0, 1).
+    """
+
+    def __init__(self, entries, k1=1.5, b=0.75, question_weight=2):
+        self.entries = list(entries)
+        frequencies = []
+        for entry in self.entries:
+            counts = Counter(tokenize(entry.answer))
+            for term in tokenize(entry.question):
+                counts[term] += question_weight
+            frequencies.append(counts)
+        lengths = [sum(counts.values()) for counts in frequencies]
+        average = sum(lengths) / len(lengths) if lengths else 0
+
+        postings = {}
+        for position, counts in enumerate(frequencies):
+            norm = k1 * (1 - b + b * lengths[position] / average)
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((position, tf * (k1 + 1) / (tf + norm)))
+
+        total = len(self.entries)
+        self.vectorized = np is not None
+        self.idf = {}
+        self.postings = {}
+        for term, matches in postings.items():
+            idf = math.log(1 + (total - len(matches) + 0.5) / (len(matches) + 0.5))
+            self.idf[term] = idf
+            positions = [position for position, _ in matches]
+            weights = [idf * weight for _, weight in matches]
+            if self.vectorized:
+                self.postings[term] = (np.array(positions, dtype=np.intp), np.array(weights))
+            else:
+                self.postings[term] = list(zip(positions, weights))
+        self.unknown_idf = math.log(1 + (total + 0.5) / 0.5)
+        self.k1 = k1
+
+    def scores(self, terms):
+        """Raw BM25 score of every entry as an array (NumPy) or {position: score} (fallback)"""
+        if self.vectorized:
+            scores = np.zeros(len(self.entries))
+            for term in terms:
+                if term in self.postings:
+                    positions, weights = self.postings[term]
+                    scores[positions] += weights
+            return scores
+        scores = {}
+        for term in terms:
+            for position, weight in self.postings.get(term, ()):
+                scores[position] = scores.get(position, 0) + weight
+        return scores
+
+    def best_match(self, query):
+        terms = tokenize(query)
+        # Words the FAQ never uses count as maximally rare, so they lower the confidence
+        ideal = sum(self.idf.get(term, self.unknown_idf) * (self.k1 + 1) for term in terms)
+        if not terms:
+            return None, 0
+        scores = self.scores(terms)
+        if self.vectorized:
+            best = int(np.argmax(scores))  # First maximum, so ties go to the earlier entry
+            best_score = float(scores[best])
+        else:
+            best, best_score = min(scores.items(), key=lambda item: (-item[1], item[0]), default=(None, 0))
+        if not best_score:
+            return None, 0
+        return self.entries[best], best_score / ideal
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def chatbot_stamp():
+    """Cheap fingerprint of the ChatBot table; changes whenever rows are added, removed or saved"""
+    stats = ChatBot.objects.aggregate(count=Count('id'), latest=Max('updated_at'), top=Max('id'))
+    return stats['count'], stats['latest'], stats['top']
+
+
+def get_chatbot_index():
+    """
+    Return the process-wide index, rebuilding it when the table has changed.
+    The fingerprint check costs one aggregate query, which keeps every
+    worker process in step with edits made elsewhere.
+    """
+    global _index
+    stamp = chatbot_stamp()
+    index = _index
+    if index is None or index.stamp != stamp:
+        with _index_lock:
+            if _index is None or _index.stamp != stamp:
+                _index = ChatbotIndex.build(stamp)
+            index = _index
+    return index
@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+
+from .inbox import unread_count
+
+
+def inbox(request):
+    """
+    Unread notification count for the sidebar badge. Lazy, so only pages
+    that render the badge run the count, and they run it once.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notifications': SimpleLazyObject(lambda: unread_count(user))}
@@ -0,0 +1,118 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+from .models import (AttendanceSummary, Course, LeaveReportStudent, Staff, Student, Subject)
+
+
+def student_dashboard_cache_key(student_id):
+    return f'student_dashboard:{student_id}'
+
+
+def admin_dashboard_stats():
+    """
+    Build every series shown on the HOD dashboard.
+    Each series comes from a grouped query, so the number of queries
+    does not depend on how many students, subjects or courses exist.
+    """
+    total_staff = Staff.objects.count()
+
+    subjects = list(Subject.objects.order_by('id').annotate(
+        attendance_count=Count('attendance')
+    ).values_list('name', 'course_id', 'attendance_count'))
+
+    courses = list(Course.objects.order_by('id').values_list('id', 'name'))
+
+    # Students per course, reused for the per-subject series
+    students_per_course = dict(
+        Student.objects.order_by().values_list('course_id').annotate(total=Count('id'))
+    )
+
+    # Present/absent totals come from the AttendanceSummary rollup
+    students = list(Student.objects.order_by('id').annotate(
+        present=Coalesce(Sum('attendancesummary__present'), 0),
+        absent=Coalesce(Sum('attendancesummary__absent'), 0),
+    ).values_list('id', 'admin__first_name', 'present', 'absent'))
+
+    leaves_per_student = dict(
+        LeaveReportStudent.objects.filter(status=1).order_by()
+        .values_list('student_id').annotate(total=Count('id'))
+    )
+
+    return {
+        'total_students': len(students),
+        'total_staff': total_staff,
+        'total_course': len(courses),
+        'total_subject': len(subjects),
+        'subject_list': [name for name, _, _ in subjects],
+        'attendance_list': [count for _, _, count in subjects],
+        'student_attendance_present_list': [present for _, _, present, _ in students],
+        'student_attendance_leave_list': [
+            absent + leaves_per_student.get(student_id, 0)
+            for student_id, _, _, absent in students
+        ],
+        'student_name_list': [first_name for _, first_name, _, _ in students],
+        'student_count_list_in_subject': [
+            students_per_course.get(course_id, 0) for _, course_id, _ in subjects
+        ],
+        'student_count_list_in_course': [
+            students_per_course.get(course_id, 0) for course_id, _ in courses
+        ],
+        'course_name_list': [name for _, name in courses],
+    }
+
+
+def student_dashboard_stats(student):
+    """
+    Per-subject present/absent counts for one student: the course's
+    subjects, then one grouped query over the student's own AttendanceSummary
+    rows (served by the student-first unique index).
+    When STUDENT_DASHBOARD_CACHE_TIMEOUT is set the result is cached per
+    student; the attendance write paths invalidate the entry.
+    """
+    timeout = getattr(settings, 'STUDENT_DASHBOARD_CACHE_TIMEOUT', 0)
+    key = student_dashboard_cache_key(student.id)
+    if timeout:
+        stats = cache.get(key)
+        if stats is not None:
+            return stats
+
+    subjects = list(Subject.objects.filter(course_id=student.course_id).order_by('id'))
+    counts = {
+        row['subject_id']: row
+        for row in AttendanceSummary.objects.filter(student=student).order_by().values('subject_id').annotate(
+            present=Sum('present'), absent=Sum('absent'))
+    }
+    for subject in subjects:
+        row = counts.get(subject.id, {})
+        subject.present, subject.absent = row.get('present', 0), row.get('absent', 0)
+
+    total_present = sum(subject.present for subject in subjects)
+    total_attendance = total_present + sum(subject.absent for subject in subjects)
+    if total_attendance == 0:  # Don't divide. DivisionByZero
+        percent_absent = percent_present = 0
+    else:
+        percent_present = math.floor((total_present/total_attendance) * 100)
+        percent_absent = math.ceil(100 - percent_present)
+
+    stats = {
+        'total_attendance': total_attendance,
+        'percent_present': percent_present,
+        'percent_absent': percent_absent,
+        'total_subject': len(subjects),
+        'subjects': subjects,
+        'data_present': [subject.present for subject in subjects],
+        'data_absent': [subject.absent for subject in subjects],
+        'data_name': [subject.name for subject in subjects],
+    }
+    if timeout:
+        cache.set(key, stats, timeout)
+    return stats
+
+
+def invalidate_student_dashboards(student_ids):
+    """Drop cached dashboards for the given students after their attendance changes"""
+    cache.delete_many([student_dashboard_cache_key(student_id) for student_id in student_ids])
@@ -0,0 +1,66 @@
+from .grading import SchemeResolver
+from .models import KTApplication, RevaluationApplication, StudentResult
+from .transcripts import semester_order
+
+
+def _result_order(result):
+    return semester_order(result.academic_year, result.semester), result.id
+
+
+def latest_results(student):
+    """
+    {subject_id: the student's most recent StudentResult in that subject},
+    for subjects of the student's course, from one query
+    """
+    latest = {}
+    results = StudentResult.objects.filter(
+        student=student, subject__course_id=student.course_id
+    ).select_related('subject')
+    for result in results:
+        current = latest.get(result.subject_id)
+        if current is None or _result_order(result) > _result_order(current):
+            latest[result.subject_id] = result
+    return latest
+
+
+def failed_results(student, latest=None):
+    """
+    {subject_id: result} for subjects whose most recent result carries the
+    fail grade of the grading scheme that applies to it
+    """
+    latest = latest_results(student) if latest is None else latest
+    resolver = SchemeResolver()
+    return {
+        subject_id: result for subject_id, result in latest.items()
+        if result.grade == resolver.scale_for(result.subject.course_id, result.academic_year).fail_grade
+    }
+
+
+def _by_name(results):
+    return sorted((result.subject for result in results.values()), key=lambda subject: (subject.name, subject.id))
+
+
+def kt_eligibility(student):
+    """
+    What the KT form needs, in a fixed number of queries: the failed
+    subjects, their latest results and the student's existing KT
+    applications (with subjects loaded).
+    """
+    failed = failed_results(student)
+    return {
+        'results': failed,
+        'subjects': _by_name(failed),
+        'applications': list(KTApplication.objects.filter(student=student)
+                             .select_related('subject').order_by('-created_at')),
+    }
+
+
+def revaluation_eligibility(student):
+    """Same as kt_eligibility() for revaluation, where every graded subject is eligible"""
+    latest = latest_results(student)
+    return {
+        'results': latest,
+        'subjects': _by_name(latest),
+        'applications': list(RevaluationApplication.objects.filter(student=student)
+                             .select_related('subject').order_by('-created_at')),
+    }
@@ -113,7 +113,7 @@ class SubjectForm(FormSettings):
 
     class Meta:
         model = Subject
-        fields = ['name', 'staff', 'course']
+        fields = ['name', 'staff', 'course', 'credits']
 
 
 class SessionForm(FormSettings):
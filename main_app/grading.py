@@ -0,0 +1,186 @@
+from bisect import bisect_right
+
+from django.db import transaction
+
+from .models import GradingScheme, PendingRegrade, StudentResult
+
+# NumPy ships in requirements.txt; without it grades are looked up with bisect, with the same results
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# (minimum total, grade), highest first; used when no GradingScheme applies
+DEFAULT_BOUNDARIES = [(90, 'O'), (80, 'A+'), (70, 'A'), (60, 'B+'), (50, 'B'), (40, 'C')]
+DEFAULT_FAIL_GRADE = 'F'
+# Points per grade for SGPA/CGPA; grades not listed (e.g. a pass/fail scheme's) carry no credits
+GRADE_POINTS = {'O': 10, 'A+': 9, 'A': 8, 'B+': 7, 'B': 6, 'C': 5, 'F': 0}
+
+
+def validate_boundaries(boundaries):
+    """Raise ValueError unless boundaries is a list of [minimum, grade] pairs with distinct minimums"""
+    if not isinstance(boundaries, (list, tuple)) or not boundaries:
+        raise ValueError('Boundaries must be a non-empty list of [minimum total, grade] pairs')
+    minimums = []
+    for pair in boundaries:
+        if not isinstance(pair, (list, tuple)) or len(pair) != 2:
+            raise ValueError(f'{pair!r} is not a [minimum total, grade] pair')
+        minimum, grade = pair
+        if isinstance(minimum, bool) or not isinstance(minimum, (int, float)):
+            raise ValueError(f'Minimum total {minimum!r} is not a number')
+        if not isinstance(grade, str) or not 0 < len(grade) <= 2:
+            raise ValueError(f'Grade {grade!r} must be one or two characters')
+        minimums.append(minimum)
+    if len(set(minimums)) != len(minimums):
+        raise ValueError('Each minimum total may only appear once')
+
+
+class Scale:
+    """A compiled grade scale: sorted thresholds for bisect/searchsorted lookups"""
+
+    def __init__(self, boundaries, fail_grade=DEFAULT_FAIL_GRADE):
+        ordered = sorted(boundaries, key=lambda pair: pair[0])
+        self.thresholds = [minimum for minimum, _ in ordered]
+        self.labels = [fail_grade] + [grade for _, grade in ordered]
+        self.fail_grade = fail_grade
+
+    def grade(self, total):
+        return self.labels[bisect_right(self.thresholds, total)]
+
+    def grade_all(self, totals):
+        """Grade a whole column of totals at once"""
+        if np is not None and len(totals):
+            positions = np.searchsorted(np.asarray(self.thresholds, dtype=float), totals, side='right')
+            return np.asarray(self.labels, dtype=object)[positions].tolist()
+        return [self.labels[bisect_right(self.thresholds, total)] for total in totals]
+
+
+DEFAULT_SCALE = Scale(DEFAULT_BOUNDARIES)
+
+
+class SchemeResolver:
+    """Loads every GradingScheme once and picks the most specific one per (course, academic year)"""
+
+    def __init__(self):
+        self.scales = {
+            (scheme.course_id, scheme.academic_year): Scale(scheme.boundaries, scheme.fail_grade)
+            for scheme in GradingScheme.objects.all()
+        }
+
+    def scale_for(self, course_id, academic_year):
+        for key in ((course_id, academic_year), (course_id, ''), (None, academic_year), (None, '')):
+            if key in self.scales:
+                return self.scales[key]
+        return DEFAULT_SCALE
+
+
+def compute_totals(internal, external, practical):
+    """Column-wise total of the three mark components"""
+    if np is not None and len(internal):
+        return (np.asarray(internal, dtype=float) + np.asarray(external, dtype=float)
+                + np.asarray(practical, dtype=float)).tolist()
+    return [i + e + p for i, e, p in zip(internal, external, practical)]
+
+
+def grade_result(result, resolver=None):
+    """Set total_marks and grade on one StudentResult from its components (not saved)"""
+    resolver = resolver or SchemeResolver()
+    result.total_marks = result.internal_marks + result.external_marks + result.practical_marks
+    result.grade = resolver.scale_for(result.subject.course_id, result.academic_year).grade(result.total_marks)
+    return result
+
+
+def regrade_results(course_id=None, semester=None, academic_year=None, batch_size=2000):
+    """
+    Recompute total_marks and grade for every matching StudentResult.
+
+    Rows are read as plain values in batches, totals and grades are computed
+    a column at a time per grading scale, and only rows whose total or
+    grade actually changes are written back with bulk_update.
+    Returns {'checked': n, 'updated': n}.
+    """
+    from .transcripts import invalidate_transcripts  # transcripts imports GRADE_POINTS from here
+    resolver = SchemeResolver()
+    results = StudentResult.objects.all()
+    if course_id:
+        results = results.filter(subject__course_id=course_id)
+    if semester:
+        results = results.filter(semester=semester)
+    if academic_year:
+        results = results.filter(academic_year=academic_year)
+
+    rows = results.order_by('id').values_list(
+        'id', 'student_id', 'subject__course_id', 'academic_year',
+        'internal_marks', 'external_marks', 'practical_marks', 'total_marks', 'grade',
+    ).iterator(chunk_size=batch_size)
+
+    checked, changed = 0, []
+    with transaction.atomic():
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                changed += _regrade_batch(batch, resolver, batch_size)
+                checked += len(batch)
+                batch = []
+        if batch:
+            changed += _regrade_batch(batch, resolver, batch_size)
+            checked += len(batch)
+        if changed:
+            student_ids = [student_id for student_id, _ in changed]
+            course_ids = [course_id for _, course_id in changed]
+            transaction.on_commit(lambda: invalidate_transcripts(student_ids, course_ids))
+    return {'checked': checked, 'updated': len(changed)}
+
+
+def _regrade_batch(rows, resolver, batch_size):
+    # Group rows by the scale that applies to them, then grade each group column-wise
+    # Returns (student_id, course_id) of every row it rewrote
+    groups = {}
+    for row in rows:
+        groups.setdefault(id(resolver.scale_for(row[2], row[3])), []).append(row)
+
+    changed, touched = [], []
+    for group in groups.values():
+        scale = resolver.scale_for(group[0][2], group[0][3])
+        ids, student_ids, course_ids, _, internal, external, practical, old_totals, old_grades = zip(*group)
+        totals = compute_totals(internal, external, practical)
+        grades = scale.grade_all(totals)
+        for result_id, student_id, course_id, total, grade, old_total, old_grade in zip(
+            ids, student_ids, course_ids, totals, grades, old_totals, old_grades
+        ):
+            if total != old_total or grade != old_grade:
+                changed.append(StudentResult(id=result_id, total_marks=total, grade=grade))
+                touched.append((student_id, course_id))
+    if changed:
+        StudentResult.objects.bulk_update(changed, ['total_marks', 'grade'], batch_size=batch_size)
+    return touched
+
+
+def queue_regrade(course_id=None, academic_year=''):
+    """Ask for the results of a course and/or academic year to be regraded by the next --pending run"""
+    PendingRegrade.objects.get_or_create(course_id=course_id, academic_year=academic_year or '')
+
+
+def run_pending_regrades(batch_size=2000):
+    """
+    Regrade everything queued by queue_regrade(), oldest request first.
+    Each request is claimed by deleting its row before the regrade starts,
+    so a scheme saved meanwhile queues a fresh request instead of being
+    dropped, and a concurrent run skips it. A failed regrade is queued
+    again. Returns the summed regrade_results() counts.
+    """
+    totals = {'requests': 0, 'checked': 0, 'updated': 0}
+    for pending in PendingRegrade.objects.order_by('id'):
+        if not PendingRegrade.objects.filter(id=pending.id).delete()[0]:
+            continue  # Claimed by another run
+        try:
+            counts = regrade_results(course_id=pending.course_id, academic_year=pending.academic_year or None,
+                                     batch_size=batch_size)
+        except Exception:
+            queue_regrade(pending.course_id, pending.academic_year)
+            raise
+        totals['requests'] += 1
+        totals['checked'] += counts['checked']
+        totals['updated'] += counts['updated']
+    return totals
@@ -0,0 +1,229 @@
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template, render_to_string
+from pypdf import PdfWriter
+
+from .models import HallTicket, PendingPregeneration
+
+try:
+    from xhtml2pdf import pisa
+except (ImportError, OSError):
+    pisa = None
+
+PDF_GENERATION_AVAILABLE = pisa is not None
+HALL_TICKET_TEMPLATE = 'main_app/student/hall_ticket_pdf.html'
+
+
+def hall_ticket_queryset():
+    """Tickets with everything the PDF template reads, in two queries"""
+    return HallTicket.objects.select_related(
+        'student__admin', 'student__course', 'exam__hall', 'hall'
+    ).prefetch_related('exam__exam_subjects__subject')
+
+
+@lru_cache(maxsize=None)
+def template_version():
+    """Digest of the PDF template source, so a template change produces new files"""
+    return hashlib.sha256(get_template(HALL_TICKET_TEMPLATE).template.source.encode()).hexdigest()
+
+
+def hall_ticket_pdf_key(ticket):
+    """
+    Content address of a ticket's PDF: a digest of every value the template
+    prints plus the template version. Editing the ticket, its exam, the
+    exam's subjects, hall or the student's name yields a new key; saving
+    the exam or its subjects without changing what is printed does not.
+    """
+    student = ticket.student
+    parts = [
+        template_version(),
+        ticket.id, ticket.hall_ticket_number, ticket.seat_number, ticket.bench_number,
+        ticket.updated_at.isoformat(),
+        student.admin.first_name, student.admin.last_name, student.course.name if student.course else '',
+        ticket.exam.name, ticket.assigned_hall.name,
+    ]
+    for exam_subject in ticket.exam.exam_subjects.all():
+        parts += [
+            exam_subject.id, exam_subject.subject.name, exam_subject.date,
+            exam_subject.start_time, exam_subject.end_time,
+        ]
+    return hashlib.sha256('\x1f'.join(map(str, parts)).encode()).hexdigest()
+
+
+def hall_ticket_pdf_dir(exam_id):
+    return os.path.join(settings.MEDIA_ROOT, 'hall_tickets', str(exam_id))
+
+
+def hall_ticket_pdf_path(ticket, key=None):
+    key = key or hall_ticket_pdf_key(ticket)
+    return os.path.join(hall_ticket_pdf_dir(ticket.exam_id), f'{ticket.id}-{key}.pdf')
+
+
+def render_hall_ticket_pdf(ticket):
+    """Render the ticket with xhtml2pdf and return the PDF bytes"""
+    if not PDF_GENERATION_AVAILABLE:
+        raise ValueError('PDF generation is not available. Please install xhtml2pdf.')
+    html_string = render_to_string(HALL_TICKET_TEMPLATE, {'ticket': ticket})
+    buffer = BytesIO()
+    pisa_status = pisa.pisaDocument(BytesIO(html_string.encode('UTF-8')), buffer)
+    if pisa_status.err:
+        raise ValueError('Error generating PDF')
+    return buffer.getvalue()
+
+
+def get_hall_ticket_pdf(ticket):
+    """
+    Return (path, key) of the ticket's cached PDF, rendering it on a miss.
+    Files are written to a temporary name and renamed into place, so a
+    concurrent download never reads a half-written PDF. Older versions of
+    the same ticket are removed once the new one is in place.
+    """
+    key = hall_ticket_pdf_key(ticket)
+    path = hall_ticket_pdf_path(ticket, key)
+    if not os.path.exists(path):
+        pdf = render_hall_ticket_pdf(ticket)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(pdf)
+        os.replace(temp_path, path)
+        discard_hall_ticket_pdfs(ticket.exam_id, ticket.id, keep=path)
+    return path, key
+
+
+def discard_hall_ticket_pdfs(exam_id, ticket_id=None, keep=None, hall_ids=()):
+    """
+    Delete cached PDFs of one ticket, or of the whole exam when ticket_id is
+    None. The merged PDFs of `hall_ids` go too, as they embed the ticket.
+    """
+    directory = hall_ticket_pdf_dir(exam_id)
+    if ticket_id is None:
+        shutil.rmtree(directory, ignore_errors=True)
+        return
+    paths = glob.glob(os.path.join(directory, f'{ticket_id}-*.pdf'))
+    paths += [os.path.join(directory, f'hall-{hall_id}.pdf') for hall_id in hall_ids if hall_id]
+    for path in paths:
+        if path != keep:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _render_tickets(ticket_ids):
+    """Render a chunk of tickets; returns [(ticket_id, error or None)]"""
+    results = []
+    for ticket in hall_ticket_queryset().filter(id__in=ticket_ids):
+        try:
+            get_hall_ticket_pdf(ticket)
+            results.append((ticket.id, None))
+        except Exception as e:
+            results.append((ticket.id, str(e)))
+    return results
+
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones already have it
+    django.setup()
+
+
+def pregenerate_hall_tickets(exam_id, workers=None, chunk_size=25, progress=None):
+    """
+    Render every missing PDF of an exam ahead of time.
+
+    Tickets whose current PDF is already on disk are skipped, so an
+    interrupted run simply resumes. The rest are split into chunks and
+    rendered by a ProcessPoolExecutor with `workers` processes (default:
+    CPU count); workers=1 renders in this process. `progress(done, total)`
+    is called after each chunk. Returns a dict with rendered/skipped counts
+    and a list of (ticket_id, error) failures.
+    """
+    pending, skipped = [], 0
+    for ticket in hall_ticket_queryset().filter(exam_id=exam_id).order_by('id'):
+        if os.path.exists(hall_ticket_pdf_path(ticket)):
+            skipped += 1
+        else:
+            pending.append(ticket.id)
+
+    chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks)) or 1
+    rendered, failed, done = 0, [], 0
+
+    def collect(results):
+        nonlocal rendered, done
+        for ticket_id, error in results:
+            if error is None:
+                rendered += 1
+            else:
+                failed.append((ticket_id, error))
+        done += len(results)
+        if progress:
+            progress(done, len(pending))
+
+    if workers == 1:
+        for chunk in chunks:
+            collect(_render_tickets(chunk))
+    else:
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            for future in as_completed([executor.submit(_render_tickets, chunk) for chunk in chunks]):
+                collect(future.result())
+
+    return {'rendered': rendered, 'skipped': skipped, 'failed': failed}
+
+
+def merge_hall_ticket_pdfs(exam_id):
+    """
+    Write one PDF per hall with the tickets in seat order, for invigilators.
+    Tickets must already be rendered. Returns {hall name: path}.
+    """
+    tickets = {}
+    for ticket in hall_ticket_queryset().filter(exam_id=exam_id).order_by('seat_number', 'id'):
+        tickets.setdefault(ticket.assigned_hall, []).append(ticket)
+
+    merged = {}
+    for hall, hall_tickets in tickets.items():
+        writer = PdfWriter()
+        for ticket in hall_tickets:
+            writer.append(hall_ticket_pdf_path(ticket))
+        path = os.path.join(hall_ticket_pdf_dir(exam_id), f'hall-{hall.id}.pdf')
+        with open(path, 'wb') as merged_file:
+            writer.write(merged_file)
+        merged[hall.name] = path
+    return merged
+
+
+def queue_pregeneration(exam_id):
+    """Ask for an exam's PDFs to be rendered by the next `pregenerate_hall_tickets --pending` run"""
+    PendingPregeneration.objects.get_or_create(exam_id=exam_id)
+
+
+def run_pending_pregenerations(workers=None, chunk_size=25, progress=None):
+    """
+    Pre-render every queued exam, oldest first. Each exam is claimed by
+    deleting its queue row and queued again if rendering raises, so a
+    concurrent runner skips it and a crash does not lose it. Returns
+    {exam_id: pregenerate_hall_tickets() result}.
+    """
+    results = {}
+    for pending in PendingPregeneration.objects.order_by('id'):
+        if not PendingPregeneration.objects.filter(id=pending.id).delete()[0]:
+            continue  # Claimed by another runner
+        try:
+            results[pending.exam_id] = pregenerate_hall_tickets(
+                pending.exam_id, workers=workers, chunk_size=chunk_size, progress=progress)
+        except Exception:
+            queue_pregeneration(pending.exam_id)
+            raise
+    return results
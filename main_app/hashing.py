@@ -0,0 +1,31 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.contrib.auth.hashers import get_hasher, make_password
+
+# Below this many passwords starting a pool costs more than it saves
+POOL_THRESHOLD = 8
+
+
+def _hash_chunk(passwords, algorithm):
+    # Runs in pool workers; this module imports no models so it loads before the app registry
+    return [make_password(password, hasher=algorithm) for password in passwords]
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hash each password with the default hasher, in order. Work is spread
+    over a process pool of `workers` processes (default: one per CPU),
+    since PBKDF2 is CPU-bound and threads would share one interpreter lock.
+    """
+    passwords = list(passwords)
+    algorithm = get_hasher().algorithm
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < POOL_THRESHOLD:
+        return _hash_chunk(passwords, algorithm)
+    # A few chunks per worker keeps every process busy until the end
+    size = -(-len(passwords) // (workers * 4))
+    chunks = [passwords[start:start + size] for start in range(0, len(passwords), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [hashed for chunk in pool.map(_hash_chunk, chunks, repeat(algorithm)) for hashed in chunk]
@@ -1,88 +1,26 @@
-import json
-import requests
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponse, HttpResponseRedirect,
                               get_object_or_404, redirect, render)
-from django.templatetags.static import static
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import UpdateView
 
+from .admissions import STUDENT_IMPORT_HEADER, StudentImportError, import_student_sheet
+from .dashboard import admin_dashboard_stats
 from .forms import *
+from .middleware import get_profile
 from .models import *
+from .notifications import notify_staff, notify_students
+from .rosters import roster_page
+from .spreadsheets import read_spreadsheet
+from .transcripts import course_rank_list
 
 
 def admin_home(request):
-    total_staff = Staff.objects.all().count()
-    total_students = Student.objects.all().count()
-    subjects = Subject.objects.all()
-    total_subject = subjects.count()
-    total_course = Course.objects.all().count()
-    attendance_list = Attendance.objects.filter(subject__in=subjects)
-    total_attendance = attendance_list.count()
-    attendance_list = []
-    subject_list = []
-    for subject in subjects:
-        attendance_count = Attendance.objects.filter(subject=subject).count()
-        subject_list.append(subject.name[:7])
-        attendance_list.append(attendance_count)
-
-    # Total Subjects and students in Each Course
-    course_all = Course.objects.all()
-    course_name_list = []
-    subject_count_list = []
-    student_count_list_in_course = []
-
-    for course in course_all:
-        subjects = Subject.objects.filter(course_id=course.id).count()
-        students = Student.objects.filter(course_id=course.id).count()
-        course_name_list.append(course.name)
-        subject_count_list.append(subjects)
-        student_count_list_in_course.append(students)
-    
-    subject_all = Subject.objects.all()
-    subject_list = []
-    student_count_list_in_subject = []
-    for subject in subject_all:
-        course = Course.objects.get(id=subject.course.id)
-        student_count = Student.objects.filter(course_id=course.id).count()
-        subject_list.append(subject.name)
-        student_count_list_in_subject.append(student_count)
-
-
-    # For Students
-    student_attendance_present_list=[]
-    student_attendance_leave_list=[]
-    student_name_list=[]
-
-    students = Student.objects.all()
-    for student in students:
-        
-        attendance = AttendanceReport.objects.filter(student_id=student.id, status=True).count()
-        absent = AttendanceReport.objects.filter(student_id=student.id, status=False).count()
-        leave = LeaveReportStudent.objects.filter(student_id=student.id, status=1).count()
-        student_attendance_present_list.append(attendance)
-        student_attendance_leave_list.append(leave+absent)
-        student_name_list.append(student.admin.first_name)
-
-    context = {
-        'page_title': "Administrative Dashboard",
-        'total_students': total_students,
-        'total_staff': total_staff,
-        'total_course': total_course,
-        'total_subject': total_subject,
-        'subject_list': subject_list,
-        'attendance_list': attendance_list,
-        'student_attendance_present_list': student_attendance_present_list,
-        'student_attendance_leave_list': student_attendance_leave_list,
-        "student_name_list": student_name_list,
-        "student_count_list_in_subject": student_count_list_in_subject,
-        "student_count_list_in_course": student_count_list_in_course,
-        "course_name_list": course_name_list,
-
-    }
+    context = admin_dashboard_stats()
+    context['page_title'] = "Administrative Dashboard"
     return render(request, 'hod_template/home_content.html', context)
 
 
@@ -154,6 +92,42 @@ def add_student(request):
     return render(request, 'hod_template/add_student_template.html', context)
 
 
+def import_students(request):
+    """Upload a CSV/XLSX list of students to admit in one batch"""
+    context = {
+        'courses': Course.objects.all(),
+        'sessions': Session.objects.all(),
+        'columns': STUDENT_IMPORT_HEADER,
+        'page_title': 'Import Students',
+        'errors': [],
+    }
+    if request.method != 'POST':
+        return render(request, 'hod_template/import_students.html', context)
+
+    course_id = request.POST.get('course')
+    session_id = request.POST.get('session')
+    course = get_object_or_404(Course, id=course_id) if course_id else None
+    session = get_object_or_404(Session, id=session_id) if session_id else None
+    upload = request.FILES.get('file')
+    if not upload:
+        messages.error(request, 'Choose a file to import')
+        return render(request, 'hod_template/import_students.html', context)
+
+    try:
+        # Hashed in this process: forking a pool would tie up the web worker; the command uses one
+        counts = import_student_sheet(read_spreadsheet(upload), course, session, workers=1)
+    except StudentImportError as e:
+        messages.error(request, str(e))
+        context['errors'] = e.errors
+        return render(request, 'hod_template/import_students.html', context, status=400)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return render(request, 'hod_template/import_students.html', context, status=400)
+
+    messages.success(request, f"Imported {counts['created']} students")
+    return redirect(reverse('import_students'))
+
+
 def add_course(request):
     form = CourseForm(request.POST or None)
     context = {
@@ -187,11 +161,13 @@ def add_subject(request):
             name = form.cleaned_data.get('name')
             course = form.cleaned_data.get('course')
             staff = form.cleaned_data.get('staff')
+            credits = form.cleaned_data.get('credits')
             try:
                 subject = Subject()
                 subject.name = name
                 subject.staff = staff
                 subject.course = course
+                subject.credits = credits
                 subject.save()
                 messages.success(request, "Successfully Added")
                 return redirect(reverse('add_subject'))
@@ -205,20 +181,16 @@ def add_subject(request):
 
 
 def manage_staff(request):
-    allStaff = CustomUser.objects.filter(user_type=2)
-    context = {
-        'allStaff': allStaff,
-        'page_title': 'Manage Staff'
-    }
+    context = roster_page('staff', request.GET)
+    context['allStaff'] = context['page']
+    context['page_title'] = 'Manage Staff'
     return render(request, "hod_template/manage_staff.html", context)
 
 
 def manage_student(request):
-    students = CustomUser.objects.filter(user_type=3)
-    context = {
-        'students': students,
-        'page_title': 'Manage Students'
-    }
+    context = roster_page('student', request.GET)
+    context['students'] = context['page']
+    context['page_title'] = 'Manage Students'
     return render(request, "hod_template/manage_student.html", context)
 
 
@@ -231,6 +203,24 @@ def manage_course(request):
     return render(request, "hod_template/manage_course.html", context)
 
 
+def rank_list(request):
+    """Class rank list by CGPA, or by SGPA for one semester of an academic year"""
+    courses = Course.objects.all()
+    course_id = request.GET.get('course')
+    semester = request.GET.get('semester', '').strip()
+    academic_year = request.GET.get('academic_year', '').strip()
+    course = get_object_or_404(Course, id=course_id) if course_id else None
+    context = {
+        'courses': courses,
+        'course': course,
+        'semester': semester,
+        'academic_year': academic_year,
+        'ranks': course_rank_list(course.id, semester, academic_year) if course else [],
+        'page_title': 'Rank List'
+    }
+    return render(request, "hod_template/rank_list.html", context)
+
+
 def manage_subject(request):
     subjects = Subject.objects.all()
     context = {
@@ -375,11 +365,13 @@ def edit_subject(request, subject_id):
             name = form.cleaned_data.get('name')
             course = form.cleaned_data.get('course')
             staff = form.cleaned_data.get('staff')
+            credits = form.cleaned_data.get('credits')
             try:
                 subject = Subject.objects.get(id=subject_id)
                 subject.name = name
                 subject.staff = staff
                 subject.course = course
+                subject.credits = credits
                 subject.save()
                 messages.success(request, "Successfully Updated")
                 return redirect(reverse('edit_subject', args=[subject_id]))
@@ -583,7 +575,7 @@ def get_admin_attendance(request):
 
 
 def admin_view_profile(request):
-    admin = get_object_or_404(Admin, admin=request.user)
+    admin = get_profile(request, Admin)
     form = AdminForm(request.POST or None, request.FILES or None,
                      instance=admin)
     context = {'form': form,
@@ -621,7 +613,8 @@ def admin_notify_staff(request):
     staff = CustomUser.objects.filter(user_type=2)
     context = {
         'page_title': "Send Notifications To Staff",
-        'allStaff': staff
+        'allStaff': staff,
+        'courses': Course.objects.all()
     }
     return render(request, "hod_template/staff_notification.html", context)
 
@@ -630,7 +623,9 @@ def admin_notify_student(request):
     student = CustomUser.objects.filter(user_type=3)
     context = {
         'page_title': "Send Notifications To Students",
-        'students': student
+        'students': student,
+        'courses': Course.objects.all(),
+        'sessions': Session.objects.all()
     }
     return render(request, "hod_template/student_notification.html", context)
 
@@ -641,22 +636,8 @@ def send_student_notification(request):
     message = request.POST.get('message')
     student = get_object_or_404(Student, admin_id=id)
     try:
-        url = "https://fcm.googleapis.com/fcm/send"
-        body = {
-            'notification': {
-                'title': "Student Management System",
-                'body': message,
-                'click_action': reverse('student_view_notification'),
-                'icon': static('dist/img/AdminLTELogo.png')
-            },
-            'to': student.admin.fcm_token
-        }
-        headers = {'Authorization':
-                   'key=AAAA3Bm8j_M:APA91bElZlOLetwV696SoEtgzpJr2qbxBfxVBfDWFiopBWzfCfzQp2nRyC7_A2mlukZEHV4g1AmyC6P_HonvSkY2YyliKt5tT3fe_1lrKod2Daigzhb2xnYQMxUWjCAIQcUexAMPZePB',
-                   'Content-Type': 'application/json'}
-        data = requests.post(url, data=json.dumps(body), headers=headers)
-        notification = NotificationStudent(student=student, message=message)
-        notification.save()
+        # The push is queued; notification_worker delivers it
+        notify_students(Student.objects.filter(id=student.id), message)
         return HttpResponse("True")
     except Exception as e:
         return HttpResponse("False")
@@ -668,27 +649,41 @@ def send_staff_notification(request):
     message = request.POST.get('message')
     staff = get_object_or_404(Staff, admin_id=id)
     try:
-        url = "https://fcm.googleapis.com/fcm/send"
-        body = {
-            'notification': {
-                'title': "Student Management System",
-                'body': message,
-                'click_action': reverse('staff_view_notification'),
-                'icon': static('dist/img/AdminLTELogo.png')
-            },
-            'to': staff.admin.fcm_token
-        }
-        headers = {'Authorization':
-                   'key=AAAA3Bm8j_M:APA91bElZlOLetwV696SoEtgzpJr2qbxBfxVBfDWFiopBWzfCfzQp2nRyC7_A2mlukZEHV4g1AmyC6P_HonvSkY2YyliKt5tT3fe_1lrKod2Daigzhb2xnYQMxUWjCAIQcUexAMPZePB',
-                   'Content-Type': 'application/json'}
-        data = requests.post(url, data=json.dumps(body), headers=headers)
-        notification = NotificationStaff(staff=staff, message=message)
-        notification.save()
+        notify_staff(Staff.objects.filter(id=staff.id), message)
         return HttpResponse("True")
     except Exception as e:
         return HttpResponse("False")
 
 
+def send_bulk_notification(request):
+    """Notify every student (or staff member) of a course and/or session at once"""
+    audience = request.POST.get('audience')
+    back = 'admin_notify_staff' if audience == 'staff' else 'admin_notify_student'
+    if request.method != 'POST':
+        return redirect(reverse(back))
+    message = request.POST.get('message', '').strip()
+    course_id = request.POST.get('course')
+    session_id = request.POST.get('session')
+    if not message:
+        messages.error(request, "Please enter a message")
+        return redirect(reverse(back))
+
+    if audience == 'staff':
+        recipients = Staff.objects.all()
+        if course_id:
+            recipients = recipients.filter(course_id=course_id)
+        count = notify_staff(recipients, message)
+    else:
+        recipients = Student.objects.all()
+        if course_id:
+            recipients = recipients.filter(course_id=course_id)
+        if session_id:
+            recipients = recipients.filter(session_id=session_id)
+        count = notify_students(recipients, message)
+    messages.success(request, f"Notification queued for {count} recipient(s)")
+    return redirect(reverse(back))
+
+
 def delete_staff(request, staff_id):
     staff = get_object_or_404(CustomUser, staff__id=staff_id)
     staff.delete()
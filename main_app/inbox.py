@@ -0,0 +1,44 @@
+from .models import Notification, NotificationStaff, NotificationStudent
+from .pagination import InvalidCursor, keyset_paginate
+
+INBOX_PAGE_SIZE = 20
+
+
+def unread_count(user):
+    """Unread notifications of a user; one count answered from notification_unread_idx"""
+    return Notification.objects.filter(user=user, is_read=False).count()
+
+
+def inbox_page(notifications, params, per_page=INBOX_PAGE_SIZE):
+    """
+    Newest-first keyset page of a notification queryset, following the
+    `after`/`before` cursors in `params`. A bad cursor shows the first page.
+    """
+    try:
+        return keyset_paginate(notifications, after=params.get('after'), before=params.get('before'),
+                               per_page=per_page)
+    except InvalidCursor:
+        return keyset_paginate(notifications, per_page=per_page)
+
+
+def user_inbox(user, params):
+    return inbox_page(Notification.objects.filter(user=user), params)
+
+
+def student_inbox(student, params):
+    return inbox_page(NotificationStudent.objects.filter(student=student), params)
+
+
+def staff_inbox(staff, params):
+    return inbox_page(NotificationStaff.objects.filter(staff=staff), params)
+
+
+def mark_read(user, ids=None):
+    """
+    Mark the user's notifications (all, or only `ids`) as read. Rows that
+    are already read are left alone; returns how many rows changed.
+    """
+    unread = Notification.objects.filter(user=user, is_read=False)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+    return unread.update(is_read=True)
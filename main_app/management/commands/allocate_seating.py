@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.seating import allocate_exam_seating
+
+
+class Command(BaseCommand):
+    help = 'Seats the students of several exams across several halls, interleaving courses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, action='append', required=True, dest='exams',
+                            help='Exam id (repeat for every exam sharing the halls)')
+        parser.add_argument('--hall', type=int, action='append', required=True, dest='halls',
+                            help='Exam hall id, in the order the halls should be filled')
+
+    def handle(self, *args, **options):
+        try:
+            tickets = allocate_exam_seating(options['exams'], options['halls'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Successfully generated {len(tickets)} hall tickets'))
@@ -0,0 +1,75 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.shortcuts import redirect
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from main_app.middleware import LoginCheckMiddleWare
+from main_app.models import CustomUser
+
+PATHS = ('login_page', 'admin_home', 'staff_home', 'student_home', 'student_notifications', 'notification_unread_count')
+
+
+def legacy_check(request, view_func):
+    """The module-name and reverse() chain LoginCheckMiddleWare used before the compiled table"""
+    modulename = view_func.__module__
+    user = request.user
+    if user.is_authenticated:
+        if user.user_type == '1':
+            if modulename == 'main_app.student_views':
+                return redirect(reverse('admin_home'))
+        elif user.user_type == '2':
+            if modulename == 'main_app.student_views' or modulename == 'main_app.hod_views':
+                return redirect(reverse('staff_home'))
+        elif user.user_type == '3':
+            if modulename == 'main_app.hod_views' or modulename == 'main_app.staff_views':
+                return redirect(reverse('student_home'))
+        else:
+            return redirect(reverse('login_page'))
+    else:
+        if request.path == reverse('login_page') or modulename == 'django.contrib.auth.views' or request.path == reverse('user_login') or request.path == reverse('setup_admin'):
+            pass
+        else:
+            return redirect(reverse('login_page'))
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the per-request permission check of LoginCheckMiddleWare (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        users = [AnonymousUser()] + [CustomUser(user_type=role) for role in ('1', '2', '3')]
+        cases = []
+        for name in PATHS:
+            path = reverse(name)
+            view_func = resolve(path).func
+            for user in users:
+                request = factory.get(path)
+                request.user = user
+                cases.append((request, view_func))
+
+        middleware = LoginCheckMiddleWare(lambda request: None)
+        checks = {
+            'before (module names + reverse)': lambda request, view_func: legacy_check(request, view_func),
+            'after (compiled table)': lambda request, view_func: middleware.process_view(request, view_func, (), {}),
+        }
+        calls = options['iterations'] * len(cases)
+        for label, check in checks.items():
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                for _ in range(options['iterations']):
+                    for request, view_func in cases:
+                        check(request, view_func)
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}: best {min(timings) / calls * 1e6:.2f} us, '
+                f'mean {sum(timings) / len(timings) / calls * 1e6:.2f} us per request '
+                f'over {len(cases)} path/role pairs'
+            ))
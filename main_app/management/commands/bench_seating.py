@@ -0,0 +1,48 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_app.seating import plan_seating
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the seating planner on synthetic halls and students (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--courses', type=int, default=6)
+        parser.add_argument('--rows', type=int, default=8)
+        parser.add_argument('--columns', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        students = options['students']
+        courses = options['courses']
+        seats_per_hall = options['rows'] * options['columns']
+
+        # Uneven course sizes, like a real exam week
+        weights = [rng.uniform(0.5, 1.5) for _ in range(courses)]
+        groups = {course: [] for course in range(courses)}
+        for student_id in range(students):
+            groups[rng.choices(range(courses), weights)[0]].append(student_id)
+
+        hall_count = -(-students * 11 // 10 // seats_per_hall)  # 10% spare seats
+        halls = [(hall_id, options['rows'], options['columns'], seats_per_hall) for hall_id in range(hall_count)]
+
+        timings = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            seats, clashes = plan_seating(groups, halls)
+            timings.append(time.perf_counter() - start)
+
+        self.stdout.write(
+            f'{students} students, {courses} courses, {hall_count} halls of {seats_per_hall} seats: '
+            f'{len(seats)} seated, {clashes} adjacent clashes'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'best {min(timings) * 1000:.1f} ms, mean {sum(timings) / len(timings) * 1000:.1f} ms '
+            f'over {len(timings)} runs'
+        ))
@@ -0,0 +1,73 @@
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.chatbot import RANKERS, ChatbotIndex
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = 'Compares chatbot rankers on queries derived from the stored FAQ (run seed_chatbot first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ranker', action='append', choices=RANKERS, dest='rankers',
+                            help='Ranker to evaluate (repeatable, default: all)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed passes over the query set')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def build_queries(self, index, rng):
+        """(variant, query, expected question) triples: the question itself, its long words and a shuffle"""
+        queries = []
+        for question in dict.fromkeys(index.questions):
+            words = question.split()
+            keywords = [word for word in re.findall(r'\w+', question) if len(word) > 3]
+            shuffled = words[:]
+            rng.shuffle(shuffled)
+            queries.append(('exact', question, question))
+            if keywords:
+                queries.append(('keywords', ' '.join(keywords), question))
+            queries.append(('shuffled', ' '.join(shuffled), question))
+        return queries
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = ChatbotIndex.build()
+        build_time = time.perf_counter() - start
+        if not index.entries:
+            raise CommandError('No chatbot entries found. Run `python manage.py seed_chatbot` first.')
+
+        queries = self.build_queries(index, random.Random(options['seed']))
+        variants = list(dict.fromkeys(variant for variant, _, _ in queries))
+        self.stdout.write(f'{len(index.entries)} entries, {len(queries)} queries, index built in {build_time * 1000:.1f} ms')
+
+        for ranker in options['rankers'] or RANKERS:
+            start = time.perf_counter()
+            index.best_match('warm up', ranker)  # Builds the ranker's own structures
+            warm_up = time.perf_counter() - start
+
+            correct = dict.fromkeys(variants, 0)
+            totals = dict.fromkeys(variants, 0)
+            timings = []
+            for _ in range(options['repeat']):
+                for variant, query, expected in queries:
+                    start = time.perf_counter()
+                    entry, score = index.best_match(query, ranker)
+                    timings.append(time.perf_counter() - start)
+                    totals[variant] += 1
+                    # Answers below the view's 0.3 threshold are never shown
+                    if entry is not None and score > 0.3 and entry.question.lower() == expected:
+                        correct[variant] += 1
+
+            accuracy = sum(correct.values()) / sum(totals.values())
+            breakdown = ', '.join(f'{variant} {correct[variant] / totals[variant]:.0%}' for variant in variants)
+            self.stdout.write(self.style.SUCCESS(
+                f'{ranker}: accuracy {accuracy:.1%} ({breakdown}), '
+                f'p50 {percentile(timings, 0.5) * 1000:.3f} ms, p99 {percentile(timings, 0.99) * 1000:.3f} ms, '
+                f'setup {warm_up * 1000:.1f} ms'
+            ))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.admissions import StudentImportError, import_student_sheet
+from main_app.models import Course, Session
+from main_app.spreadsheets import read_spreadsheet
+
+
+class Command(BaseCommand):
+    help = 'Admits every student listed in a CSV/XLSX file; nothing is imported unless every row is valid'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='A .csv or .xlsx file')
+        parser.add_argument('--course', type=int, help='Course id for rows with a blank Course')
+        parser.add_argument('--session', type=int, help='Session id for rows with a blank Session')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        course = session = None
+        try:
+            if options['course']:
+                course = Course.objects.get(id=options['course'])
+            if options['session']:
+                session = Session.objects.get(id=options['session'])
+        except (Course.DoesNotExist, Session.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as upload:
+                counts = import_student_sheet(read_spreadsheet(upload), course, session, workers=options['workers'])
+        except StudentImportError as e:
+            for error in e.errors:
+                self.stderr.write(f"Row {error['row']} ({error['email']}): {error['error']}")
+            raise CommandError(f'{e} ({len(e.errors)} problems)')
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Imported {counts['created']} students in {elapsed:.1f} s"))
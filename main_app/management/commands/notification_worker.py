@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_app.notifications import dispatch_notifications, get_transport
+
+
+class Command(BaseCommand):
+    help = 'Sends queued push notifications from the outbox, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send what is due now and exit')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent requests to the push service')
+        parser.add_argument('--batch-size', type=int, default=500, help='Notifications claimed per round')
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to wait when nothing is due')
+
+    def handle(self, *args, **options):
+        transport = get_transport(pool_size=options['workers'])
+        try:
+            while True:
+                counts = dispatch_notifications(
+                    transport, batch_size=options['batch_size'], workers=options['workers'],
+                    max_attempts=options['max_attempts'],
+                )
+                if any(counts.values()):
+                    self.stdout.write(
+                        f"sent {counts['sent']}, retrying {counts['retried']}, failed {counts['failed']}")
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            transport.close()
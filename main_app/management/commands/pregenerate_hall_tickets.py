@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.hall_ticket_pdf import (PDF_GENERATION_AVAILABLE, merge_hall_ticket_pdfs, pregenerate_hall_tickets,
+                                     run_pending_pregenerations)
+from main_app.models import Exam
+
+
+class Command(BaseCommand):
+    help = 'Renders every hall-ticket PDF of an exam ahead of time; re-running resumes where it stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, nargs='?')
+        parser.add_argument('--pending', action='store_true',
+                            help='Render the exams queued by generating hall tickets instead, for a job runner')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Rendering processes (default: CPU count, 1 renders in-process)')
+        parser.add_argument('--chunk-size', type=int, default=25, help='Tickets handed to a worker at a time')
+        parser.add_argument('--merge', action='store_true',
+                            help='Also write one merged PDF per hall, in seat order, for invigilators')
+
+    def handle(self, *args, **options):
+        if not PDF_GENERATION_AVAILABLE:
+            raise CommandError('PDF generation is not available. Please install xhtml2pdf.')
+
+        def progress(done, total):
+            self.stdout.write(f'Rendered {done}/{total}')
+
+        if options['pending']:
+            results = run_pending_pregenerations(
+                workers=options['workers'], chunk_size=options['chunk_size'], progress=progress)
+            for exam_id, result in results.items():
+                self.report(f'Exam {exam_id}: ', result)
+            self.stdout.write(f'Ran {len(results)} queued exam(s)')
+            return
+        if options['exam_id'] is None:
+            raise CommandError('Give an exam id or --pending')
+        if not Exam.objects.filter(id=options['exam_id']).exists():
+            raise CommandError(f"Exam {options['exam_id']} does not exist")
+
+        result = pregenerate_hall_tickets(
+            options['exam_id'], workers=options['workers'], chunk_size=options['chunk_size'], progress=progress
+        )
+        self.report('', result)
+
+        if options['merge']:
+            if result['failed']:
+                raise CommandError('Not merging while some tickets failed to render')
+            for hall, path in merge_hall_ticket_pdfs(options['exam_id']).items():
+                self.stdout.write(self.style.SUCCESS(f'{hall}: {path}'))
+
+    def report(self, prefix, result):
+        for ticket_id, error in result['failed']:
+            self.stderr.write(f'Ticket {ticket_id}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result['rendered']} rendered, {result['skipped']} already up to date, "
+            f"{len(result['failed'])} failed"
+        ))
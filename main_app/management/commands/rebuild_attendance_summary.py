@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from main_app.attendance import find_attendance_drift, rebuild_attendance_summary
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the attendance rollup from raw attendance reports, or reports drift with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report rows where the rollup disagrees with the reports')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = find_attendance_drift()
+            for (student_id, subject_id, session_id), stored, expected in drift:
+                self.stdout.write(
+                    f'student={student_id} subject={subject_id} session={session_id} '
+                    f'stored(present, absent)={stored} expected={expected}'
+                )
+            if drift:
+                self.stdout.write(self.style.WARNING(f'{len(drift)} rollup rows have drifted'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Attendance rollup is in sync'))
+            return
+
+        rows = rebuild_attendance_summary()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt attendance rollup with {rows} rows'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_app.grading import np, regrade_results, run_pending_regrades
+
+
+class Command(BaseCommand):
+    help = 'Recomputes result totals and grades with the current grading schemes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help='Only results of this course id')
+        parser.add_argument('--semester', help='Only results of this semester')
+        parser.add_argument('--academic-year', help='Only results of this academic year')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--pending', action='store_true',
+                            help='Run the regrades queued by grading scheme changes instead')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['pending']:
+            counts = run_pending_regrades(batch_size=options['batch_size'])
+            self.stdout.write(f"Ran {counts['requests']} queued regrade(s)")
+        else:
+            counts = regrade_results(
+                course_id=options['course'], semester=options['semester'],
+                academic_year=options['academic_year'], batch_size=options['batch_size'],
+            )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {counts['checked']} results, updated {counts['updated']} "
+            f"in {elapsed * 1000:.1f} ms ({'numpy' if np is not None else 'pure Python'})"
+        ))
@@ -1,26 +1,62 @@
+from django.http import Http404
 from django.utils.deprecation import MiddlewareMixin
-from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 from django.shortcuts import redirect
 
+from .models import Admin, Staff, Student
+from .permissions import ANONYMOUS, PermissionTable
+
+# Profile model of each user_type and the relations views read off it
+ROLE_PROFILES = {
+    '1': (Admin, 'admin', ()),
+    '2': (Staff, 'staff', ('course',)),
+    '3': (Student, 'student', ('course', 'session')),
+}
+
+
+def load_profile(user):
+    """
+    The Admin/Staff/Student row of a user with its course and session, or
+    None. The user's reverse accessor (user.staff, user.student) is primed
+    with it, so later lookups through either side cost nothing.
+    """
+    if user.user_type not in ROLE_PROFILES:
+        return None
+    model, accessor, related = ROLE_PROFILES[user.user_type]
+    profile = model.objects.select_related(*related).filter(admin=user).first()
+    if profile is not None:
+        setattr(user, accessor, profile)
+    return profile
+
+
+def get_profile(request, model):
+    """
+    The request's role profile when it is a `model`; raises Http404 like
+    get_object_or_404(model, admin=request.user) otherwise.
+    """
+    profile = getattr(request, 'profile', None)
+    if profile is None:
+        profile = request.profile = SimpleLazyObject(lambda: load_profile(request.user))
+    if not isinstance(profile, model):
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+    return profile
+
 
 class LoginCheckMiddleWare(MiddlewareMixin):
+    """
+    Sends users away from views their role may not open, using a
+    PermissionTable compiled from the URLconf when the middleware loads.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.permissions = PermissionTable()
+
     def process_view(self, request, view_func, view_args, view_kwargs):
-        modulename = view_func.__module__
         user = request.user # Who is the current user ?
+        role = user.user_type if user.is_authenticated else ANONYMOUS
+        if not self.permissions.allows(view_func, role):
+            return redirect(self.permissions.redirect_url(role))
         if user.is_authenticated:
-            if user.user_type == '1': # Is it the HOD/Admin
-                if modulename == 'main_app.student_views':
-                    return redirect(reverse('admin_home'))
-            elif user.user_type == '2': #  Staff :-/ ?
-                if modulename == 'main_app.student_views' or modulename == 'main_app.hod_views':
-                    return redirect(reverse('staff_home'))
-            elif user.user_type == '3': # ... or Student ?
-                if modulename == 'main_app.hod_views' or modulename == 'main_app.staff_views':
-                    return redirect(reverse('student_home'))
-            else: # None of the aforementioned ? Please take the user to login page
-                return redirect(reverse('login_page'))
-        else:
-            if request.path == reverse('login_page') or modulename == 'django.contrib.auth.views' or request.path == reverse('user_login') or request.path == reverse('setup_admin'):
-                pass
-            else:
-                return redirect(reverse('login_page'))
+            # Fetched at most once per request, and only if a view or template asks for it
+            request.profile = SimpleLazyObject(lambda: load_profile(user))
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_hallticketsequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hallticket',
+            name='hall',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main_app.examhall'),
+        ),
+    ]
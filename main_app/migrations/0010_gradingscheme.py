@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_hallticket_hall'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingScheme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('academic_year', models.CharField(blank=True, default='', max_length=20)),
+                ('boundaries', models.JSONField(default=list)),
+                ('fail_grade', models.CharField(default='F', max_length=2)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main_app.course')),
+            ],
+            options={
+                'unique_together': {('course', 'academic_year')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0010_gradingscheme'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subject',
+            name='credits',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+    ]
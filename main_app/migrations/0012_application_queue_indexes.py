@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0011_subject_credits'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ktapplication',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='kt_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ktapplication',
+            index=models.Index(fields=['-created_at', '-id'], name='kt_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revaluationapplication',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='revaluation_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revaluationapplication',
+            index=models.Index(fields=['-created_at', '-id'], name='revaluation_created_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0013_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-created_at'], name='notification_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notification_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationstaff',
+            index=models.Index(fields=['staff', '-created_at', '-id'], name='staff_notification_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationstudent',
+            index=models.Index(fields=['student', '-created_at', '-id'], name='student_notification_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0015_user_roster_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='gradingscheme',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='gradingscheme',
+            constraint=models.UniqueConstraint(fields=('course', 'academic_year'), name='grading_scheme_course_year_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='gradingscheme',
+            constraint=models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('academic_year',), name='grading_scheme_any_course_uniq'),
+        ),
+    ]
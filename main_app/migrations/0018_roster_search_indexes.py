@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:26
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main_app', '0017_pendingregrade'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(models.F('user_type'), django.db.models.functions.text.Lower('last_name'), name='user_type_lower_last_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(models.F('user_type'), django.db.models.functions.text.Lower('first_name'), name='user_type_lower_first_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(models.F('user_type'), django.db.models.functions.text.Lower('email'), name='user_type_lower_email_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0018_roster_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingPregeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='main_app.exam')),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def fill_attendance_summary(apps, schema_editor):
+    # Same grouping as attendance.compute_attendance_summary(), on the historical models
+    AttendanceReport = apps.get_model('main_app', 'AttendanceReport')
+    AttendanceSummary = apps.get_model('main_app', 'AttendanceSummary')
+    rows = AttendanceReport.objects.order_by().values_list(
+        'student_id', 'attendance__subject_id', 'attendance__session_id'
+    ).annotate(
+        present=Count('id', filter=Q(status=True)),
+        absent=Count('id', filter=Q(status=False)),
+    )
+    AttendanceSummary.objects.all().delete()
+    AttendanceSummary.objects.bulk_create([
+        AttendanceSummary(student_id=student_id, subject_id=subject_id, session_id=session_id,
+                          present=present, absent=absent)
+        for student_id, subject_id, session_id, present, absent in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0019_pendingpregeneration'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_attendance_summary, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,13 @@
+import contextlib
+import threading
+
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import UserManager
+from django.core.exceptions import ValidationError
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from django.db import models
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.db import IntegrityError, connection, models, transaction
 from django.contrib.auth.models import AbstractUser
 from datetime import datetime,timedelta
 from django.utils import timezone
@@ -56,6 +61,17 @@ class CustomUser(AbstractUser):
     REQUIRED_FIELDS = []
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        # The manage staff/student tables filter by type and sort by name or email; the
+        # Lower() indexes serve their case-insensitive prefix search (see rosters.roster_queryset)
+        indexes = [
+            models.Index(fields=['user_type', 'last_name', 'first_name', 'id'], name='user_type_name_idx'),
+            models.Index(fields=['user_type', 'email'], name='user_type_email_idx'),
+            models.Index(models.F('user_type'), Lower('last_name'), name='user_type_lower_last_idx'),
+            models.Index(models.F('user_type'), Lower('first_name'), name='user_type_lower_first_idx'),
+            models.Index(models.F('user_type'), Lower('email'), name='user_type_lower_email_idx'),
+        ]
+
     def __str__(self):
         return self.first_name + " " + self.last_name
 
@@ -122,6 +138,7 @@ class Subject(models.Model):
     name = models.CharField(max_length=120)
     staff = models.ForeignKey(Staff,on_delete=models.CASCADE,)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    credits = models.PositiveSmallIntegerField(default=3)
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -145,6 +162,19 @@ class AttendanceReport(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+class AttendanceSummary(models.Model):
+    # Rollup of AttendanceReport, maintained by main_app.attendance
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
+    session = models.ForeignKey(Session, on_delete=models.CASCADE)
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'subject', 'session']
+
+
 class LeaveReportStudent(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     date = models.CharField(max_length=60)
@@ -185,6 +215,9 @@ class NotificationStaff(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['staff', '-created_at', '-id'], name='staff_notification_inbox_idx')]
+
 
 class NotificationStudent(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
@@ -192,6 +225,39 @@ class NotificationStudent(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['student', '-created_at', '-id'], name='student_notification_inbox_idx')]
+
+
+class NotificationOutbox(models.Model):
+    """
+    A push notification waiting to be sent to one user's device. Views
+    only insert rows; the notification_worker command sends them in
+    batches and retries failures with backoff.
+    """
+    PENDING, SENDING, SENT, FAILED = 'pending', 'sending', 'sent', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    title = models.CharField(max_length=255)
+    body = models.TextField()
+    click_action = models.CharField(max_length=255, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set by the worker that claimed the row, so two workers never send it twice
+    claimed_by = models.CharField(max_length=32, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')]
+
+    def __str__(self):
+        return f"{self.user} - {self.title} ({self.status})"
+
 
 class StudentResult(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
@@ -213,6 +279,55 @@ class StudentResult(models.Model):
         return f"{self.student} - {self.subject} - {self.semester} - {self.academic_year}"
 
 
+class GradingScheme(models.Model):
+    """
+    Grade boundaries for a course and/or academic year. The most specific
+    scheme wins: course + year, then course, then year, then the default
+    (a scheme with neither set), then the built-in scale in grading.py.
+    """
+    name = models.CharField(max_length=100)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True)
+    academic_year = models.CharField(max_length=20, blank=True, default='')
+    # [[minimum total, grade], ...]; totals below every minimum get `fail_grade`
+    boundaries = models.JSONField(default=list)
+    fail_grade = models.CharField(max_length=2, default='F')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'academic_year'], name='grading_scheme_course_year_uniq'),
+            # NULLs never collide in the constraint above, so course-less schemes need their own
+            models.UniqueConstraint(fields=['academic_year'], condition=models.Q(course__isnull=True),
+                                    name='grading_scheme_any_course_uniq'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        from .grading import validate_boundaries
+        try:
+            validate_boundaries(self.boundaries)
+        except ValueError as e:
+            raise ValidationError({'boundaries': str(e)})
+
+
+class PendingRegrade(models.Model):
+    """
+    Results whose grades must be recomputed after a GradingScheme changed:
+    those of `course` (all courses when empty) in `academic_year` (all
+    years when blank). Drained by `manage.py regrade_results --pending`,
+    so saving a scheme never regrades inside the admin request.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True)
+    academic_year = models.CharField(max_length=20, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.course or 'All courses'} - {self.academic_year or 'all years'}"
+
+
 class ExamHall(models.Model):
     name = models.CharField(max_length=100)
     capacity = models.IntegerField()
@@ -224,7 +339,44 @@ class ExamHall(models.Model):
     def __str__(self):
         return self.name
 
-class ExamSubject(models.Model):
+
+_NOT_LOADED = object()
+
+
+class PrintedFieldsMixin:
+    """
+    Remembers the PRINTED_FIELDS values an instance was loaded or last saved
+    with, so saves that leave them alone can keep the rendered hall tickets.
+    """
+    PRINTED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_printed_fields()
+        return instance
+
+    def _printed_attnames(self):
+        return [self._meta.get_field(name).attname for name in self.PRINTED_FIELDS]
+
+    def _printed_values(self):
+        # Deferred fields are missing from __dict__ and count as changed
+        return tuple(self.__dict__.get(attname, _NOT_LOADED) for attname in self._printed_attnames())
+
+    def remember_printed_fields(self):
+        self._saved_printed_values = self._printed_values()
+
+    def printed_fields_changed(self, update_fields=None):
+        if update_fields is not None and not set(update_fields) & {*self.PRINTED_FIELDS, *self._printed_attnames()}:
+            return False
+        saved = getattr(self, '_saved_printed_values', None)
+        return saved is None or _NOT_LOADED in saved or saved != self._printed_values()
+
+
+class ExamSubject(PrintedFieldsMixin, models.Model):
+    # What the hall ticket PDF shows of each subject
+    PRINTED_FIELDS = ('exam', 'subject', 'date', 'start_time', 'end_time')
+
     exam = models.ForeignKey('Exam', on_delete=models.CASCADE, related_name='exam_subjects')
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
     date = models.DateField(null=True, blank=True)
@@ -239,7 +391,10 @@ class ExamSubject(models.Model):
     def __str__(self):
         return f"{self.exam.name} - {self.subject.name}"
 
-class Exam(models.Model):
+class Exam(PrintedFieldsMixin, models.Model):
+    # The hall is printed on tickets that do not name their own
+    PRINTED_FIELDS = ('name', 'hall')
+
     name = models.CharField(max_length=200)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     hall = models.ForeignKey(ExamHall, on_delete=models.CASCADE)
@@ -275,6 +430,7 @@ class Exam(models.Model):
 class HallTicket(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    hall = models.ForeignKey(ExamHall, on_delete=models.CASCADE, null=True, blank=True)  # Defaults to exam.hall
     hall_ticket_number = models.CharField(max_length=20, unique=True)
     seat_number = models.CharField(max_length=10)
     bench_number = models.CharField(max_length=10)
@@ -285,19 +441,94 @@ class HallTicket(models.Model):
     def __str__(self):
         return f"{self.student.admin.first_name} - {self.hall_ticket_number}"
 
+    @property
+    def assigned_hall(self):
+        """Hall the student sits in; tickets from single-hall exams leave `hall` empty"""
+        return self.hall if self.hall_id else self.exam.hall
+
     def save(self, *args, **kwargs):
         if not self.hall_ticket_number:
-            # Generate hall ticket number: HT-YYYY-XXXXX
-            year = datetime.now().year
-            last_ticket = HallTicket.objects.filter(hall_ticket_number__startswith=f'HT-{year}').order_by('-hall_ticket_number').first()
-            if last_ticket:
-                last_number = int(last_ticket.hall_ticket_number.split('-')[2])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            self.hall_ticket_number = f'HT-{year}-{new_number:05d}'
+            self.hall_ticket_number = HallTicket.reserve_numbers(1)[0]
         super().save(*args, **kwargs)
 
+    @classmethod
+    def reserve_numbers(cls, count, year=None):
+        """Return `count` consecutive hall ticket numbers (HT-YYYY-XXXXX) from the year's sequence"""
+        year = year or datetime.now().year
+        return [f'HT-{year}-{number:05d}' for number in HallTicketSequence.reserve(year, count)]
+
+
+class PendingPregeneration(models.Model):
+    """
+    An exam whose hall ticket PDFs should be rendered ahead of time.
+    Drained by `manage.py pregenerate_hall_tickets --pending` from a job
+    runner; a runner claims an exam by deleting its row, so two runners
+    never render the same exam at once.
+    """
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.exam)
+
+
+class HallTicketSequence(models.Model):
+    """Last hall ticket number handed out per year"""
+    year = models.PositiveIntegerField(unique=True)
+    last_number = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
+
+    @classmethod
+    def reserve(cls, year, count=1):
+        """
+        Atomically reserve `count` consecutive numbers for `year` and return them as a range.
+        The counter is bumped with a single UPDATE before it is read back, so
+        the row lock (PostgreSQL) or write lock (SQLite) is taken first and
+        concurrent callers are serialised. The reservation joins any enclosing
+        transaction, so numbers are released again if that transaction rolls back.
+        """
+        if count < 1:
+            return range(0)
+        with _sequence_lock(), transaction.atomic():
+            if not cls._bump(year, count):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(year=year, last_number=cls._issued_before(year))
+                except IntegrityError:
+                    pass  # Another request created the row first
+                cls._bump(year, count)
+            last = cls.objects.filter(year=year).values_list('last_number', flat=True).get()
+        return range(last - count + 1, last + 1)
+
+    @classmethod
+    def _bump(cls, year, count):
+        return cls.objects.filter(year=year).update(last_number=models.F('last_number') + count)
+
+    @staticmethod
+    def _issued_before(year):
+        """Highest number issued for `year` before the sequence existed"""
+        last_number = HallTicket.objects.filter(
+            hall_ticket_number__startswith=f'HT-{year}-'
+        ).order_by('-hall_ticket_number').values_list('hall_ticket_number', flat=True).first()
+        return int(last_number.split('-')[2]) if last_number else 0
+
+
+_sqlite_sequence_lock = threading.Lock()
+
+
+def _sequence_lock():
+    """
+    SQLite cannot queue concurrent writers on one connection file (and shared-cache
+    databases fail instead of waiting), so writers in this process take turns here.
+    PostgreSQL relies on the row lock alone.
+    """
+    if connection.vendor == 'sqlite':
+        return _sqlite_sequence_lock
+    return contextlib.nullcontext()
+
 
 @receiver(post_save, sender=CustomUser)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -319,6 +550,77 @@ def save_user_profile(sender, instance, **kwargs):
     if str(instance.user_type) == '3':
         instance.student.save()
 
+
+@receiver(pre_save, sender=HallTicket)
+def remember_ticket_hall(sender, instance, **kwargs):
+    # A ticket moved to another hall leaves a stale merged PDF behind in the old one
+    previous = HallTicket.objects.filter(pk=instance.pk).values_list(
+        'hall_id', 'exam__hall_id').first() if instance.pk else None
+    instance._previous_hall_id = (previous[0] or previous[1]) if previous else None
+
+
+@receiver([post_save, post_delete], sender=HallTicket)
+def discard_ticket_pdf(sender, instance, **kwargs):
+    from .hall_ticket_pdf import discard_hall_ticket_pdfs
+    hall_ids = {instance.hall_id or instance.exam.hall_id, getattr(instance, '_previous_hall_id', None)}
+    discard_hall_ticket_pdfs(instance.exam_id, instance.id, hall_ids=hall_ids)
+
+
+@receiver([post_save, post_delete], sender=Exam)
+@receiver([post_save, post_delete], sender=ExamSubject)
+def discard_exam_pdfs(sender, instance, signal, created=False, update_fields=None, **kwargs):
+    if signal is post_save:
+        changed = instance.printed_fields_changed(update_fields) and not (created and sender is Exam)
+        instance.remember_printed_fields()
+        if not changed:
+            return
+    from .hall_ticket_pdf import discard_hall_ticket_pdfs
+    exam_id = instance.exam_id if sender is ExamSubject else instance.id
+    transaction.on_commit(lambda: discard_hall_ticket_pdfs(exam_id))
+
+
+@receiver(pre_save, sender=GradingScheme)
+def remember_scheme_scope(sender, instance, **kwargs):
+    # An edit that moves the scheme to another course or year leaves the old scope to regrade too
+    instance._previous_scope = GradingScheme.objects.filter(pk=instance.pk).values_list(
+        'course_id', 'academic_year').first() if instance.pk else None
+
+
+@receiver([post_save, post_delete], sender=GradingScheme)
+def regrade_scheme_results(sender, instance, **kwargs):
+    # Only results the scheme can apply to need new grades; the regrade itself runs outside the request
+    from .grading import queue_regrade
+    scope = (instance.course_id, instance.academic_year)
+    queue_regrade(*scope)
+    previous = getattr(instance, '_previous_scope', None)
+    if previous and previous != scope:
+        queue_regrade(*previous)
+
+
+@receiver([post_save, post_delete], sender=StudentResult)
+def invalidate_result_transcript(sender, instance, **kwargs):
+    # Pass the subject id, not subject.course_id: a cascade would otherwise load every result's subject
+    from .transcripts import invalidate_transcripts_on_commit
+    invalidate_transcripts_on_commit([instance.student_id], subject_ids=[instance.subject_id])
+
+
+@receiver(post_save, sender=Subject)
+def invalidate_subject_transcripts(sender, instance, created, **kwargs):
+    # Credits feed every SGPA the subject appears in
+    if created:
+        return
+    from .transcripts import invalidate_transcripts_on_commit
+    student_ids = StudentResult.objects.filter(subject=instance).values_list('student_id', flat=True)
+    invalidate_transcripts_on_commit(student_ids, [instance.course_id])
+
+
+@receiver(post_delete, sender=Subject)
+def invalidate_deleted_subject_rank_lists(sender, instance, **kwargs):
+    # Its results' signals only carry the subject id, which no longer resolves to a course by commit time
+    from .transcripts import invalidate_transcripts_on_commit
+    invalidate_transcripts_on_commit(course_ids=[instance.course_id])
+
+
 # todos
 
 class KTApplication(models.Model):
@@ -335,6 +637,13 @@ class KTApplication(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Serve the newest-first queues, filtered by status or not
+        indexes = [
+            models.Index(fields=['status', '-created_at', '-id'], name='kt_status_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='kt_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.admin.first_name} - {self.subject.name}"
 
@@ -353,11 +662,19 @@ class RevaluationApplication(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Serve the newest-first queues, filtered by status or not
+        indexes = [
+            models.Index(fields=['status', '-created_at', '-id'], name='revaluation_status_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='revaluation_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.admin.first_name} - {self.subject.name}"
 
 class Notification(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    # Both composite indexes below lead with user, so the plain FK index is redundant
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False)
     title = models.CharField(max_length=255)
     message = models.TextField()
     notification_type = models.CharField(max_length=20, choices=[
@@ -368,6 +685,13 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Unread counts and mark-read only ever read this index
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notification_unread_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_inbox_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.user.get_full_name()}"
 
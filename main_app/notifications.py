@@ -0,0 +1,202 @@
+import json
+import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from .models import NotificationOutbox, NotificationStaff, NotificationStudent
+
+NOTIFICATION_TITLE = 'Student Management System'
+FCM_URL = 'https://fcm.googleapis.com/fcm/send'
+# FCM accepts at most 1000 registration ids per multicast request
+FCM_BATCH_SIZE = 1000
+# Errors that will not go away on retry; the row is marked failed at once
+PERMANENT_ERRORS = {'NotRegistered', 'InvalidRegistration', 'MismatchSenderId', 'MissingRegistration', 'No device token'}
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+# Rows left in 'sending' this long (a worker died mid-batch) are handed out again
+STALE_CLAIM_SECONDS = 600
+
+
+class FCMTransport:
+    """
+    Sends multicast messages to the FCM legacy HTTP API through one
+    requests.Session, whose connection pool is sized for the worker's
+    thread count so every thread reuses a kept-alive connection.
+    """
+
+    def __init__(self, pool_size=4, timeout=10):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Authorization': f'key={settings.FCM_SERVER_KEY}',
+            'Content-Type': 'application/json',
+        })
+
+    def send(self, payload, tokens):
+        """
+        Deliver `payload` to every token in one request. Returns one entry
+        per token: None when delivered, otherwise the FCM error code.
+        Raises for transport failures, which retry the whole batch.
+        """
+        response = self.session.post(FCM_URL, data=json.dumps({
+            'notification': payload, 'registration_ids': tokens,
+        }), timeout=self.timeout)
+        response.raise_for_status()
+        return [result.get('error') for result in response.json()['results']]
+
+    def close(self):
+        self.session.close()
+
+
+class LocalTransport:
+    """Keeps every message in memory instead of sending it; for development and tests"""
+
+    sent = []
+
+    def __init__(self, pool_size=4, timeout=10):
+        pass
+
+    def send(self, payload, tokens):
+        LocalTransport.sent.extend((payload, token) for token in tokens)
+        return [None] * len(tokens)
+
+    def close(self):
+        pass
+
+
+def get_transport(pool_size=4):
+    return import_string(settings.NOTIFICATION_TRANSPORT)(pool_size=pool_size)
+
+
+def enqueue_notifications(user_ids, message, click_action='', title=NOTIFICATION_TITLE):
+    """Queue one push notification per user; returns how many were queued"""
+    rows = [NotificationOutbox(user_id=user_id, title=title, body=message, click_action=click_action)
+            for user_id in user_ids]
+    NotificationOutbox.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def notify_students(students, message):
+    """
+    Record an in-app notification for every student in the queryset and
+    queue their pushes: a few bulk inserts, however many students match.
+    """
+    recipients = list(students.values_list('id', 'admin_id'))
+    with transaction.atomic():
+        NotificationStudent.objects.bulk_create([
+            NotificationStudent(student_id=student_id, message=message) for student_id, _ in recipients
+        ], batch_size=1000)
+        enqueue_notifications([admin_id for _, admin_id in recipients], message,
+                              reverse('student_view_notification'))
+    return len(recipients)
+
+
+def notify_staff(staff, message):
+    """notify_students() for a queryset of Staff"""
+    recipients = list(staff.values_list('id', 'admin_id'))
+    with transaction.atomic():
+        NotificationStaff.objects.bulk_create([
+            NotificationStaff(staff_id=staff_id, message=message) for staff_id, _ in recipients
+        ], batch_size=1000)
+        enqueue_notifications([admin_id for _, admin_id in recipients], message,
+                              reverse('staff_view_notification'))
+    return len(recipients)
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: about 30s, 1m, 2m, ... capped at an hour"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def release_stale_claims():
+    cutoff = timezone.now() - timedelta(seconds=STALE_CLAIM_SECONDS)
+    return NotificationOutbox.objects.filter(
+        status=NotificationOutbox.SENDING, updated_at__lt=cutoff
+    ).update(status=NotificationOutbox.PENDING, claimed_by='')
+
+
+def claim_due_notifications(batch_size):
+    """Mark up to batch_size due rows as ours and return them with their users"""
+    claim = uuid.uuid4().hex
+    due = NotificationOutbox.objects.filter(
+        status=NotificationOutbox.PENDING, next_attempt_at__lte=timezone.now()
+    ).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size]
+    # Only rows still pending are taken, so a concurrent worker cannot claim them too
+    NotificationOutbox.objects.filter(id__in=list(due), status=NotificationOutbox.PENDING).update(
+        status=NotificationOutbox.SENDING, claimed_by=claim, updated_at=timezone.now())
+    return list(NotificationOutbox.objects.filter(claimed_by=claim).select_related('user'))
+
+
+def dispatch_notifications(transport, batch_size=500, workers=4, max_attempts=5):
+    """
+    Send one batch of due notifications.
+
+    Rows are claimed, grouped by identical payload and sent as FCM
+    multicasts of up to FCM_BATCH_SIZE tokens, with at most `workers`
+    requests in flight. Threads only do HTTP; all database writes happen
+    here afterwards in one bulk_update. Failures are retried with
+    exponential backoff until `max_attempts`, permanent FCM errors fail
+    at once. Returns {'sent': n, 'retried': n, 'failed': n}.
+    """
+    release_stale_claims()
+    rows = claim_due_notifications(batch_size)
+    counts = {'sent': 0, 'retried': 0, 'failed': 0}
+    if not rows:
+        return counts
+
+    outcomes = {}
+    batches = {}
+    for row in rows:
+        if row.user.fcm_token:
+            key = (row.title, row.body, row.click_action)
+            batches.setdefault(key, []).append(row)
+        else:
+            outcomes[row.id] = 'No device token'
+
+    jobs = []
+    icon = static('dist/img/AdminLTELogo.png')
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (title, body, click_action), grouped in batches.items():
+            payload = {'title': title, 'body': body, 'click_action': click_action, 'icon': icon}
+            for start in range(0, len(grouped), FCM_BATCH_SIZE):
+                chunk = grouped[start:start + FCM_BATCH_SIZE]
+                jobs.append((chunk, executor.submit(transport.send, payload, [row.user.fcm_token for row in chunk])))
+        for chunk, future in jobs:
+            try:
+                errors = future.result()
+            except Exception as e:
+                errors = [f'{type(e).__name__}: {e}'] * len(chunk)
+            outcomes.update((row.id, error) for row, error in zip(chunk, errors))
+
+    now = timezone.now()
+    for row in rows:
+        error = outcomes.get(row.id, 'No result from transport')
+        row.attempts += 1
+        row.claimed_by, row.updated_at = '', now
+        row.last_error = error or ''
+        if error is None:
+            row.status, row.sent_at = NotificationOutbox.SENT, now
+            counts['sent'] += 1
+        elif error in PERMANENT_ERRORS or row.attempts >= max_attempts:
+            row.status = NotificationOutbox.FAILED
+            counts['failed'] += 1
+        else:
+            row.status, row.next_attempt_at = NotificationOutbox.PENDING, now + retry_delay(row.attempts)
+            counts['retried'] += 1
+    NotificationOutbox.objects.bulk_update(
+        rows, ['status', 'attempts', 'claimed_by', 'last_error', 'sent_at', 'next_attempt_at', 'updated_at'],
+        batch_size=500)
+    return counts
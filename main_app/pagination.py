@@ -0,0 +1,106 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by keyset_paginate() for this ordering"""
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset plus the cursors around it"""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _encode(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def _decode(cursor, fields):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid page cursor')
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor('Invalid page cursor')
+    try:
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except ValidationError:
+        raise InvalidCursor('Invalid page cursor')
+
+
+def _cursor_for(item, fields):
+    # value_to_string() round-trips through to_python() for every field type
+    return _encode([field.value_to_string(item) for field in fields])
+
+
+def _beyond(names, descending, values, forward):
+    """Q for rows strictly after `values` in the ordering (or before them when forward is False)"""
+    conditions = []
+    for position, name in enumerate(names):
+        lookup = 'lt' if descending[position] == forward else 'gt'
+        equal = {names[index]: values[index] for index in range(position)}
+        conditions.append(Q(**equal, **{f'{name}__{lookup}': values[position]}))
+    return reduce(lambda left, right: left | right, conditions)
+
+
+def keyset_paginate(queryset, ordering=('-created_at', '-id'), after=None, before=None, per_page=25):
+    """
+    Return a KeysetPage of `queryset` in `ordering`, starting after the
+    `after` cursor or ending before the `before` cursor (first page when
+    neither is given).
+
+    Instead of OFFSET, each page filters on the ordering values of the
+    last row seen, so with an index matching `ordering` page 500 costs
+    the same as page 1. The ordering fields must be non-null and the
+    last one unique (normally the primary key). Raises InvalidCursor for
+    a malformed cursor.
+    """
+    names = [name.lstrip('-') for name in ordering]
+    descending = [name.startswith('-') for name in ordering]
+    model_fields = [queryset.model._meta.get_field('id' if name == 'pk' else name) for name in names]
+
+    forward = before is None
+    if after or before:
+        rows = queryset.filter(_beyond(names, descending, _decode(after or before, model_fields), forward))
+    else:
+        rows = queryset
+    if not forward:
+        # Walk backwards from the cursor, then restore the display order
+        rows = rows.order_by(*[name if flag else f'-{name}' for name, flag in zip(names, descending)])
+    else:
+        rows = rows.order_by(*ordering)
+
+    items = list(rows[:per_page + 1])
+    more = len(items) > per_page
+    items = items[:per_page]
+    if not forward:
+        items.reverse()
+    if not items:
+        return KeysetPage(items)
+
+    first, last = _cursor_for(items[0], model_fields), _cursor_for(items[-1], model_fields)
+    if forward:
+        return KeysetPage(items, next_cursor=last if more else None, previous_cursor=first if after else None)
+    return KeysetPage(items, next_cursor=last, previous_cursor=first if more else None)
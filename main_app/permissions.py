@@ -0,0 +1,76 @@
+from django.urls import URLResolver, get_resolver, reverse
+
+HOD, STAFF, STUDENT = '1', '2', '3'
+# Role key of a request without a logged-in user
+ANONYMOUS = ''
+ALL_ROLES = frozenset({HOD, STAFF, STUDENT})
+EVERYONE = ALL_ROLES | {ANONYMOUS}
+
+# Roles of views that do not declare any with @roles, by module
+MODULE_ROLES = {
+    'main_app.hod_views': frozenset({HOD}),
+    'main_app.staff_views': frozenset({HOD, STAFF}),
+    'main_app.student_views': frozenset({STUDENT}),
+    'django.contrib.auth.views': EVERYONE,
+}
+
+# Where a role is sent when it may not open a view
+HOME_URL_NAMES = {HOD: 'admin_home', STAFF: 'staff_home', STUDENT: 'student_home', ANONYMOUS: 'login_page'}
+
+
+def roles(*allowed):
+    """
+    Declare which user types may open a view, e.g. @roles(STAFF) or
+    @roles(HOD, STAFF). LoginCheckMiddleWare enforces it; the declaration
+    takes precedence over MODULE_ROLES.
+    """
+    def decorator(view):
+        view.allowed_roles = frozenset(allowed)
+        return view
+    return decorator
+
+
+# For views that must be reachable without logging in
+public = roles(*EVERYONE)
+
+
+def view_roles(view):
+    """Roles allowed to open `view`: its @roles declaration, else its module's default"""
+    allowed = getattr(view, 'allowed_roles', None)
+    if allowed is None:
+        # Class-based views carry the declaration on the class
+        allowed = getattr(getattr(view, 'view_class', None), 'allowed_roles', None)
+    if allowed is None:
+        allowed = MODULE_ROLES.get(view.__module__, ALL_ROLES)
+    return allowed
+
+
+def _views(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _views(pattern.url_patterns)
+        else:
+            yield pattern.callback
+
+
+class PermissionTable:
+    """
+    Every routed view mapped to the frozenset of roles that may open it,
+    plus the redirect for each role, computed once from the URLconf so a
+    request costs one dict lookup and no reverse() calls.
+    """
+
+    def __init__(self, urlconf=None):
+        self.roles = {view: view_roles(view) for view in _views(get_resolver(urlconf).url_patterns)}
+        self.redirects = {role: reverse(name, urlconf=urlconf) for role, name in HOME_URL_NAMES.items()}
+
+    def allows(self, view, role):
+        allowed = self.roles.get(view)
+        if allowed is None:
+            # Not routed through the URLconf (e.g. a test calling a view directly)
+            allowed = view_roles(view)
+        return role in allowed
+
+    def redirect_url(self, role):
+        # Unknown user types go back to the login page
+        return self.redirects.get(role, self.redirects[ANONYMOUS])
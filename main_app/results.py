@@ -0,0 +1,152 @@
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .grading import SchemeResolver, compute_totals
+from .models import Student, StudentResult
+from .transcripts import invalidate_transcripts
+
+# Maximum marks per component, as enforced by the result entry forms
+MARK_LIMITS = {'internal_marks': 30, 'external_marks': 70, 'practical_marks': 50}
+# Accepted header names per component; the export's own headers round-trip
+MARK_COLUMNS = {
+    'internal_marks': ('internal', 'internal marks', 'internal_marks'),
+    'external_marks': ('external', 'external marks', 'external_marks'),
+    'practical_marks': ('practical', 'practical marks', 'practical_marks'),
+}
+
+RESULT_EXPORT_HEADER = [
+    'Email', 'First Name', 'Last Name', 'Course', 'Subject', 'Semester', 'Academic Year',
+    'Internal', 'External', 'Practical', 'Total', 'Grade',
+]
+RESULT_EXPORT_FIELDS = [
+    'student__admin__email', 'student__admin__first_name', 'student__admin__last_name',
+    'subject__course__name', 'subject__name', 'semester', 'academic_year',
+    'internal_marks', 'external_marks', 'practical_marks', 'total_marks', 'grade',
+]
+
+
+def filter_results(course_id=None, semester=None, academic_year=None, subject_id=None, staff=None):
+    """StudentResult rows matching the given filters; `staff` limits them to the subjects they teach"""
+    results = StudentResult.objects.all()
+    if course_id:
+        results = results.filter(subject__course_id=course_id)
+    if subject_id:
+        results = results.filter(subject_id=subject_id)
+    if semester:
+        results = results.filter(semester=semester)
+    if academic_year:
+        results = results.filter(academic_year=academic_year)
+    if staff is not None:
+        results = results.filter(subject__staff=staff)
+    return results
+
+
+def iter_result_rows(results, chunk_size=2000):
+    """
+    Yield export rows as plain tuples. values_list() skips model instances
+    and iterator() fetches `chunk_size` rows at a time (a server-side cursor
+    on PostgreSQL), so memory stays flat however many results match.
+    """
+    return results.order_by(
+        'subject__course__name', 'academic_year', 'semester', 'subject__name', 'student__admin__email'
+    ).values_list(*RESULT_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+class ResultImportError(ValueError):
+    """Raised when an uploaded result sheet is rejected; `errors` lists the problem for each row"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def _parse_mark(value, limit):
+    """Return (mark, error) for one cell; blank cells count as 0"""
+    if value in (None, ''):
+        return 0.0, None
+    try:
+        mark = float(value)
+    except (TypeError, ValueError):
+        return None, f'{value!r} is not a number'
+    if not 0 <= mark <= limit:
+        return None, f'{mark:g} is outside 0-{limit}'
+    return mark, None
+
+
+def import_result_sheet(subject, semester, academic_year, records):
+    """
+    Validate and upsert a whole result sheet for one subject/semester/year.
+
+    `records` are dicts as returned by spreadsheets.read_spreadsheet(), with
+    an 'email' column and one column per mark component. Every row is
+    checked in one pass (mark ranges, unknown or duplicate students,
+    students outside the subject's course) before anything is written; a
+    single bad row rejects the sheet with a ResultImportError listing all
+    problems. Totals and grades are computed per column by the grading
+    engine, then all rows are written with one
+    bulk_create(update_conflicts=True) on the unique_together key.
+    Returns {'created': n, 'updated': n}.
+    """
+    if not records:
+        raise ResultImportError('The sheet has no result rows')
+    header = set(records[0])
+    if 'email' not in header:
+        raise ResultImportError('The sheet needs an Email column')
+    columns = {
+        field: next((name for name in names if name in header), None)
+        for field, names in MARK_COLUMNS.items()
+    }
+    if not any(columns.values()):
+        raise ResultImportError('The sheet needs Internal, External and/or Practical columns')
+
+    rows = [record['_row'] for record in records]
+    emails = [record.get('email', '').lower() for record in records]
+    marks = {}
+    errors = []
+    for field, column in columns.items():
+        parsed = [_parse_mark(record.get(column) if column else None, MARK_LIMITS[field]) for record in records]
+        marks[field] = [mark for mark, _ in parsed]
+        errors += [
+            {'row': row, 'email': email, 'error': f"{field.replace('_', ' ').capitalize()}: {error}"}
+            for row, email, (_, error) in zip(rows, emails, parsed) if error
+        ]
+
+    students = dict(Student.objects.annotate(email=Lower('admin__email')).filter(
+        email__in=set(emails), course_id=subject.course_id
+    ).values_list('email', 'id'))
+    seen = set()
+    for row, email in zip(rows, emails):
+        if not email:
+            errors.append({'row': row, 'email': email, 'error': 'Email is missing'})
+        elif email in seen:
+            errors.append({'row': row, 'email': email, 'error': 'Student listed more than once'})
+        elif email not in students:
+            errors.append({'row': row, 'email': email, 'error': "No student with this email in the subject's course"})
+        seen.add(email)
+    if errors:
+        raise ResultImportError('Results were not imported', sorted(errors, key=lambda error: error['row']))
+
+    totals = compute_totals(marks['internal_marks'], marks['external_marks'], marks['practical_marks'])
+    grades = SchemeResolver().scale_for(subject.course_id, academic_year).grade_all(totals)
+    student_ids = [students[email] for email in emails]
+
+    existing = set(StudentResult.objects.filter(
+        subject=subject, semester=semester, academic_year=academic_year, student_id__in=student_ids
+    ).values_list('student_id', flat=True))
+    with transaction.atomic():
+        StudentResult.objects.bulk_create([
+            StudentResult(
+                student_id=student_id, subject=subject, semester=semester, academic_year=academic_year,
+                internal_marks=internal, external_marks=external, practical_marks=practical,
+                total_marks=total, grade=grade,
+            )
+            for student_id, internal, external, practical, total, grade in zip(
+                student_ids, marks['internal_marks'], marks['external_marks'], marks['practical_marks'],
+                totals, grades,
+            )
+        ], update_conflicts=True,
+            unique_fields=['student', 'subject', 'semester', 'academic_year'],
+            update_fields=['internal_marks', 'external_marks', 'practical_marks', 'total_marks', 'grade', 'updated_at'],
+            batch_size=1000)
+        transaction.on_commit(lambda: invalidate_transcripts(student_ids, [subject.course_id]))
+    return {'created': len(student_ids) - len(existing), 'updated': len(existing)}
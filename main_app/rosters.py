@@ -0,0 +1,92 @@
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.http import urlencode
+
+from .models import CustomUser
+from .pagination import InvalidCursor, keyset_paginate
+
+ROSTER_PAGE_SIZE = 25
+
+# user_type, profile accessor and the relations each row shows
+ROSTERS = {
+    'student': ('3', 'student', ('student__course', 'student__session')),
+    'staff': ('2', 'staff', ('staff__course',)),
+}
+
+# Every ordering ends in id so keyset cursors are unique; both are served by
+# the (user_type, ...) indexes on CustomUser
+ROSTER_SORTS = {
+    'name': ('last_name', 'first_name', 'id'),
+    '-name': ('-last_name', '-first_name', '-id'),
+    'email': ('email', 'id'),
+    '-email': ('-email', '-id'),
+}
+DEFAULT_SORT = 'name'
+SORT_LABELS = (('name', 'Name (A-Z)'), ('-name', 'Name (Z-A)'), ('email', 'Email (A-Z)'), ('-email', 'Email (Z-A)'))
+
+# Searchable columns; each has a (user_type, LOWER(column)) index on CustomUser
+SEARCH_FIELDS = ('last_name', 'first_name', 'email')
+# Sorts after every character, closing the range of strings that start with a prefix
+_LAST_CHAR = '\U0010ffff'
+
+
+def roster_queryset(kind, search=''):
+    """
+    Users of one roster with their profile, course and session joined in,
+    narrowed to names or emails starting with `search`, ignoring case.
+
+    istartswith compiles to UPPER(column) LIKE, which no index serves, so
+    the prefix is matched as a range over LOWER(column) instead; the
+    startswith check only drops what a linguistic collation lets into it.
+    """
+    user_type, _, related = ROSTERS[kind]
+    users = CustomUser.objects.filter(user_type=user_type).select_related(*related)
+    search = search.strip()
+    if search:
+        prefix = search.lower()
+        users = users.alias(**{f'lower_{field}': Lower(field) for field in SEARCH_FIELDS}).filter(
+            Q(*(Q(**{f'lower_{field}__gte': prefix, f'lower_{field}__lt': prefix + _LAST_CHAR,
+                     f'lower_{field}__startswith': prefix})
+                for field in SEARCH_FIELDS), _connector=Q.OR))
+    return users
+
+
+def _int(value, default):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def roster_page(kind, params):
+    """
+    Context for the manage_student/manage_staff pages: one keyset page of
+    the roster for the `q` search and `sort` in `params`.
+
+    Cursors carry no position, so the pager links also pass `start`, the
+    offset of the page's first row, purely to number the rows.
+    """
+    search = params.get('q', '').strip()
+    sort = params.get('sort', DEFAULT_SORT)
+    if sort not in ROSTER_SORTS:
+        sort = DEFAULT_SORT
+    users = roster_queryset(kind, search)
+    start = _int(params.get('start'), 0) if params.get('after') or params.get('before') else 0
+    try:
+        page = keyset_paginate(users, ROSTER_SORTS[sort], after=params.get('after'), before=params.get('before'),
+                               per_page=ROSTER_PAGE_SIZE)
+    except InvalidCursor:
+        page = keyset_paginate(users, ROSTER_SORTS[sort], per_page=ROSTER_PAGE_SIZE)
+        start = 0
+    if not page.has_previous:
+        start = 0
+    return {
+        'page': page,
+        'start_index': start + 1,
+        'next_start': start + len(page),
+        'previous_start': max(start - ROSTER_PAGE_SIZE, 0),
+        'search': search,
+        'sort': sort,
+        'sorts': SORT_LABELS,
+        'filter_query': urlencode({key: value for key, value in (('q', search), ('sort', sort)) if value}),
+    }
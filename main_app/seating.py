@@ -0,0 +1,142 @@
+import heapq
+import re
+from collections import namedtuple
+
+from django.db import transaction
+
+from .models import Exam, ExamHall, HallTicket, Student
+from .utils import generate_bench_number, generate_seat_number
+
+Seat = namedtuple('Seat', 'student_id group hall_id row col')
+
+# generate_seat_number() writes ROW-COL; tickets from before it may hold anything
+_SEAT_NUMBER = re.compile(r'\s*(\d+)\s*-\s*(\d+)\s*')
+
+
+def parse_seat_number(seat_number):
+    """(row, col) of a ROW-COL seat number, or None for any other format"""
+    match = _SEAT_NUMBER.fullmatch(seat_number or '')
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def seat_positions(rows, columns, limit):
+    """Yield (row, col) positions in row-major order, at most `limit` of them"""
+    for index in range(min(limit, rows * columns)):
+        yield index // columns + 1, index % columns + 1
+
+
+def plan_seating(groups, halls, taken=None):
+    """
+    Build a seating plan in memory.
+
+    `groups` maps a group key (e.g. an exam id) to the student ids sitting it,
+    `halls` is a list of (hall_id, rows, columns, capacity) filled in order and
+    `taken` is an optional set of (hall_id, row, col) seats that are occupied.
+    Seats are filled row by row; each seat takes the group with the most
+    students left that differs from the seat to its left and the seat in
+    front, so neighbours sit different papers whenever the mix allows it.
+    When only a clashing group is left the clash is accepted and counted.
+
+    Returns (seats, clashes) where seats is a list of Seat tuples.
+    Raises ValueError if the halls cannot hold every student.
+    """
+    taken = taken or set()
+    free = [
+        (hall_id, row, col)
+        for hall_id, rows, columns, capacity in halls
+        for row, col in seat_positions(rows, columns, capacity)
+        if (hall_id, row, col) not in taken
+    ]
+    needed = sum(len(students) for students in groups.values())
+    if needed > len(free):
+        raise ValueError(
+            f"Hall capacity exceeded: {needed} students need seats but only {len(free)} are free"
+        )
+
+    # Max-heap on students left; the counter keeps ordering stable between equal groups
+    heap = [(-len(students), order, key) for order, (key, students) in enumerate(groups.items()) if students]
+    heapq.heapify(heap)
+    cursors = {key: iter(students) for key, students in groups.items()}
+    placed = {}
+    seats = []
+    clashes = 0
+
+    for hall_id, row, col in free:
+        if not heap:
+            break
+        neighbours = {placed.get((hall_id, row, col - 1)), placed.get((hall_id, row - 1, col))}
+        skipped = []
+        while heap and heap[0][2] in neighbours:
+            skipped.append(heapq.heappop(heap))
+        if heap:
+            left, order, key = heapq.heappop(heap)
+        else:
+            left, order, key = skipped.pop(0)
+            clashes += 1
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+
+        placed[(hall_id, row, col)] = key
+        seats.append(Seat(next(cursors[key]), key, hall_id, row, col))
+        if left + 1:
+            heapq.heappush(heap, (left + 1, order, key))
+
+    return seats, clashes
+
+
+def allocate_exam_seating(exam_ids, hall_ids):
+    """
+    Seat every student of the given exams across the given halls and create
+    their hall tickets with one bulk_create. Students who already hold a
+    ticket for their exam keep it, and their seats stay occupied.
+    Returns a list of created HallTicket objects.
+    """
+    exams = dict(Exam.objects.filter(id__in=exam_ids).values_list('id', 'course_id'))
+    halls = {
+        hall.id: hall for hall in ExamHall.objects.filter(id__in=hall_ids)
+    }
+    hall_order = [halls[hall_id] for hall_id in dict.fromkeys(hall_ids) if hall_id in halls]
+
+    with transaction.atomic():
+        existing = HallTicket.objects.filter(exam_id__in=exams).values_list(
+            'student_id', 'exam_id', 'exam__hall_id', 'hall_id', 'seat_number'
+        )
+        seated, taken = set(), set()
+        for student_id, exam_id, exam_hall_id, hall_id, seat_number in existing:
+            seated.add((student_id, exam_id))
+            position = parse_seat_number(seat_number)
+            # A seat number the planner cannot place does not block any seat of the grid
+            if position:
+                taken.add((hall_id or exam_hall_id, *position))
+
+        groups = {exam_id: [] for exam_id in exams}
+        course_exams = {}
+        for exam_id, course_id in exams.items():
+            course_exams.setdefault(course_id, []).append(exam_id)
+        for student_id, course_id in Student.objects.filter(
+            course_id__in=course_exams
+        ).order_by('id').values_list('id', 'course_id'):
+            for exam_id in course_exams[course_id]:
+                if (student_id, exam_id) not in seated:
+                    groups[exam_id].append(student_id)
+
+        seats, _ = plan_seating(
+            groups,
+            [(hall.id, hall.rows, hall.columns, hall.capacity) for hall in hall_order],
+            taken,
+        )
+        if not seats:
+            return []
+
+        numbers = HallTicket.reserve_numbers(len(seats))
+        return HallTicket.objects.bulk_create([
+            HallTicket(
+                student_id=seat.student_id,
+                exam_id=seat.group,
+                hall_id=seat.hall_id,
+                hall_ticket_number=number,
+                seat_number=generate_seat_number(seat.row, seat.col),
+                bench_number=generate_bench_number(seat.row)
+            )
+            for seat, number in zip(seats, numbers)
+        ])
@@ -0,0 +1,208 @@
+import csv
+import io
+import itertools
+import posixpath
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from defusedxml import DefusedXmlException, ElementTree
+
+# Characters XML 1.0 does not allow, even escaped
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Largest uncompressed part read from an uploaded workbook, against zip bombs
+MAX_XLSX_PART_SIZE = 64 * 1024 * 1024
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+
+
+class _Echo:
+    """File-like object whose write() hands the data back, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+class _ChunkBuffer:
+    """Unseekable sink that collects what zipfile writes until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+def stream_csv(header, rows):
+    """Yield CSV text one line at a time"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def stream_xlsx(header, rows, sheet_name='Sheet1', chunk_size=64 * 1024):
+    """
+    Yield a single-sheet XLSX workbook as bytes while `rows` is consumed.
+
+    The zip is written to an unseekable buffer (entries carry data
+    descriptors) and the sheet uses inline strings, so nothing but the
+    current chunk is held in memory and no spreadsheet library is needed.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31], {'"': '&quot;'})))
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for row in itertools.chain([header] if header else [], rows):
+                sheet.write(('<row>' + ''.join(map(_xlsx_cell, row)) + '</row>').encode())
+                if buffer.size >= chunk_size:
+                    yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+def _column_index(reference):
+    """0-based column of a cell reference such as 'C12'"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _xlsx_part(archive, name):
+    """ZipInfo of one workbook part, refused if it would inflate past MAX_XLSX_PART_SIZE"""
+    # zipfile stops reading a member at its declared size, so the header can be trusted
+    info = archive.getinfo(name)
+    if info.file_size > MAX_XLSX_PART_SIZE:
+        raise ValueError(f'{name} is larger than {MAX_XLSX_PART_SIZE // (1024 * 1024)} MB uncompressed')
+    return info
+
+
+def _read_xlsx_rows(upload):
+    """Yield (row number, values) for the first worksheet of an XLSX file"""
+    with zipfile.ZipFile(upload) as archive:
+        workbook = ElementTree.fromstring(archive.read(_xlsx_part(archive, 'xl/workbook.xml')))
+        relation_id = workbook.find(f'{_SHEET_NS}sheets/{_SHEET_NS}sheet').get(f'{_REL_NS}id')
+        relations = ElementTree.fromstring(archive.read(_xlsx_part(archive, 'xl/_rels/workbook.xml.rels')))
+        target = next(rel.get('Target') for rel in relations if rel.get('Id') == relation_id)
+        sheet_path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+        shared = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            for item in ElementTree.fromstring(archive.read(_xlsx_part(archive, 'xl/sharedStrings.xml'))):
+                shared.append(''.join(text.text or '' for text in item.iter(f'{_SHEET_NS}t')))
+
+        with archive.open(_xlsx_part(archive, sheet_path)) as sheet:
+            for count, (_, row) in enumerate(
+                (event for event in ElementTree.iterparse(sheet) if event[1].tag == f'{_SHEET_NS}row'), start=1
+            ):
+                values = []
+                for position, cell in enumerate(row.iter(f'{_SHEET_NS}c')):
+                    column = _column_index(cell.get('r')) if cell.get('r') else position
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(text.text or '' for text in cell.iter(f'{_SHEET_NS}t'))
+                    else:
+                        raw = cell.findtext(f'{_SHEET_NS}v') or ''
+                        value = shared[int(raw)] if kind == 's' and raw else raw
+                    values.extend([''] * (column - len(values)))
+                    values.append(value)
+                number = int(row.get('r') or count)
+                row.clear()
+                yield number, values
+
+
+def read_spreadsheet(upload):
+    """
+    Read an uploaded .csv or .xlsx file into a list of dicts keyed by the
+    lower-cased header row. Blank rows are dropped; each dict also carries
+    its spreadsheet row number under '_row'.
+    Raises ValueError for unreadable files.
+    """
+    name = (getattr(upload, 'name', '') or '').lower()
+    try:
+        if name.endswith('.xlsx'):
+            rows = _read_xlsx_rows(upload)
+        elif name.endswith('.csv'):
+            rows = enumerate(csv.reader(io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')), start=1)
+        else:
+            raise ValueError('Upload a .csv or .xlsx file')
+        header = [column.strip().lower() for column in next(rows, (1, []))[1]]
+        records = []
+        for number, values in rows:
+            if not any(str(value).strip() for value in values):
+                continue
+            record = dict(zip(header, (str(value).strip() for value in values)))
+            record['_row'] = number
+            records.append(record)
+        return records
+    except (zipfile.BadZipFile, ElementTree.ParseError, DefusedXmlException, KeyError, StopIteration,
+            UnicodeDecodeError) as e:
+        raise ValueError(f'Could not read the spreadsheet: {e}')
@@ -2,7 +2,7 @@ import json
 
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import (HttpResponseRedirect, get_object_or_404,redirect, render)
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
@@ -20,12 +20,21 @@ try:
 except ImportError:
     PDF_GENERATION_AVAILABLE = False
 
+from .attendance import (AttendanceValidationError, correct_attendance,
+                         save_attendance_register)
 from .forms import *
+from .grading import grade_result
+from .inbox import staff_inbox
+from .middleware import get_profile
 from .models import *
+from .results import (RESULT_EXPORT_HEADER, ResultImportError, filter_results, import_result_sheet,
+                      iter_result_rows)
+from .spreadsheets import XLSX_CONTENT_TYPE, read_spreadsheet, stream_csv, stream_xlsx
+from .utils import QueryCounter
 from . import forms, models
 
 def staff_home(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = get_profile(request, Staff)
     total_students = Student.objects.filter(course=staff.course).count()
     total_leave = LeaveReportStaff.objects.filter(staff=staff).count()
     subjects = Subject.objects.filter(staff=staff)
@@ -51,7 +60,7 @@ def staff_home(request):
 
 
 def staff_take_attendance(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = get_profile(request, Staff)
     subjects = Subject.objects.filter(staff_id=staff)
     sessions = Session.objects.all()
     context = {
@@ -142,43 +151,16 @@ def save_attendance(request):
             
         # Parse the student data
         students = json.loads(student_data)
-        subject = get_object_or_404(Subject, id=subject_id)
-        
-        # Get the session from the first student's course
-        # This assumes all students in the same course have the same session
-        if students:
-            first_student = get_object_or_404(Student, id=students[0].get('student_id'))
-            session = first_student.session
-            if not session:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Student has no session assigned'
-                }, status=400)
-        else:
-            return JsonResponse({
-                'status': 'error',
-                'message': 'No students provided'
-            }, status=400)
-        
-        # Create attendance record
-        attendance = Attendance.objects.create(
-            subject=subject,
-            date=date,
-            session=session
-        )
-        
-        # Create attendance reports for each student
-        for student_dict in students:
-            student = get_object_or_404(Student, id=student_dict.get('student_id'))
-            AttendanceReport.objects.create(
-                student=student,
-                attendance=attendance,
-                status=student_dict.get('status')
-            )
-            
+
+        with QueryCounter() as queries:
+            subject = get_object_or_404(Subject, id=subject_id)
+            save_attendance_register(subject, date, students)
+
         return JsonResponse({
             'status': 'success',
-            'message': 'Attendance saved successfully'
+            'message': 'Attendance saved successfully',
+            'saved': len(students),
+            'queries': queries.count
         })
         
     except json.JSONDecodeError:
@@ -186,6 +168,12 @@ def save_attendance(request):
             'status': 'error',
             'message': 'Invalid student data format'
         }, status=400)
+    except AttendanceValidationError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e),
+            'errors': e.errors
+        }, status=400)
     except Exception as e:
         print(f"[DEBUG] Error saving attendance: {str(e)}")
         return JsonResponse({
@@ -195,7 +183,7 @@ def save_attendance(request):
 
 
 def staff_update_attendance(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = get_profile(request, Staff)
     subjects = Subject.objects.filter(staff_id=staff)
     sessions = Session.objects.all()
     context = {
@@ -270,27 +258,17 @@ def update_attendance(request):
         print(f"[DEBUG] Found attendance record for date: {attendance.date}")
         print(f"[DEBUG] Updating {len(students)} student records")
         
-        updated_count = 0
-        for student_dict in students:
-            try:
-                student = get_object_or_404(Student, id=student_dict.get('id'))
-                attendance_report = get_object_or_404(
-                    AttendanceReport, 
-                    student=student, 
-                    attendance=attendance
-                )
-                attendance_report.status = student_dict.get('status')
-                attendance_report.save()
-                updated_count += 1
-                print(f"[DEBUG] Updated attendance for student {student.admin.email}: {student_dict.get('status')}")
-            except Exception as e:
-                print(f"[DEBUG] Error updating student {student_dict.get('id')}: {str(e)}")
-                continue
+        result = correct_attendance(attendance, students)
+        updated_count = result['updated'] + result['created']
         
-        print(f"[DEBUG] Successfully updated {updated_count} records")
+        print(f"[DEBUG] Successfully updated {updated_count} records, {result['unchanged']} unchanged")
         return JsonResponse({
             'message': f'Successfully updated attendance for {updated_count} students',
-            'status': 'success'
+            'status': 'success',
+            'updated': result['updated'],
+            'created': result['created'],
+            'unchanged': result['unchanged'],
+            'errors': result['errors']
         })
         
     except json.JSONDecodeError:
@@ -354,7 +332,7 @@ def staff_feedback(request):
 
 
 def staff_view_profile(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = get_profile(request, Staff)
     form = StaffEditForm(request.POST or None, request.FILES or None,instance=staff)
     context = {'form': form, 'page_title': 'View/Update Profile'}
     if request.method == 'POST':
@@ -406,10 +384,11 @@ def staff_fcmtoken(request):
 
 
 def staff_view_notification(request):
-    staff = get_object_or_404(Staff, admin=request.user)
-    notifications = NotificationStaff.objects.filter(staff=staff)
+    staff = get_profile(request, Staff)
+    page = staff_inbox(staff, request.GET)
     context = {
-        'notifications': notifications,
+        'notifications': page,
+        'page': page,
         'page_title': "View Notifications"
     }
     return render(request, "staff_template/staff_view_notification.html", context)
@@ -417,7 +396,7 @@ def staff_view_notification(request):
 
 @login_required(login_url='login_page')
 def staff_add_result(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = get_profile(request, Staff)
     subjects = Subject.objects.filter(staff=staff)
     
     context = {
@@ -441,8 +420,6 @@ def staff_save_result(request):
         internal_marks = float(request.POST.get('internal_marks', 0))
         external_marks = float(request.POST.get('external_marks', 0))
         practical_marks = float(request.POST.get('practical_marks', 0))
-        total_marks = float(request.POST.get('total_marks', 0))
-        grade = request.POST.get('grade')
 
         # Validate data
         if not all([subject_id, student_id, semester, academic_year]):
@@ -469,8 +446,8 @@ def staff_save_result(request):
                 'message': 'Result already exists for this student in this subject'
             }, status=400)
 
-        # Create new result
-        result = StudentResult.objects.create(
+        # Create new result; total and grade come from the grading engine
+        result = StudentResult(
             student=student,
             subject=subject,
             semester=semester,
@@ -478,9 +455,9 @@ def staff_save_result(request):
             internal_marks=internal_marks,
             external_marks=external_marks,
             practical_marks=practical_marks,
-            total_marks=total_marks,
-            grade=grade
         )
+        grade_result(result)
+        result.save()
 
         return JsonResponse({
             'status': 'success',
@@ -614,7 +591,7 @@ def generate_result(request):
         academic_year = request.POST.get('academic_year')
         
         subject = get_object_or_404(Subject, id=subject_id)
-        staff = get_object_or_404(Staff, admin=request.user)
+        staff = get_profile(request, Staff)
         
         if subject.staff != staff:
             messages.error(request, "You don't have permission to generate results for this subject")
@@ -645,7 +622,7 @@ def generate_result(request):
         
         return render(request, 'main_app/staff/view_result_sheet.html', context)
     else:
-        staff = get_object_or_404(Staff, admin=request.user)
+        staff = get_profile(request, Staff)
         subjects = Subject.objects.filter(staff=staff)
         
         if not subjects.exists():
@@ -660,7 +637,7 @@ def generate_result(request):
 
 def download_result(request, subject_id, semester, academic_year):
     subject = get_object_or_404(Subject, id=subject_id)
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = get_profile(request, Staff)
     
     if subject.staff != staff:
         messages.error(request, "You don't have permission to download results for this subject")
@@ -709,6 +686,74 @@ def download_result(request, subject_id, semester, academic_year):
         messages.error(request, f"Error generating PDF: {str(e)}")
         return redirect('staff_generate_result')
 
+def export_results(request):
+    """
+    Stream a result sheet as CSV or XLSX (?format=xlsx). Optional filters:
+    course, subject, semester and academic_year. HODs may export any
+    results; staff only those of the subjects they teach.
+    """
+    if request.user.user_type == '1':
+        staff = None
+    elif request.user.user_type == '2':
+        staff = get_profile(request, Staff)
+    else:
+        return redirect('login_page')
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'xlsx'):
+        return JsonResponse({'status': 'error', 'message': 'Format must be csv or xlsx'}, status=400)
+    try:
+        course_id = int(request.GET['course']) if request.GET.get('course') else None
+        subject_id = int(request.GET['subject']) if request.GET.get('subject') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Course and subject must be numeric IDs'}, status=400)
+    semester = request.GET.get('semester')
+    academic_year = request.GET.get('academic_year')
+
+    results = filter_results(course_id, semester, academic_year, subject_id, staff)
+    rows = iter_result_rows(results)
+    filename = '_'.join(['results'] + [str(part) for part in (course_id, subject_id, semester, academic_year) if part])
+    if export_format == 'xlsx':
+        response = StreamingHttpResponse(
+            stream_xlsx(RESULT_EXPORT_HEADER, rows, 'Results'), content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(stream_csv(RESULT_EXPORT_HEADER, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+def import_results(request):
+    """Upload a CSV/XLSX result sheet for one subject, semester and academic year"""
+    staff = get_profile(request, Staff)
+    subjects = Subject.objects.filter(staff=staff)
+    context = {
+        'subjects': subjects,
+        'page_title': 'Import Results',
+        'errors': [],
+    }
+    if request.method != 'POST':
+        return render(request, 'main_app/staff/import_results.html', context)
+
+    subject = get_object_or_404(subjects, id=request.POST.get('subject'))
+    semester = request.POST.get('semester', '').strip()
+    academic_year = request.POST.get('academic_year', '').strip()
+    upload = request.FILES.get('file')
+    if not all([semester, academic_year, upload]):
+        messages.error(request, 'Subject, semester, academic year and a file are required')
+        return render(request, 'main_app/staff/import_results.html', context)
+
+    try:
+        counts = import_result_sheet(subject, semester, academic_year, read_spreadsheet(upload))
+    except ResultImportError as e:
+        messages.error(request, str(e))
+        context['errors'] = e.errors
+        return render(request, 'main_app/staff/import_results.html', context, status=400)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return render(request, 'main_app/staff/import_results.html', context, status=400)
+
+    messages.success(request, f"Imported results for {subject.name}: {counts['created']} added, {counts['updated']} updated")
+    return redirect('staff_import_results')
+
 @csrf_exempt
 def get_attendance_dates(request):
     subject_id = request.POST.get('subject')
@@ -1,5 +1,4 @@
 import json
-import math
 from datetime import datetime
 
 from django.contrib import messages
@@ -19,51 +18,24 @@ try:
 except ImportError:
     PDF_GENERATION_AVAILABLE = False
 
+from .dashboard import student_dashboard_stats
 from .forms import *
+from .inbox import student_inbox
+from .middleware import get_profile
 from .models import *
+from .transcripts import student_transcript
 
 
 def student_home(request):
-    student = get_object_or_404(Student, admin=request.user)
-    total_subject = Subject.objects.filter(course=student.course).count()
-    total_attendance = AttendanceReport.objects.filter(student=student).count()
-    total_present = AttendanceReport.objects.filter(student=student, status=True).count()
-    if total_attendance == 0:  # Don't divide. DivisionByZero
-        percent_absent = percent_present = 0
-    else:
-        percent_present = math.floor((total_present/total_attendance) * 100)
-        percent_absent = math.ceil(100 - percent_present)
-    subject_name = []
-    data_present = []
-    data_absent = []
-    subjects = Subject.objects.filter(course=student.course)
-    for subject in subjects:
-        attendance = Attendance.objects.filter(subject=subject)
-        present_count = AttendanceReport.objects.filter(
-            attendance__in=attendance, status=True, student=student).count()
-        absent_count = AttendanceReport.objects.filter(
-            attendance__in=attendance, status=False, student=student).count()
-        subject_name.append(subject.name)
-        data_present.append(present_count)
-        data_absent.append(absent_count)
-    context = {
-        'total_attendance': total_attendance,
-        'percent_present': percent_present,
-        'percent_absent': percent_absent,
-        'total_subject': total_subject,
-        'subjects': subjects,
-        'data_present': data_present,
-        'data_absent': data_absent,
-        'data_name': subject_name,
-        'page_title': 'Student Homepage'
-
-    }
+    student = get_profile(request, Student)
+    context = dict(student_dashboard_stats(student))
+    context['page_title'] = 'Student Homepage'
     return render(request, 'student_template/home_content.html', context)
 
 
 @ csrf_exempt
 def student_view_attendance(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = get_profile(request, Student)
     if request.method != 'POST':
         course = get_object_or_404(Course, id=student.course.id)
         context = {
@@ -145,7 +117,7 @@ def student_feedback(request):
 
 
 def student_view_profile(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = get_profile(request, Student)
     form = StudentEditForm(request.POST or None, request.FILES or None,
                            instance=student)
     context = {'form': form,
@@ -197,17 +169,18 @@ def student_fcmtoken(request):
 
 
 def student_view_notification(request):
-    student = get_object_or_404(Student, admin=request.user)
-    notifications = NotificationStudent.objects.filter(student=student)
+    student = get_profile(request, Student)
+    page = student_inbox(student, request.GET)
     context = {
-        'notifications': notifications,
+        'notifications': page,
+        'page': page,
         'page_title': "View Notifications"
     }
     return render(request, "student_template/student_view_notification.html", context)
 
 
 def student_view_result(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = get_profile(request, Student)
     semester = request.GET.get('semester', '')
     academic_year = request.GET.get('academic_year', '')
     
@@ -238,17 +211,18 @@ def view_books(request):
 
 
 def view_result(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = get_profile(request, Student)
     semester = request.GET.get('semester', '')
     academic_year = request.GET.get('academic_year', '')
     
-    results = StudentResult.objects.filter(student=student)
+    results = StudentResult.objects.filter(student=student).select_related('subject')
     if semester and academic_year:
         results = results.filter(semester=semester, academic_year=academic_year)
     
     context = {
         'student': student,
         'results': results,
+        'transcript': student_transcript(student.id),
         'semester': semester,
         'academic_year': academic_year,
         'today': datetime.now(),
@@ -258,7 +232,7 @@ def view_result(request):
 
 
 def download_student_result(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = get_profile(request, Student)
     semester = request.GET.get('semester', '')
     academic_year = request.GET.get('academic_year', '')
     
@@ -1,3 +1,1764 @@
-from django.test import TestCase
+import csv
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, QuerySet
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from pypdf import PdfReader
+
+from .admissions import StudentImportError, import_student_sheet
+from .applications import ApplicationDecisionError, decide_applications, filter_applications
+from .attendance import apply_attendance_changes, correct_attendance, find_attendance_drift
+from . import chatbot, hall_ticket_pdf
+from .chatbot import CATEGORY_KEYWORDS, BM25Ranker, get_chatbot_index
+from .dashboard import student_dashboard_stats
+from .eligibility import kt_eligibility, revaluation_eligibility
+from . import grading
+from .grading import SchemeResolver, Scale, regrade_results, run_pending_regrades, validate_boundaries
+from . import hashing
+from .hashing import hash_passwords
+from . import hod_views, staff_views, student_views, views
+from .inbox import mark_read, unread_count
+from .models import *
+from . import notifications
+from .pagination import InvalidCursor, keyset_paginate
+from .rosters import roster_queryset
+from .permissions import ANONYMOUS, HOD, STAFF, STUDENT, PermissionTable, roles, view_roles
+from .seating import allocate_exam_seating, parse_seat_number, plan_seating
+from .transcripts import build_transcript, course_rank_list, student_transcript
+from . import spreadsheets
+from .spreadsheets import read_spreadsheet, stream_xlsx
+from .utils import allocate_seats
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ERPTestCase(TestCase):
+    """Shared fixtures for building courses, subjects and students."""
+
+    def setUp(self):
+        cache.clear()
+        self.session = Session.objects.create(start_year=date(2023, 1, 1), end_year=date(2027, 1, 1))
+        self.hod = CustomUser.objects.create_user(
+            email='hod@example.com', password='hod123', user_type=1, first_name='Head', last_name='Dept')
+        self.course = Course.objects.create(name='Computer Engineering')
+        self.staff = self.create_staff('staff@example.com', self.course)
+
+    def create_staff(self, email, course):
+        user = CustomUser.objects.create_user(
+            email=email, password='staff123', user_type=2, first_name='Staff', last_name='Member')
+        user.staff.course = course
+        user.save()
+        return user.staff
+
+    def create_student(self, email, course, session=None):
+        user = CustomUser.objects.create_user(
+            email=email, password='student123', user_type=3, first_name='Student', last_name=email.split('@')[0])
+        user.student.course = course
+        user.student.session = session or self.session
+        user.save()
+        return user.student
+
+    def create_subject(self, name, course=None, staff=None):
+        return Subject.objects.create(name=name, course=course or self.course, staff=staff or self.staff)
+
+    def populate(self, students, subjects):
+        """Create students and subjects with one attendance register per subject."""
+        created_students = [
+            self.create_student(f'student{Student.objects.count()}@example.com', self.course)
+            for _ in range(students)
+        ]
+        for _ in range(subjects):
+            subject = self.create_subject(f'Subject {Subject.objects.count()}')
+            attendance = Attendance.objects.create(session=self.session, subject=subject, date=date(2024, 1, 1))
+            changes = []
+            for index, student in enumerate(created_students):
+                AttendanceReport.objects.create(student=student, attendance=attendance, status=index % 2 == 0)
+                changes.append((student.id, None, index % 2 == 0))
+            apply_attendance_changes(subject.id, self.session.id, changes)
+        return created_students
+
+    def count_queries(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            func(*args, **kwargs)
+        return len(queries)
+
+
+class AdminDashboardTests(ERPTestCase):
+
+    def test_dashboard_series(self):
+        students = self.populate(students=3, subjects=2)
+        LeaveReportStudent.objects.create(student=students[1], date='2024-01-02', message='Sick', status=1)
+        self.client.force_login(self.hod)
+        response = self.client.get(reverse('admin_home'))
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        self.assertEqual(context['total_students'], 3)
+        self.assertEqual(context['total_subject'], 2)
+        self.assertEqual(context['attendance_list'], [1, 1])
+        self.assertEqual(context['student_count_list_in_subject'], [3, 3])
+        self.assertEqual(context['student_count_list_in_course'], [3])
+        self.assertEqual(context['student_attendance_present_list'], [2, 0, 2])
+        self.assertEqual(context['student_attendance_leave_list'], [0, 3, 0])
+
+    def test_query_count_is_constant(self):
+        self.client.force_login(self.hod)
+        url = reverse('admin_home')
+        self.populate(students=2, subjects=1)
+        small = self.count_queries(self.client.get, url)
+        self.populate(students=10, subjects=4)
+        Course.objects.create(name='Mechanical Engineering')
+        large = self.count_queries(self.client.get, url)
+        self.assertEqual(small, large)
+
+
+class AttendanceSummaryTests(ERPTestCase):
+
+    def summary(self, student, subject):
+        row = AttendanceSummary.objects.get(student=student, subject=subject, session=self.session)
+        return row.present, row.absent
+
+    def test_save_and_update_keep_rollup_in_sync(self):
+        students = [self.create_student(f's{i}@example.com', self.course) for i in range(3)]
+        subject = self.create_subject('Networks')
+        self.client.force_login(self.staff.admin)
+        for day in ('2024-01-01', '2024-01-02'):
+            response = self.client.post(reverse('save_attendance'), {
+                'subject': subject.id,
+                'attendance_date': day,
+                'student_data': json.dumps([
+                    {'student_id': student.id, 'status': index == 0} for index, student in enumerate(students)
+                ]),
+            })
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.summary(students[0], subject), (2, 0))
+        self.assertEqual(self.summary(students[1], subject), (0, 2))
+
+        attendance = Attendance.objects.filter(subject=subject).first()
+        response = self.client.post(reverse('update_attendance'), {
+            'date': attendance.id,
+            'student_ids': json.dumps([
+                {'id': students[0].id, 'status': False},
+                {'id': students[1].id, 'status': True},
+                {'id': students[2].id, 'status': False},
+            ]),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.summary(students[0], subject), (1, 1))
+        self.assertEqual(self.summary(students[1], subject), (1, 1))
+        self.assertEqual(self.summary(students[2], subject), (0, 2))
+        self.assertEqual(find_attendance_drift(), [])
+
+    def test_migration_fills_the_rollup_from_existing_reports(self):
+        students = self.populate(students=3, subjects=2)
+        AttendanceSummary.objects.all().delete()
+        migration = importlib.import_module('main_app.migrations.0020_fill_attendancesummary')
+        migration.fill_attendance_summary(django_apps, None)
+        self.assertEqual(find_attendance_drift(), [])
+        self.assertEqual(AttendanceSummary.objects.count(), 6)
+        self.assertEqual(self.summary(students[0], Subject.objects.first()), (1, 0))
+
+    def test_rebuild_command_repairs_drift(self):
+        students = self.populate(students=2, subjects=1)
+        AttendanceSummary.objects.filter(student=students[0]).update(present=7)
+        self.assertEqual(len(find_attendance_drift()), 1)
+
+        out = StringIO()
+        call_command('rebuild_attendance_summary', '--check', stdout=out)
+        self.assertIn('1 rollup rows have drifted', out.getvalue())
+
+        call_command('rebuild_attendance_summary', stdout=StringIO())
+        self.assertEqual(find_attendance_drift(), [])
+
+
+class SaveAttendanceTests(ERPTestCase):
+
+    def post_register(self, subject, students, day='2024-01-01'):
+        return self.client.post(reverse('save_attendance'), {
+            'subject': subject.id,
+            'attendance_date': day,
+            'student_data': json.dumps([{'student_id': student_id, 'status': True} for student_id in students]),
+        })
+
+    def test_register_is_rejected_as_a_whole(self):
+        enrolled = self.create_student('in@example.com', self.course)
+        outsider = self.create_student('out@example.com', Course.objects.create(name='Civil'))
+        subject = self.create_subject('Maths')
+        self.client.force_login(self.staff.admin)
+
+        response = self.post_register(subject, [enrolled.id, outsider.id, 'abc'])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual({error['student_id'] for error in errors}, {outsider.id, 'abc'})
+        self.assertFalse(Attendance.objects.exists())
+        self.assertFalse(AttendanceReport.objects.exists())
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        subject = self.create_subject('Maths')
+        self.client.force_login(self.staff.admin)
+        small = [self.create_student(f'a{i}@example.com', self.course).id for i in range(2)]
+        large = small + [self.create_student(f'b{i}@example.com', self.course).id for i in range(20)]
+
+        first = self.post_register(subject, small).json()
+        second = self.post_register(subject, large, day='2024-01-02').json()
+        self.assertEqual(second['saved'], 22)
+        self.assertEqual(first['queries'], second['queries'])
+        self.assertEqual(AttendanceReport.objects.count(), 24)
+        self.assertEqual(find_attendance_drift(), [])
+
+
+class CorrectAttendanceTests(ERPTestCase):
+
+    def test_only_changed_rows_are_written(self):
+        students = self.populate(students=6, subjects=1)
+        attendance = Attendance.objects.get()
+        before = dict(AttendanceReport.objects.values_list('student_id', 'updated_at'))
+        entries = [{'id': student.id, 'status': index % 2 == 0} for index, student in enumerate(students)]
+        entries[0]['status'] = False
+        entries[1]['status'] = True
+
+        result = correct_attendance(attendance, entries)
+        self.assertEqual((result['updated'], result['created'], result['unchanged']), (2, 0, 4))
+        after = dict(AttendanceReport.objects.values_list('student_id', 'updated_at'))
+        touched = {student_id for student_id in after if after[student_id] != before[student_id]}
+        self.assertEqual(touched, {students[0].id, students[1].id})
+        self.assertEqual(find_attendance_drift(), [])
+
+    def test_missing_reports_are_created_for_enrolled_students(self):
+        self.populate(students=2, subjects=1)
+        attendance = Attendance.objects.get()
+        late = self.create_student('late@example.com', self.course)
+        outsider = self.create_student('out@example.com', Course.objects.create(name='Civil'))
+
+        result = correct_attendance(attendance, [
+            {'id': late.id, 'status': True},
+            {'id': outsider.id, 'status': True},
+        ])
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['student_id'] for error in result['errors']], [outsider.id])
+        self.assertTrue(AttendanceReport.objects.filter(attendance=attendance, student=late, status=True).exists())
+        self.assertEqual(find_attendance_drift(), [])
+
+    def test_reports_are_locked_before_deltas_are_computed(self):
+        students = self.populate(students=2, subjects=1)
+        attendance = Attendance.objects.get()
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=select_for_update) as lock:
+            with CaptureQueriesContext(connection) as queries:
+                correct_attendance(attendance, [{'id': students[0].id, 'status': False}])
+        self.assertEqual([call.args[0].model for call in lock.call_args_list], [Attendance, AttendanceReport])
+        if connection.features.has_select_for_update:
+            report_query = next(query['sql'] for query in queries if 'FROM "main_app_attendancereport"' in query['sql'])
+            self.assertIn('FOR UPDATE', report_query)
+        self.assertEqual(find_attendance_drift(), [])
+
+    def test_hod_update_rejects_the_whole_correction(self):
+        students = self.populate(students=2, subjects=1)
+        attendance = Attendance.objects.get()
+        before = dict(AttendanceReport.objects.values_list('student_id', 'status'))
+
+        def post(entries, date=attendance.id):
+            request = RequestFactory().post('/', {'date': date, 'student_ids': json.dumps(entries)})
+            return views.update_attendance(request)
+
+        response = post([{'id': students[0].id, 'status': not before[students[0].id]}, {'id': 99999, 'status': True}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['student_id'] for error in json.loads(response.content)['errors']], [99999])
+        self.assertEqual(dict(AttendanceReport.objects.values_list('student_id', 'status')), before)
+
+        self.assertEqual(post([{'id': students[0].id, 'status': True}], date=99999).status_code, 404)
+        response = post([{'id': students[0].id, 'status': not before[students[0].id]}])
+        self.assertEqual((response.status_code, response.content), (200, b'OK'))
+        self.assertEqual(find_attendance_drift(), [])
+
+    def test_query_count_does_not_grow_with_register_size(self):
+        small = self.populate(students=2, subjects=1)
+        large = self.populate(students=20, subjects=1)
+        registers = Attendance.objects.order_by('id')
+
+        def flip(students):
+            return [{'id': student.id, 'status': index % 2 == 1} for index, student in enumerate(students)]
+
+        first = self.count_queries(correct_attendance, registers[0], flip(small))
+        second = self.count_queries(correct_attendance, registers[1], flip(large))
+        self.assertEqual(first, second)
+
+
+class StudentDashboardTests(ERPTestCase):
+
+    def test_per_subject_series(self):
+        students = self.populate(students=2, subjects=3)
+        self.client.force_login(students[0].admin)
+        response = self.client.get(reverse('student_home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['data_present'], [1, 1, 1])
+        self.assertEqual(response.context['data_absent'], [0, 0, 0])
+        self.assertEqual(response.context['total_attendance'], 3)
+        self.assertEqual(response.context['percent_present'], 100)
+
+    def test_query_count_does_not_grow_with_subjects(self):
+        students = self.populate(students=2, subjects=1)
+        self.client.force_login(students[1].admin)
+        url = reverse('student_home')
+        small = self.count_queries(self.client.get, url)
+        self.populate(students=1, subjects=6)
+        self.assertEqual(small, self.count_queries(self.client.get, url))
+
+    def test_only_the_students_own_rollup_rows_are_read(self):
+        students = self.populate(students=3, subjects=2)
+        with CaptureQueriesContext(connection) as queries:
+            stats = student_dashboard_stats(students[0])
+        self.assertEqual(stats['data_present'], [1, 1])
+        rollup = [query['sql'] for query in queries if 'main_app_attendancesummary' in query['sql']]
+        self.assertEqual(len(rollup), 1)
+        self.assertNotIn('JOIN', rollup[0])
+        self.assertIn(f'"student_id" = {students[0].id}', rollup[0])
+
+    @override_settings(STUDENT_DASHBOARD_CACHE_TIMEOUT=60)
+    def test_cache_is_invalidated_by_attendance_writes(self):
+        students = self.populate(students=2, subjects=1)
+        student = students[1]
+        self.assertEqual(student_dashboard_stats(student)['data_absent'], [1])
+        self.assertEqual(self.count_queries(student_dashboard_stats, student), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            correct_attendance(Attendance.objects.get(), [{'id': student.id, 'status': True}])
+        self.assertEqual(student_dashboard_stats(student)['data_present'], [1])
+
+
+class SeatAllocationTests(ERPTestCase):
+
+    def create_exam(self, rows=2, columns=3, capacity=6):
+        hall = ExamHall.objects.create(name='Hall A', capacity=capacity, rows=rows, columns=columns)
+        return Exam.objects.create(name='Midterm', course=self.course, hall=hall)
+
+    def test_allocation_is_idempotent(self):
+        students = [self.create_student(f's{i}@example.com', self.course) for i in range(4)]
+        exam = self.create_exam()
+        tickets = allocate_seats(exam.id)
+        self.assertEqual(len(tickets), 4)
+        self.assertEqual([ticket.seat_number for ticket in tickets], ['01-01', '01-02', '01-03', '02-01'])
+        self.assertEqual(len({ticket.hall_ticket_number for ticket in tickets}), 4)
+
+        self.assertEqual(allocate_seats(exam.id), [])
+        self.create_student('late@example.com', self.course)
+        late = allocate_seats(exam.id)
+        self.assertEqual([ticket.seat_number for ticket in late], ['02-02'])
+        self.assertEqual(HallTicket.objects.filter(exam=exam).count(), len(students) + 1)
+
+    def test_capacity_is_checked_before_writing(self):
+        for i in range(5):
+            self.create_student(f's{i}@example.com', self.course)
+        exam = self.create_exam(rows=2, columns=2, capacity=4)
+        with self.assertRaisesMessage(ValueError, 'Hall capacity exceeded'):
+            allocate_seats(exam.id)
+        self.assertFalse(HallTicket.objects.exists())
+
+    def test_query_count_does_not_grow_with_students(self):
+        exam = self.create_exam(rows=10, columns=10, capacity=100)
+        HallTicket.reserve_numbers(1)  # Create this year's sequence row up front
+        self.create_student('first@example.com', self.course)
+        small = self.count_queries(allocate_seats, exam.id)
+        for i in range(30):
+            self.create_student(f's{i}@example.com', self.course)
+        self.assertEqual(small, self.count_queries(allocate_seats, exam.id))
+
+
+class SeatingPlanTests(TestCase):
+
+    def test_neighbours_sit_different_papers(self):
+        seats, clashes = plan_seating({'a': list(range(6)), 'b': list(range(6, 12))}, [(1, 3, 4, 12)])
+        self.assertEqual(clashes, 0)
+        placed = {(seat.row, seat.col): seat.group for seat in seats}
+        for (row, col), group in placed.items():
+            self.assertNotEqual(placed.get((row, col - 1)), group)
+            self.assertNotEqual(placed.get((row - 1, col)), group)
+
+    def test_overflow_spills_into_the_next_hall(self):
+        seats, _ = plan_seating({'a': list(range(5))}, [(1, 2, 2, 4), (2, 2, 2, 4)], taken={(1, 1, 1)})
+        self.assertEqual([seat.hall_id for seat in seats], [1, 1, 1, 2, 2])
+        self.assertNotIn((1, 1, 1), {(seat.hall_id, seat.row, seat.col) for seat in seats})
+
+    def test_capacity_counts_every_hall(self):
+        with self.assertRaisesMessage(ValueError, 'Hall capacity exceeded'):
+            plan_seating({'a': list(range(9))}, [(1, 2, 2, 4), (2, 2, 2, 4)])
+
+
+class MultiHallSeatingTests(ERPTestCase):
+
+    def test_two_courses_share_two_halls(self):
+        other = Course.objects.create(name='Commerce')
+        for i in range(4):
+            self.create_student(f'sci{i}@example.com', self.course)
+            self.create_student(f'com{i}@example.com', other)
+        first = ExamHall.objects.create(name='Hall A', capacity=4, rows=2, columns=2)
+        second = ExamHall.objects.create(name='Hall B', capacity=4, rows=2, columns=2)
+        science = Exam.objects.create(name='Physics', course=self.course, hall=first)
+        commerce = Exam.objects.create(name='Accounts', course=other, hall=first)
+
+        tickets = allocate_exam_seating([science.id, commerce.id], [first.id, second.id])
+        self.assertEqual(len(tickets), 8)
+        self.assertEqual(len({(t.hall_id, t.seat_number) for t in tickets}), 8)
+        for hall in (first, second):
+            seats = {t.seat_number: t.exam_id for t in tickets if t.hall_id == hall.id}
+            self.assertNotEqual(seats['01-01'], seats['01-02'])
+            self.assertNotEqual(seats['01-01'], seats['02-01'])
+        ticket = HallTicket.objects.get(pk=tickets[-1].pk)
+        self.assertEqual(ticket.assigned_hall, second)
+        self.assertEqual(allocate_exam_seating([science.id, commerce.id], [first.id, second.id]), [])
+
+
+    def test_legacy_seat_numbers_do_not_break_allocation(self):
+        self.assertEqual([parse_seat_number(value) for value in ('02-03', ' 2 - 3 ', 'A12', '', None, '1-2-3')],
+                         [(2, 3), (2, 3), None, None, None, None])
+        hall = ExamHall.objects.create(name='Hall A', capacity=4, rows=2, columns=2)
+        exam = Exam.objects.create(name='Physics', course=self.course, hall=hall)
+        legacy, kept = (self.create_student(f's{i}@example.com', self.course) for i in range(2))
+        HallTicket.objects.create(student=legacy, exam=exam, seat_number='A12', bench_number='B1')
+        HallTicket.objects.create(student=kept, exam=exam, seat_number='01-01', bench_number='B1')
+        late = self.create_student('late@example.com', self.course)
+
+        tickets = allocate_exam_seating([exam.id], [hall.id])
+        self.assertEqual([(ticket.student_id, ticket.seat_number) for ticket in tickets], [(late.id, '01-02')])
+
+class HallTicketSequenceTests(TransactionTestCase):
+
+    def test_concurrent_reservations_have_no_duplicates_or_gaps(self):
+        threads, rounds = 8, 20
+        reserved, errors = [], []
+
+        def worker(index):
+            try:
+                for round_number in range(rounds):
+                    reserved.extend(HallTicketSequence.reserve(2030, 1 + (index + round_number) % 3))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(reserved), list(range(1, len(reserved) + 1)))
+        self.assertEqual(HallTicketSequence.objects.get(year=2030).last_number, len(reserved))
+
+    def test_sequence_continues_after_existing_tickets(self):
+        course = Course.objects.create(name='Computer Engineering')
+        hall = ExamHall.objects.create(name='Hall A', capacity=10, rows=2, columns=5)
+        exam = Exam.objects.create(name='Midterm', course=course, hall=hall)
+        user = CustomUser.objects.create_user(email='s@example.com', password='x', user_type=3)
+        HallTicket.objects.create(student=user.student, exam=exam, hall_ticket_number='HT-2031-00041',
+                                  seat_number='01-01', bench_number='B01')
+        self.assertEqual(HallTicket.reserve_numbers(2, year=2031), ['HT-2031-00042', 'HT-2031-00043'])
+
+
+def legacy_chatbot_match(query):
+    """The original linear scan from views.chatbot_query, kept as a reference"""
+    def calculate_similarity(q1, q2):
+        words1, words2 = set(q1.split()), set(q2.split())
+        union = len(words1 | words2)
+        if union == 0:
+            return 0
+        if q1 in q2 or q2 in q1:
+            return 1.0
+        list1, list2 = q1.split(), q2.split()
+        order = sum(1 for i in range(min(len(list1), len(list2))) if list1[i] == list2[i]) / max(len(list1), len(list2))
+        return len(words1 & words2) / union + order * 0.2
+
+    def get_category_score(category):
+        keywords = CATEGORY_KEYWORDS.get(category, [])
+        score = sum(1 for keyword in keywords if keyword in query)
+        for word in query.split():
+            score += 0.5 * sum(1 for keyword in keywords if word in keyword or keyword in word)
+        return score
+
+    best, best_score = None, 0
+    for entry in ChatBot.objects.all():
+        similarity = calculate_similarity(query, entry.question.lower())
+        similarity += get_category_score(entry.category) * 0.1
+        if any(word in query for word in entry.question.lower().split()):
+            similarity += 0.2
+        if similarity > best_score:
+            best, best_score = entry, similarity
+    return best, best_score
+
+
+class ChatbotIndexTests(ERPTestCase):
+
+    QUERIES = [
+        'how do i calculate my cgpa?', 'what is kt', 'library timings', 'how do i pay fees?',
+        'hostel mess food', 'my attendance is low what should i do', 'portal password reset',
+        'when is the exam schedule', 'where do i get my hall ticket', 'xyz', 'how',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        call_command('seed_chatbot', stdout=StringIO())
+        self.client.force_login(self.hod)
+
+    def test_matches_the_linear_scan(self):
+        index = get_chatbot_index()
+        for query in self.QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(index.best_match(query, 'legacy'), legacy_chatbot_match(query))
+
+    def test_index_is_rebuilt_when_entries_change(self):
+        index = get_chatbot_index()
+        self.assertIs(get_chatbot_index(), index)
+        entry = ChatBot.objects.create(question='Where is the swimming pool?', answer='Behind block C.', category='general')
+        self.assertEqual(get_chatbot_index().best_match('where is the swimming pool?')[0], entry)
+        entry.delete()
+        self.assertNotEqual(get_chatbot_index().best_match('where is the swimming pool?')[0], entry)
+
+    def test_query_is_answered_with_one_query(self):
+        url = reverse('chatbot_query')
+        body = json.dumps({'query': 'What is KT?'})
+        self.client.post(url, body, content_type='application/json')  # Builds the index
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.json()['category'], 'academic')
+        self.assertIn('Keep Term', response.json()['answer'])
+        chatbot_queries = [query for query in queries if 'main_app_chatbot' in query['sql']]
+        self.assertEqual(len(chatbot_queries), 1)
+
+
+    def test_bm25_ranker(self):
+        index = get_chatbot_index()
+        entry, score = index.best_match('difference between kt and atkt', 'bm25')
+        self.assertEqual(entry.question, 'What is the difference between KT and ATKT?')
+        self.assertTrue(0.3 < score < 1)
+        self.assertEqual(index.best_match('zzz qqq', 'bm25'), (None, 0))
+        with self.assertRaises(ValueError):
+            index.best_match('kt', 'cosine')
+
+    def test_bm25_fallback_ranks_like_numpy(self):
+        entries = list(ChatBot.objects.all())
+        ranker = BM25Ranker(entries)
+        self.assertTrue(ranker.vectorized)
+        with mock.patch.object(chatbot.np, 'argmax', wraps=chatbot.np.argmax) as argmax:
+            expected = [ranker.best_match(query) for query in self.QUERIES]
+        self.assertTrue(argmax.called)
+        with mock.patch.object(chatbot, 'np', None):
+            fallback = BM25Ranker(entries)
+        self.assertFalse(fallback.vectorized)
+        for query, (entry, score) in zip(self.QUERIES, expected):
+            with self.subTest(query=query):
+                match, match_score = fallback.best_match(query)
+                self.assertEqual(match, entry)
+                self.assertAlmostEqual(match_score, score)
+
+    @override_settings(CHATBOT_RANKER='bm25')
+    def test_setting_selects_the_ranker(self):
+        response = self.client.post(reverse('chatbot_query'), json.dumps({'query': 'library book fine'}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['category'], 'library')
+
+    def test_evaluation_command_reports_both_rankers(self):
+        out = StringIO()
+        call_command('evaluate_chatbot', repeat=1, stdout=out)
+        self.assertIn('legacy: accuracy', out.getvalue())
+        self.assertIn('bm25: accuracy', out.getvalue())
+        self.assertIn('p99', out.getvalue())
+
+
+class HallTicketPDFCacheTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        student = self.create_student('s@example.com', self.course)
+        hall = ExamHall.objects.create(name='Hall A', capacity=10, rows=2, columns=5)
+        self.exam = Exam.objects.create(name='Midterm', course=self.course, hall=hall)
+        self.exam_subject = ExamSubject.objects.create(
+            exam=self.exam, subject=self.create_subject('Maths'), date=date(2024, 3, 1))
+        self.ticket = allocate_seats(self.exam.id)[0]
+        self.url = reverse('download_hall_ticket', args=[self.ticket.id])
+        self.client.force_login(student.admin)
+
+    def download(self, **headers):
+        with mock.patch.object(hall_ticket_pdf, 'render_hall_ticket_pdf',
+                               wraps=hall_ticket_pdf.render_hall_ticket_pdf) as render:
+            response = self.client.get(self.url, headers=headers)
+        return response, render.call_count
+
+    def test_pdf_is_rendered_once_and_revalidated_by_etag(self):
+        response, renders = self.download()
+        self.assertEqual(renders, 1)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        etag = response['ETag']
+
+        response, renders = self.download()
+        self.assertEqual((response.status_code, renders), (200, 0))
+        self.assertEqual(response['ETag'], etag)
+
+        response, renders = self.download(if_none_match=etag)
+        self.assertEqual((response.status_code, renders), (304, 0))
+
+    def test_schedule_change_invalidates_the_pdf(self):
+        etag = self.download()[0]['ETag']
+        self.exam_subject.date = date(2024, 3, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exam_subject.save()
+        self.assertFalse(os.path.exists(hall_ticket_pdf.hall_ticket_pdf_dir(self.exam.id)))
+
+        response, renders = self.download(if_none_match=etag)
+        self.assertEqual((response.status_code, renders), (200, 1))
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unprinted_changes_keep_the_pdf(self):
+        etag = self.download()[0]['ETag']
+        exam = Exam.objects.get(id=self.exam.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            exam.course = Course.objects.create(name='Commerce')
+            exam.save()
+            ExamSubject.objects.get(id=self.exam_subject.id).save()
+            self.exam.save(update_fields=['updated_at'])
+        response, renders = self.download(if_none_match=etag)
+        self.assertEqual((response.status_code, renders), (304, 0))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            exam.name = 'Final'
+            exam.save()
+        self.assertTrue(os.path.exists(hall_ticket_pdf.hall_ticket_pdf_dir(self.exam.id)))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(hall_ticket_pdf.hall_ticket_pdf_dir(self.exam.id)))
+
+    def test_pregeneration_resumes_and_merges_per_hall(self):
+        second = ExamHall.objects.create(name='Hall B', capacity=10, rows=2, columns=5)
+        self.create_student('late@example.com', self.course)
+        late = allocate_seats(self.exam.id)[0]
+        late.hall = second
+        late.save()
+        self.download()  # The first ticket is already rendered
+
+        out = StringIO()
+        call_command('pregenerate_hall_tickets', self.exam.id, workers=1, merge=True, stdout=out)
+        self.assertIn('1 rendered, 1 already up to date, 0 failed', out.getvalue())
+        merged = hall_ticket_pdf.merge_hall_ticket_pdfs(self.exam.id)
+        self.assertEqual(sorted(merged), ['Hall A', 'Hall B'])
+        self.assertEqual(len(PdfReader(merged['Hall B']).pages), 1)
+
+        out = StringIO()
+        call_command('pregenerate_hall_tickets', self.exam.id, workers=1, stdout=out)
+        self.assertIn('0 rendered, 2 already up to date', out.getvalue())
+
+    def test_ticket_changes_discard_the_merged_hall_pdfs(self):
+        second = ExamHall.objects.create(name='Hall B', capacity=10, rows=2, columns=5)
+        self.create_student('late@example.com', self.course)
+        late = allocate_seats(self.exam.id)[0]
+        late.hall = second
+        late.save()
+
+        def merge():
+            hall_ticket_pdf.pregenerate_hall_tickets(self.exam.id, workers=1)
+            return hall_ticket_pdf.merge_hall_ticket_pdfs(self.exam.id)
+
+        merged = merge()
+        self.ticket.seat_number = 'B9'
+        self.ticket.save()
+        self.assertFalse(os.path.exists(merged['Hall A']))
+        self.assertTrue(os.path.exists(merged['Hall B']))
+
+        merged = merge()
+        self.ticket.hall = second
+        self.ticket.save()
+        self.assertFalse(os.path.exists(merged['Hall A']))
+        self.assertFalse(os.path.exists(merged['Hall B']))
+
+        merged = merge()
+        late.delete()
+        self.assertEqual(list(merged), ['Hall B'])
+        self.assertFalse(os.path.exists(merged['Hall B']))
+
+
+    def test_pregeneration_is_queued_for_the_job_runner(self):
+        self.client.force_login(self.hod)
+        self.create_student('late@example.com', self.course)
+        url = reverse('generate_hall_tickets', args=[self.exam.id])
+        self.client.get(url, {'pregenerate': '1'})
+        self.client.get(url, {'pregenerate': '1'})
+        self.assertEqual(list(PendingPregeneration.objects.values_list('exam_id', flat=True)), [self.exam.id])
+
+        out = StringIO()
+        call_command('pregenerate_hall_tickets', pending=True, workers=1, stdout=out)
+        self.assertIn(f'Exam {self.exam.id}: 2 rendered', out.getvalue())
+        self.assertFalse(PendingPregeneration.objects.exists())
+
+        hall_ticket_pdf.queue_pregeneration(self.exam.id)
+        with mock.patch.object(hall_ticket_pdf, 'pregenerate_hall_tickets', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                hall_ticket_pdf.run_pending_pregenerations()
+        self.assertTrue(PendingPregeneration.objects.filter(exam=self.exam).exists())
+
+class ResultExportTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.maths = self.create_subject('Maths')
+        other_course = Course.objects.create(name='Commerce')
+        self.accounts = self.create_subject('Accounts', course=other_course,
+                                            staff=self.create_staff('other@example.com', other_course))
+        for index, subject in enumerate([self.maths, self.maths, self.accounts]):
+            student = self.create_student(f's{index}@example.com', subject.course)
+            StudentResult.objects.create(student=student, subject=subject, semester='1', academic_year='2024-25',
+                                         internal_marks=20, external_marks=50 + index, total_marks=70 + index,
+                                         grade='A')
+
+    def export(self, **params):
+        response = self.client.get(reverse('staff_export_results'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_is_filtered(self):
+        self.client.force_login(self.hod)
+        rows = list(csv.reader(StringIO(self.export(course=self.course.id, semester='1').decode())))
+        self.assertEqual(rows[0][:2], ['Email', 'First Name'])
+        self.assertEqual([row[0] for row in rows[1:]], ['s0@example.com', 's1@example.com'])
+        self.assertEqual(rows[2][4:], ['Maths', '1', '2024-25', '20.0', '51.0', '0.0', '71.0', 'A'])
+        self.assertEqual(len(list(csv.reader(StringIO(self.export().decode())))), 4)
+
+    def test_staff_only_export_their_subjects(self):
+        self.client.force_login(self.staff.admin)
+        rows = list(csv.reader(StringIO(self.export().decode())))
+        self.assertEqual({row[4] for row in rows[1:]}, {'Maths'})
+
+    def test_xlsx_export(self):
+        self.client.force_login(self.hod)
+        with zipfile.ZipFile(BytesIO(self.export(format='xlsx', subject=self.accounts.id))) as workbook:
+            self.assertIn('xl/workbook.xml', workbook.namelist())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 2)
+        self.assertIn('s2@example.com', sheet)
+        self.assertIn('<v>72.0</v>', sheet)
+
+
+class ResultImportTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.subject = self.create_subject('Maths')
+        self.students = [self.create_student(f's{i}@example.com', self.course) for i in range(3)]
+        self.client.force_login(self.staff.admin)
+
+    def upload(self, text, name='results.csv'):
+        upload = SimpleUploadedFile(name, text.encode() if isinstance(text, str) else text)
+        return self.client.post(reverse('staff_import_results'), {
+            'subject': self.subject.id, 'semester': '1', 'academic_year': '2024-25', 'file': upload,
+        })
+
+    def test_sheet_is_upserted_with_computed_grades(self):
+        StudentResult.objects.create(student=self.students[0], subject=self.subject, semester='1',
+                                     academic_year='2024-25', internal_marks=1, total_marks=1, grade='F')
+        sheet = 'Email,Internal,External,Practical\nS0@example.com,30,60,0\ns1@example.com,20,25,\ns2@example.com,10,20,5\n'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(sheet)
+        self.assertRedirects(response, reverse('staff_import_results'))
+        results = {
+            result.student_id: (result.total_marks, result.grade)
+            for result in StudentResult.objects.filter(subject=self.subject)
+        }
+        self.assertEqual(results, {
+            self.students[0].id: (90, 'O'), self.students[1].id: (45, 'C'), self.students[2].id: (35, 'F'),
+        })
+        self.assertEqual(StudentResult.objects.count(), 3)
+        self.assertLess(len(queries), 15)
+
+    def test_bad_rows_reject_the_whole_sheet(self):
+        outsider = self.create_student('other@example.com', Course.objects.create(name='Commerce'))
+        sheet = (f'Email,Internal,External\ns0@example.com,31,10\ns1@example.com,abc,10\n'
+                 f's0@example.com,5,5\n{outsider.admin.email},5,5\ns2@example.com,5,5\n')
+        response = self.upload(sheet)
+        self.assertEqual(response.status_code, 400)
+        errors = response.context['errors']
+        self.assertEqual([error['row'] for error in errors], [2, 3, 4, 5])
+        self.assertIn('outside 0-30', errors[0]['error'])
+        self.assertIn('more than once', errors[2]['error'])
+        self.assertFalse(StudentResult.objects.exists())
+
+    def test_exported_xlsx_can_be_imported(self):
+        sheet = b''.join(stream_xlsx(['Email', 'Internal', 'External', 'Practical'], [('s1@example.com', 25.0, 55.0, 10.0)]))
+        self.upload(sheet, 'results.xlsx')
+        self.assertEqual(StudentResult.objects.get(student=self.students[1]).grade, 'O')
+
+
+    def test_hostile_xlsx_is_refused(self):
+        sheet = b''.join(stream_xlsx(['Email'], [('s1@example.com',)] * 50))
+        with mock.patch.object(spreadsheets, 'MAX_XLSX_PART_SIZE', 1000):
+            with self.assertRaisesMessage(ValueError, 'larger than'):
+                read_spreadsheet(SimpleUploadedFile('results.xlsx', sheet))
+
+        # An entity declaration is the building block of billion-laughs bombs
+        entities = BytesIO()
+        with zipfile.ZipFile(BytesIO(sheet)) as source, zipfile.ZipFile(entities, 'w') as target:
+            for name in source.namelist():
+                target.writestr(name, source.read(name) if name != 'xl/workbook.xml'
+                                else '<!DOCTYPE w [<!ENTITY a "aaaa">]><workbook>&a;</workbook>')
+        with self.assertRaisesMessage(ValueError, 'Could not read the spreadsheet'):
+            read_spreadsheet(SimpleUploadedFile('results.xlsx', entities.getvalue()))
+
+class GradingEngineTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.subject = self.create_subject('Maths')
+        self.students = [self.create_student(f's{i}@example.com', self.course) for i in range(4)]
+
+    def add_result(self, student, marks, academic_year='2024-25', subject=None):
+        internal, external, practical = marks
+        return StudentResult.objects.create(
+            student=student, subject=subject or self.subject, semester='1', academic_year=academic_year,
+            internal_marks=internal, external_marks=external, practical_marks=practical)
+
+    def test_default_scale_matches_boundaries(self):
+        scale = grading.DEFAULT_SCALE
+        totals = [100, 90, 89.5, 80, 45, 40, 39.9, 0]
+        expected = ['O', 'O', 'A+', 'A+', 'C', 'C', 'F', 'F']
+        self.assertEqual([scale.grade(total) for total in totals], expected)
+        with mock.patch.object(grading.np, 'searchsorted', wraps=grading.np.searchsorted) as searchsorted:
+            self.assertEqual(scale.grade_all(totals), expected)
+        self.assertTrue(searchsorted.called)
+        with mock.patch.object(grading, 'np', None):
+            self.assertEqual(scale.grade_all(totals), expected)
+
+    def test_custom_scale_sorts_boundaries_and_uses_its_fail_grade(self):
+        scale = Scale([[50, 'P'], [75, 'D']], fail_grade='NP')
+        totals = [100, 75, 74.5, 50, 49, 0]
+        expected = ['D', 'D', 'P', 'P', 'NP', 'NP']
+        self.assertEqual([scale.grade(total) for total in totals], expected)
+        with mock.patch.object(grading.np, 'searchsorted', wraps=grading.np.searchsorted) as searchsorted:
+            self.assertEqual(scale.grade_all(totals), expected)
+            self.assertEqual(scale.grade_all([]), [])
+        self.assertEqual(searchsorted.call_count, 1)
+        with mock.patch.object(grading, 'np', None):
+            self.assertEqual(scale.grade_all(totals), expected)
+
+    def test_most_specific_scheme_wins(self):
+        other = Course.objects.create(name='Commerce')
+        GradingScheme.objects.create(name='Default', boundaries=[[50, 'P']])
+        GradingScheme.objects.create(name='Course', course=self.course, boundaries=[[60, 'P']])
+        GradingScheme.objects.create(name='Year', academic_year='2023-24', boundaries=[[70, 'P']])
+        GradingScheme.objects.create(name='Both', course=self.course, academic_year='2023-24', boundaries=[[80, 'P']])
+        resolver = SchemeResolver()
+        self.assertEqual(resolver.scale_for(self.course.id, '2023-24').thresholds, [80])
+        self.assertEqual(resolver.scale_for(self.course.id, '2024-25').thresholds, [60])
+        self.assertEqual(resolver.scale_for(other.id, '2023-24').thresholds, [70])
+        self.assertEqual(resolver.scale_for(other.id, '2024-25').thresholds, [50])
+
+    def test_only_one_scheme_per_scope(self):
+        GradingScheme.objects.create(name='Default', boundaries=[[50, 'P']])
+        GradingScheme.objects.create(name='Year', academic_year='2023-24', boundaries=[[70, 'P']])
+        GradingScheme.objects.create(name='Course', course=self.course, boundaries=[[60, 'P']])
+        for extra in ({}, {'academic_year': '2023-24'}, {'course': self.course}):
+            with self.subTest(**extra), self.assertRaises(IntegrityError), transaction.atomic():
+                GradingScheme.objects.create(name='Duplicate', boundaries=[[40, 'P']], **extra)
+
+    def test_invalid_boundaries_are_rejected(self):
+        for boundaries in ([], [[40]], [['x', 'P']], [[40, 'P'], [40, 'Q']], [[40, 'TOO']]):
+            with self.assertRaises(ValueError):
+                validate_boundaries(boundaries)
+        with self.assertRaises(ValidationError):
+            GradingScheme(name='Bad', boundaries=[[40]]).clean()
+
+    def test_regrade_only_writes_changed_rows(self):
+        results = [self.add_result(student, marks) for student, marks in zip(
+            self.students, [(30, 65, 0), (20, 30, 0), (10, 20, 0), (25, 50, 10)])]
+        StudentResult.objects.filter(id=results[1].id).update(total_marks=50, grade='B')
+        StudentResult.objects.exclude(id=results[1].id).update(total_marks=0, grade='')
+        self.assertEqual(regrade_results(), {'checked': 4, 'updated': 3})
+        self.assertEqual(regrade_results(), {'checked': 4, 'updated': 0})
+        grades = dict(StudentResult.objects.values_list('student_id', 'grade'))
+        self.assertEqual([grades[student.id] for student in self.students], ['O', 'B', 'F', 'A+'])
+
+    def test_regrade_uses_numpy_and_fallback_alike(self):
+        for index, student in enumerate(self.students):
+            self.add_result(student, (index * 7, index * 15, 0))
+        with mock.patch.object(grading, 'np', None):
+            regrade_results()
+        expected = list(StudentResult.objects.order_by('id').values_list('total_marks', 'grade'))
+        StudentResult.objects.update(total_marks=0, grade='')
+        with mock.patch.object(grading.np, 'searchsorted', wraps=grading.np.searchsorted) as searchsorted:
+            regrade_results()
+        self.assertTrue(searchsorted.called)
+        self.assertEqual(list(StudentResult.objects.order_by('id').values_list('total_marks', 'grade')), expected)
+
+    def test_scheme_changes_regrade_its_scope(self):
+        other_course = Course.objects.create(name='Commerce')
+        other_subject = self.create_subject('Accounts', course=other_course)
+        other_student = self.create_student('other@example.com', other_course)
+        mine = self.add_result(self.students[0], (20, 25, 0))
+        old_year = self.add_result(self.students[1], (20, 25, 0), academic_year='2023-24')
+        theirs = self.add_result(other_student, (20, 25, 0), subject=other_subject)
+        regrade_results()
+
+        scheme = GradingScheme.objects.create(
+            name='Pass/fail', course=self.course, academic_year='2024-25', boundaries=[[45, 'P']])
+        grades = lambda: [StudentResult.objects.get(id=result.id).grade for result in (mine, old_year, theirs)]
+        # Saving only queues the regrade; the command runs it
+        self.assertEqual(grades(), ['C', 'C', 'C'])
+        self.assertEqual(list(PendingRegrade.objects.values_list('course_id', 'academic_year')),
+                         [(self.course.id, '2024-25')])
+        call_command('regrade_results', '--pending', stdout=StringIO())
+        self.assertEqual(grades(), ['P', 'C', 'C'])
+        self.assertFalse(PendingRegrade.objects.exists())
+
+        scheme.save()
+        scheme.delete()
+        self.assertEqual(PendingRegrade.objects.count(), 1)
+        self.assertEqual(run_pending_regrades(), {'requests': 1, 'checked': 1, 'updated': 1})
+        self.assertEqual(grades(), ['C', 'C', 'C'])
+
+    def test_moving_a_scheme_regrades_its_old_scope(self):
+        mine = self.add_result(self.students[0], (20, 25, 0))
+        scheme = GradingScheme.objects.create(
+            name='Pass/fail', course=self.course, academic_year='2024-25', boundaries=[[45, 'P']])
+        run_pending_regrades()
+        self.assertEqual(StudentResult.objects.get(id=mine.id).grade, 'P')
+
+        scheme.academic_year = '2025-26'
+        scheme.save()
+        self.assertEqual(sorted(PendingRegrade.objects.values_list('academic_year', flat=True)),
+                         ['2024-25', '2025-26'])
+        run_pending_regrades()
+        self.assertEqual(StudentResult.objects.get(id=mine.id).grade, 'C')
+
+    def test_scheme_saved_during_a_regrade_stays_queued(self):
+        grading.queue_regrade(self.course.id, '2024-25')
+
+        def regrade_while_a_scheme_is_saved(**kwargs):
+            grading.queue_regrade(self.course.id, '2024-25')
+            return {'checked': 0, 'updated': 0}
+
+        with mock.patch.object(grading, 'regrade_results', side_effect=regrade_while_a_scheme_is_saved):
+            self.assertEqual(run_pending_regrades()['requests'], 1)
+        self.assertEqual(PendingRegrade.objects.count(), 1)
+
+        with mock.patch.object(grading, 'regrade_results', side_effect=OSError('database gone')):
+            with self.assertRaises(OSError):
+                run_pending_regrades()
+        self.assertEqual(PendingRegrade.objects.count(), 1)
+
+    def test_regrade_query_count_is_flat(self):
+        for student in self.students:
+            self.add_result(student, (10, 10, 10))
+        StudentResult.objects.update(grade='')
+        self.assertLessEqual(self.count_queries(regrade_results), 6)
+
+    def test_staff_entry_ignores_posted_total_and_grade(self):
+        self.client.force_login(self.staff.admin)
+        response = self.client.post(reverse('staff_save_result'), {
+            'subject': self.subject.id, 'student': self.students[0].id, 'semester': '1',
+            'academic_year': '2024-25', 'internal_marks': 30, 'external_marks': 55, 'practical_marks': 0,
+            'total_marks': 100, 'grade': 'O',
+        })
+        self.assertEqual(response.json()['status'], 'success')
+        result = StudentResult.objects.get(student=self.students[0])
+        self.assertEqual((result.total_marks, result.grade), (85, 'A+'))
+
+        self.client.post(reverse('edit_student_result'), {
+            'subject': self.subject.id, 'student': self.students[0].id, 'semester': '1',
+            'academic_year': '2024-25', 'internal_marks': 10, 'external_marks': 20, 'practical_marks': 0,
+            'total_marks': 100, 'grade': 'O',
+        })
+        result.refresh_from_db()
+        self.assertEqual((result.total_marks, result.grade), (30, 'F'))
+
+    def test_regrade_command(self):
+        self.add_result(self.students[0], (30, 60, 0))
+        StudentResult.objects.update(grade='')
+        out = StringIO()
+        call_command('regrade_results', '--course', str(self.course.id), stdout=out)
+        self.assertIn('Checked 1 results, updated 1', out.getvalue())
+
+
+class TranscriptTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.maths = self.create_subject('Maths')
+        self.physics = self.create_subject('Physics')
+        Subject.objects.filter(id=self.physics.id).update(credits=2)
+        self.students = [self.create_student(f's{i}@example.com', self.course) for i in range(3)]
+
+    def add_result(self, student, subject, total, semester='1', academic_year='2024-25'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return StudentResult.objects.create(
+                student=student, subject=subject, semester=semester, academic_year=academic_year,
+                external_marks=total, total_marks=total, grade=grading.DEFAULT_SCALE.grade(total))
+
+    def test_sgpa_and_cgpa_are_credit_weighted(self):
+        rows = [
+            (1, '2024-25', '2', 'Maths', 3, 70, 'A'),
+            (1, '2024-25', '1', 'Maths', 3, 95, 'O'),
+            (1, '2024-25', '1', 'Physics', 2, 30, 'F'),
+            (1, '2024-25', '10', 'Maths', 3, 85, 'A+'),
+            (1, '2024-25', '2', 'Seminar', 1, 0, 'P'),
+        ]
+        transcript = build_transcript(rows)
+        terms = [(term['semester'], term['credits'], term['earned_credits'], term['sgpa'], term['cgpa'])
+                 for term in transcript['semesters']]
+        self.assertEqual(terms, [
+            ('1', 5, 3, 6.0, 6.0),
+            ('2', 3, 3, 8.0, 6.75),
+            ('10', 3, 3, 9.0, 7.36),
+        ])
+        self.assertEqual((transcript['credits'], transcript['earned_credits'], transcript['cgpa']), (11, 9, 7.36))
+        self.assertIsNone(transcript['semesters'][1]['results'][1]['grade_point'])
+
+    @override_settings(TRANSCRIPT_CACHE_TIMEOUT=60)
+    def test_transcript_is_cached_until_a_result_changes(self):
+        result = self.add_result(self.students[0], self.maths, 95)
+        self.assertEqual(student_transcript(self.students[0].id)['cgpa'], 10)
+        self.assertEqual(self.count_queries(student_transcript, self.students[0].id), 0)
+
+        result.total_marks, result.grade = 75, 'A'
+        with self.captureOnCommitCallbacks(execute=True):
+            result.save()
+        self.assertEqual(student_transcript(self.students[0].id)['cgpa'], 8)
+
+        self.add_result(self.students[0], self.physics, 55)
+        self.assertEqual(student_transcript(self.students[0].id)['cgpa'], 7.2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.physics.credits = 3
+            self.physics.save()
+        self.assertEqual(student_transcript(self.students[0].id)['cgpa'], 7)
+
+    @override_settings(TRANSCRIPT_CACHE_TIMEOUT=60)
+    def test_rank_list_shares_ties_and_warms_transcripts(self):
+        for student, (maths, physics) in zip(self.students, [(85, 85), (95, 55), (85, 85)]):
+            self.add_result(student, self.maths, maths)
+            self.add_result(student, self.physics, physics)
+        self.add_result(self.students[1], self.maths, 45, semester='2')
+
+        ranks = course_rank_list(self.course.id)
+        self.assertEqual([(entry['rank'], entry['student_id'], entry['gpa']) for entry in ranks], [
+            (1, self.students[0].id, 9.0), (1, self.students[2].id, 9.0), (3, self.students[1].id, 7.12),
+        ])
+        self.assertEqual(self.count_queries(course_rank_list, self.course.id), 0)
+        self.assertEqual(self.count_queries(student_transcript, self.students[1].id), 0)
+
+        semester = course_rank_list(self.course.id, '2', '2024-25')
+        self.assertEqual([(entry['rank'], entry['gpa']) for entry in semester], [(1, 5.0)])
+
+        self.add_result(self.students[2], self.maths, 95, semester='2')
+        self.assertEqual(course_rank_list(self.course.id)[0]['student_id'], self.students[2].id)
+
+    @override_settings(TRANSCRIPT_CACHE_TIMEOUT=60)
+    def test_cascade_delete_invalidates_in_one_query(self):
+        for student in self.students:
+            self.add_result(student, self.maths, 95)
+            self.add_result(student, self.physics, 55)
+        course_rank_list(self.course.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as queries:
+                Subject.objects.filter(id=self.physics.id).delete()
+        # Only the delete's own lookup, none per cascaded result
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('SELECT')
+                              and 'FROM "main_app_subject"' in query['sql']]), 1)
+        self.assertEqual(self.count_queries(lambda: [callback() for callback in callbacks]), 1)
+        self.assertEqual(course_rank_list(self.course.id)[0]['gpa'], 10)
+        self.assertEqual(student_transcript(self.students[0].id)['cgpa'], 10)
+
+    def test_rank_list_query_count_is_flat(self):
+        for student in self.students:
+            self.add_result(student, self.maths, 80)
+        queries = self.count_queries(course_rank_list, self.course.id)
+        self.students.append(self.create_student('late@example.com', self.course))
+        self.add_result(self.students[-1], self.physics, 60)
+        self.assertEqual(self.count_queries(course_rank_list, self.course.id), queries)
+
+    def test_student_and_hod_pages(self):
+        self.add_result(self.students[0], self.maths, 95)
+        self.client.force_login(self.students[0].admin)
+        response = self.client.get(reverse('student_view_result'))
+        self.assertEqual(response.context['transcript']['cgpa'], 10)
+        self.assertContains(response, 'CGPA 10.0')
+
+        self.client.force_login(self.hod)
+        response = self.client.get(reverse('rank_list'), {'course': self.course.id})
+        self.assertEqual([entry['student_id'] for entry in response.context['ranks']], [self.students[0].id])
+
+
+class EligibilityTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.student = self.create_student('s0@example.com', self.course)
+        self.client.force_login(self.student.admin)
+
+    def add_subjects(self, count):
+        """Add `count` subjects with a result each; every other one failed"""
+        subjects = []
+        for index in range(count):
+            subject = self.create_subject(f'Subject {Subject.objects.count()}')
+            total = 20 if index % 2 == 0 else 75
+            StudentResult.objects.create(student=self.student, subject=subject, semester='1',
+                                         academic_year='2024-25', external_marks=total, total_marks=total,
+                                         grade=grading.DEFAULT_SCALE.grade(total))
+            KTApplication.objects.create(student=self.student, subject=subject, semester='1')
+            RevaluationApplication.objects.create(student=self.student, subject=subject, semester='1',
+                                                  current_marks=total)
+            subjects.append(subject)
+        return subjects
+
+    def test_latest_result_decides_kt_eligibility(self):
+        subject = self.create_subject('Maths')
+        for semester, total, grade in (('1', 20, 'F'), ('3', 75, 'A')):
+            StudentResult.objects.create(student=self.student, subject=subject, semester=semester,
+                                         academic_year='2024-25', total_marks=total, grade=grade)
+        self.assertEqual(kt_eligibility(self.student)['subjects'], [])
+        self.assertEqual(revaluation_eligibility(self.student)['results'][subject.id].semester, '3')
+
+        GradingScheme.objects.create(name='Strict', boundaries=[[80, 'P']], fail_grade='R')
+        run_pending_regrades()
+        self.assertEqual(kt_eligibility(self.student)['subjects'], [subject])
+
+    def test_views_query_count_does_not_depend_on_subjects(self):
+        self.add_subjects(2)
+        counts = []
+        for name in ('student_apply_kt', 'student_apply_revaluation'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse(name))
+            counts.append(len(queries))
+        self.add_subjects(10)
+        for name, count in zip(('student_apply_kt', 'student_apply_revaluation'), counts):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(name))
+            self.assertEqual(len(queries), count, name)
+        self.assertEqual(len(response.context['revaluation_subjects']), 12)
+
+    def test_kt_application_needs_a_failed_subject(self):
+        passed, failed = self.create_subject('Passed'), self.create_subject('Failed')
+        for subject, total, grade in ((passed, 75, 'A'), (failed, 20, 'F')):
+            StudentResult.objects.create(student=self.student, subject=subject, semester='2',
+                                         academic_year='2024-25', total_marks=total, grade=grade)
+        self.client.post(reverse('student_apply_kt'), {'subject': passed.id})
+        self.assertFalse(KTApplication.objects.exists())
+        self.client.post(reverse('student_apply_kt'), {'subject': failed.id})
+        self.client.post(reverse('student_apply_kt'), {'subject': failed.id})
+        self.assertEqual(list(KTApplication.objects.values_list('subject_id', 'semester')), [(failed.id, '2')])
+
+
+class ApplicationQueueTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.maths = self.create_subject('Maths')
+        self.physics = self.create_subject('Physics', course=Course.objects.create(name='Science'))
+        self.student = self.create_student('s0@example.com', self.course)
+        statuses = ['pending', 'approved', 'rejected']
+        KTApplication.objects.bulk_create([
+            KTApplication(student=self.student, subject=self.maths if index % 2 else self.physics,
+                          semester=str(index % 4 + 1), status=statuses[index % 3])
+            for index in range(60)
+        ])
+        # Collide timestamps so ties on created_at are broken by id
+        ids = list(KTApplication.objects.order_by('id').values_list('id', flat=True))
+        for index, application_id in enumerate(ids):
+            KTApplication.objects.filter(id=application_id).update(
+                created_at=timezone.make_aware(datetime(2024, 1, 1 + index // 3)))
+
+    def expected(self, applications):
+        return list(applications.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_pages_walk_forward_and_back_without_gaps(self):
+        applications = KTApplication.objects.all()
+        seen, page = [], keyset_paginate(applications, per_page=7)
+        pages = [page]
+        while True:
+            seen += [application.id for application in page]
+            if not page.has_next:
+                break
+            page = keyset_paginate(applications, after=page.next_cursor, per_page=7)
+            pages.append(page)
+        self.assertEqual(seen, self.expected(applications))
+        self.assertFalse(pages[0].has_previous)
+
+        back = keyset_paginate(applications, before=pages[-1].previous_cursor, per_page=7)
+        self.assertEqual([a.id for a in back], [a.id for a in pages[-2]])
+        first = keyset_paginate(applications, before=pages[1].previous_cursor, per_page=7)
+        self.assertEqual([a.id for a in first], [a.id for a in pages[0]])
+        self.assertFalse(first.has_previous)
+
+        with self.assertRaises(InvalidCursor):
+            keyset_paginate(applications, after='garbage')
+
+    def test_filters_combine(self):
+        applications = filter_applications(KTApplication, status='pending', semester='1',
+                                           course_id=self.course.id)
+        self.assertEqual(
+            [a.id for a in applications.order_by('-created_at', '-id')],
+            self.expected(KTApplication.objects.filter(status='pending', semester='1', subject=self.maths)),
+        )
+
+    def test_deep_pages_cost_the_same(self):
+        self.client.force_login(self.hod)
+        url = reverse('admin_manage_kt_applications')
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get(url, {'status': 'approved'})
+        self.assertEqual(len(response.context['kt_applications']), 20)
+
+        cursor = response.context['page'].next_cursor
+        self.assertIsNone(cursor)
+        response = self.client.get(url)
+        for _ in range(2):
+            cursor = response.context['page'].next_cursor
+            with CaptureQueriesContext(connection) as deep_page:
+                response = self.client.get(url, {'after': cursor})
+        self.assertEqual(len(deep_page), len(first_page))
+        self.assertEqual([a.id for a in response.context['kt_applications']],
+                         self.expected(KTApplication.objects.all())[50:])
+
+        response = self.client.get(url, {'after': 'not-a-cursor'})
+        self.assertEqual(len(response.context['kt_applications']), 25)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Plan text is SQLite specific')
+    def test_status_queue_uses_composite_index(self):
+        page = filter_applications(KTApplication, status='pending').order_by('-created_at', '-id')[:26]
+        self.assertIn('kt_status_created_idx', page.explain())
+
+
+class StubTransport:
+    """Records each multicast; tokens listed in `errors` get that error back, `fail` raises"""
+
+    def __init__(self, errors=None, fail=False):
+        self.calls = []
+        self.errors = errors or {}
+        self.fail = fail
+
+    def send(self, payload, tokens):
+        self.calls.append((payload, list(tokens)))
+        if self.fail:
+            raise ConnectionError('push service unreachable')
+        return [self.errors.get(token) for token in tokens]
+
+
+@override_settings(NOTIFICATION_TRANSPORT='main_app.notifications.LocalTransport')
+class NotificationOutboxTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        other_course = Course.objects.create(name='Commerce')
+        self.students = [self.create_student(f's{i}@example.com', self.course) for i in range(5)]
+        self.outsider = self.create_student('other@example.com', other_course)
+        for index, student in enumerate(self.students + [self.outsider]):
+            CustomUser.objects.filter(id=student.admin_id).update(fcm_token=f'token-{index}')
+
+    def test_views_only_enqueue(self):
+        self.client.force_login(self.hod)
+        with mock.patch('requests.Session.post') as post:
+            response = self.client.post(reverse('send_student_notification'),
+                                        {'id': self.students[0].admin_id, 'message': 'Hello'})
+            self.assertEqual(response.content, b'True')
+            response = self.client.post(reverse('send_bulk_notification'),
+                                        {'audience': 'student', 'course': self.course.id, 'message': 'Exam moved'})
+        self.assertRedirects(response, reverse('admin_notify_student'))
+        post.assert_not_called()
+        self.assertEqual(NotificationOutbox.objects.filter(status='pending').count(), 6)
+        self.assertEqual(NotificationStudent.objects.filter(message='Exam moved').count(), 5)
+        self.assertFalse(NotificationStudent.objects.filter(student=self.outsider).exists())
+
+        self.client.post(reverse('send_bulk_notification'), {'audience': 'staff', 'message': 'Staff meeting'})
+        self.assertEqual(NotificationStaff.objects.filter(staff=self.staff).count(), 1)
+
+    def test_fan_out_query_count_is_flat(self):
+        few = self.count_queries(notifications.notify_students, Student.objects.filter(id=self.students[0].id), 'Hi')
+        many = self.count_queries(notifications.notify_students, Student.objects.all(), 'Hi')
+        self.assertEqual(few, many)
+
+    def test_dispatch_batches_identical_payloads(self):
+        notifications.notify_students(Student.objects.filter(course=self.course), 'Exam moved')
+        notifications.notify_students(Student.objects.filter(id=self.outsider.id), 'Welcome')
+        transport = StubTransport()
+        counts = notifications.dispatch_notifications(transport)
+        self.assertEqual(counts, {'sent': 6, 'retried': 0, 'failed': 0})
+        self.assertEqual(sorted(len(tokens) for _, tokens in transport.calls), [1, 5])
+        self.assertEqual(notifications.dispatch_notifications(transport), {'sent': 0, 'retried': 0, 'failed': 0})
+        self.assertEqual(NotificationOutbox.objects.filter(status='sent', sent_at__isnull=False).count(), 6)
+
+    def test_failures_back_off_and_give_up(self):
+        CustomUser.objects.filter(id=self.students[4].admin_id).update(fcm_token='')
+        notifications.notify_students(Student.objects.filter(course=self.course), 'Hi')
+        transport = StubTransport(errors={'token-0': 'NotRegistered', 'token-1': 'Unavailable'})
+        self.assertEqual(notifications.dispatch_notifications(transport, max_attempts=2),
+                         {'sent': 2, 'retried': 1, 'failed': 2})
+        retry = NotificationOutbox.objects.get(status='pending')
+        self.assertEqual((retry.user_id, retry.attempts), (self.students[1].admin_id, 1))
+        self.assertGreater(retry.next_attempt_at, timezone.now())
+        self.assertEqual(NotificationOutbox.objects.get(user=self.students[4].admin).last_error, 'No device token')
+
+        # Not due yet, then due again: the second failure exhausts the attempts
+        self.assertEqual(notifications.dispatch_notifications(transport)['retried'], 0)
+        NotificationOutbox.objects.filter(id=retry.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(notifications.dispatch_notifications(StubTransport(fail=True), max_attempts=2),
+                         {'sent': 0, 'retried': 0, 'failed': 1})
+        self.assertIn('unreachable', NotificationOutbox.objects.get(id=retry.id).last_error)
+
+    def test_stale_claims_are_released(self):
+        notifications.notify_students(Student.objects.filter(id=self.students[0].id), 'Hi')
+        NotificationOutbox.objects.update(status='sending', claimed_by='dead-worker')
+        NotificationOutbox.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(notifications.dispatch_notifications(StubTransport())['sent'], 1)
+
+    def test_fcm_transport_sends_one_multicast(self):
+        response = mock.Mock(**{'json.return_value': {'results': [{'message_id': '1'}, {'error': 'NotRegistered'}]}})
+        transport = notifications.FCMTransport(pool_size=2)
+        with mock.patch.object(transport.session, 'post', return_value=response) as post:
+            self.assertEqual(transport.send({'title': 'T'}, ['a', 'b']), [None, 'NotRegistered'])
+        body = json.loads(post.call_args.kwargs['data'])
+        self.assertEqual(body['registration_ids'], ['a', 'b'])
+        self.assertEqual(post.call_args.kwargs['timeout'], 10)
+
+    def test_worker_command_drains_the_outbox(self):
+        notifications.LocalTransport.sent.clear()
+        notifications.notify_students(Student.objects.all(), 'Hi')
+        out = StringIO()
+        call_command('notification_worker', '--once', '--workers', '2', stdout=out)
+        self.assertIn('sent 6', out.getvalue())
+        self.assertEqual(len(notifications.LocalTransport.sent), 6)
+
+
+class ApplicationDecisionTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.subject = self.create_subject('Maths')
+        self.client.force_login(self.hod)
+
+    def add_applications(self, count, model=KTApplication, semester='1'):
+        created = []
+        for _ in range(count):
+            student = self.create_student(f'student{Student.objects.count()}@example.com', self.course)
+            StudentResult.objects.create(student=student, subject=self.subject, semester=semester,
+                                         academic_year='2024-25', internal_marks=10, external_marks=20,
+                                         total_marks=30, grade='F')
+            extra = {'current_marks': 30} if model is RevaluationApplication else {}
+            created.append(model.objects.create(student=student, subject=self.subject, semester=semester, **extra))
+        return created
+
+    def bulk_post(self, kind, data):
+        return self.client.post(reverse('admin_bulk_update_applications', args=[kind]), data)
+
+    def test_bulk_decision_query_count_is_flat(self):
+        few = self.add_applications(3)
+        with CaptureQueriesContext(connection) as small:
+            self.bulk_post('kt', {'application': [a.id for a in few], 'decision': 'approved', 'remarks': 'OK'})
+        many = self.add_applications(30)
+        with CaptureQueriesContext(connection) as large:
+            response = self.bulk_post('kt', {'application': [a.id for a in many], 'decision': 'rejected'})
+        self.assertEqual(len(small), len(large))
+        self.assertRedirects(response, reverse('admin_manage_kt_applications'), fetch_redirect_response=False)
+        self.assertEqual(KTApplication.objects.filter(status='approved').count(), 3)
+        self.assertEqual(KTApplication.objects.filter(status='rejected').count(), 30)
+        self.assertEqual(Notification.objects.filter(notification_type='kt').count(), 33)
+        self.assertIn('has been approved. Remarks: OK', Notification.objects.order_by('id').first().message)
+
+    def test_filtered_scope_only_touches_matching_applications(self):
+        self.add_applications(2, semester='1')
+        self.add_applications(3, semester='2')
+        response = self.bulk_post('kt', {'scope': 'filtered', 'filter_semester': '2', 'decision': 'rejected'})
+        self.assertRedirects(response, reverse('admin_manage_kt_applications') + '?semester=2',
+                             fetch_redirect_response=False)
+        self.assertEqual(dict(KTApplication.objects.values_list('semester').annotate(n=Count('id'))
+                              .filter(status='rejected')), {'2': 3})
+
+    def test_filtered_scope_needs_a_filter_and_skips_decided_applications(self):
+        first, second = self.add_applications(2, semester='2')
+        KTApplication.objects.filter(id=first.id).update(status='approved', remarks='Done')
+        for filters in ({}, {'filter_semester': '', 'filter_subject': '', 'filter_course': ''},
+                        {'filter_status': 'approved'}):
+            self.bulk_post('kt', {'scope': 'filtered', 'decision': 'rejected', **filters})
+        self.assertEqual(dict(KTApplication.objects.values_list('id', 'status')),
+                         {first.id: 'approved', second.id: 'pending'})
+        self.assertFalse(Notification.objects.exists())
+
+        self.bulk_post('kt', {'scope': 'filtered', 'filter_semester': '2', 'decision': 'rejected'})
+        self.assertEqual(dict(KTApplication.objects.values_list('id', 'status')),
+                         {first.id: 'approved', second.id: 'rejected'})
+        self.assertEqual(Notification.objects.get().user, second.student.admin)
+
+    def test_approved_revaluations_are_regraded_in_the_batch(self):
+        first, second = self.add_applications(2, RevaluationApplication)
+        self.bulk_post('revaluation', {
+            'application': [first.id, second.id], 'decision': 'approved',
+            f'internal_marks_{first.id}': '28', f'external_marks_{first.id}': '60',
+        })
+        results = {r.student_id: (r.total_marks, r.grade) for r in StudentResult.objects.all()}
+        self.assertEqual(results, {first.student_id: (88, 'A+'), second.student_id: (30, 'F')})
+        message = Notification.objects.get(user=first.student.admin).message
+        self.assertIn('New total marks: 88.0. Grade: A+', message)
+
+    def test_missing_result_rolls_back_everything(self):
+        application = self.add_applications(1, RevaluationApplication)[0]
+        StudentResult.objects.all().delete()
+        with self.assertRaises(ApplicationDecisionError) as raised:
+            decide_applications(RevaluationApplication.objects.all(), 'approved')
+        self.assertEqual(raised.exception.errors[0]['application'], application.id)
+        self.assertEqual(RevaluationApplication.objects.get().status, 'pending')
+        self.assertFalse(Notification.objects.exists())
+
+    def test_single_revaluation_handler_uses_the_batch(self):
+        application = self.add_applications(1, RevaluationApplication)[0]
+        self.client.force_login(self.staff.admin)
+        self.client.post(reverse('staff_update_revaluation_status', args=[application.id]), {
+            'status': 'approved', 'remarks': 'Rechecked',
+            'internal_marks': '25', 'external_marks': '50', 'practical_marks': '0',
+        })
+        result = StudentResult.objects.get()
+        self.assertEqual((result.total_marks, result.grade), (75, 'A'))
+        self.assertEqual(RevaluationApplication.objects.get().status, 'approved')
+
+
+class NotificationInboxTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.student = self.create_student('inbox@example.com', self.course)
+        self.user = self.student.admin
+
+    def add_notifications(self, count, is_read=False):
+        return Notification.objects.bulk_create([
+            Notification(user=self.user, title=f'Notice {index}', message='Hello', notification_type='general',
+                         is_read=is_read)
+            for index in range(count)
+        ])
+
+    def test_unread_count_is_one_indexed_count(self):
+        self.add_notifications(3)
+        self.add_notifications(2, is_read=True)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(unread_count(self.user), 3)
+        self.assertEqual(len(queries), 1)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            self.assertIn('COVERING INDEX notification_unread_idx', plan)
+
+    def test_mark_read_only_touches_unread_rows(self):
+        unread = self.add_notifications(2)
+        self.add_notifications(3, is_read=True)
+        self.assertEqual(mark_read(self.user, [unread[0].id]), 1)
+        self.assertEqual(mark_read(self.user), 1)
+        self.assertEqual(mark_read(self.user), 0)
+        self.assertEqual(unread_count(self.user), 0)
+
+    def test_inbox_page_marks_only_what_was_shown(self):
+        self.add_notifications(25)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('student_notifications'))
+        page = response.context['page']
+        self.assertEqual(len(page), 20)
+        self.assertTrue(page.has_next)
+        self.assertEqual(unread_count(self.user), 5)
+        response = self.client.get(reverse('student_notifications'), {'after': page.next_cursor})
+        self.assertEqual(len(response.context['page']), 5)
+        self.assertEqual(unread_count(self.user), 0)
+
+    def test_unread_count_endpoint_and_badge(self):
+        self.add_notifications(4)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('notification_unread_count'))
+        self.assertEqual(response.json(), {'status': 'success', 'unread': 4})
+        response = self.client.get(reverse('student_view_notification'))
+        self.assertContains(response, 'id="unread-notifications"')
+        self.assertEqual(str(response.context['unread_notifications']), '4')
+
+    def test_mark_read_endpoint(self):
+        notices = self.add_notifications(3)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('mark_notifications_read'), {'notification': [notices[0].id]})
+        self.assertEqual(response.json(), {'status': 'success', 'updated': 1, 'unread': 2})
+        self.assertEqual(self.client.get(reverse('mark_notifications_read')).status_code, 405)
+
+    def test_staff_inbox_is_newest_first_and_paginated(self):
+        NotificationStaff.objects.bulk_create([NotificationStaff(staff=self.staff, message=f'M{i}') for i in range(23)])
+        self.client.force_login(self.staff.admin)
+        response = self.client.get(reverse('staff_view_notification'))
+        page = response.context['page']
+        self.assertEqual([n.message for n in page][:2], ['M22', 'M21'])
+        self.assertEqual(len(page), 20)
+        response = self.client.get(reverse('staff_view_notification'), {'after': page.next_cursor})
+        self.assertEqual([n.message for n in response.context['page']], ['M2', 'M1', 'M0'])
+
+
+class RequestProfileTests(ERPTestCase):
+    STAFF_PAGES = ('staff_home', 'staff_take_attendance', 'staff_add_result', 'staff_view_notification',
+                   'staff_apply_leave', 'staff_view_profile')
+    STUDENT_PAGES = ('student_home', 'student_view_attendance', 'student_view_result',
+                     'student_view_notification', 'student_apply_leave', 'student_view_profile',
+                     'student_kt_applications', 'student_apply_kt')
+
+    def setUp(self):
+        super().setUp()
+        self.student = self.populate(students=1, subjects=2)[0]
+
+    def profile_queries(self, user, url_name):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200, url_name)
+        return [query['sql'] for query in queries
+                if '"admin_id" =' in query['sql'] and any(
+                    f'FROM "main_app_{table}"' in query['sql'] for table in ('staff', 'student', 'admin'))]
+
+    def test_staff_pages_fetch_the_profile_once(self):
+        for url_name in self.STAFF_PAGES:
+            with self.subTest(url_name):
+                self.assertEqual(len(self.profile_queries(self.staff.admin, url_name)), 1)
+
+    def test_student_pages_fetch_the_profile_once(self):
+        for url_name in self.STUDENT_PAGES:
+            with self.subTest(url_name):
+                self.assertEqual(len(self.profile_queries(self.student.admin, url_name)), 1)
+
+    def test_profile_brings_course_and_session(self):
+        for url_name in ('student_view_profile', 'student_home'):
+            with self.subTest(url_name):
+                sql = self.profile_queries(self.student.admin, url_name)[0]
+                self.assertIn('"main_app_course"', sql)
+                self.assertIn('"main_app_session"', sql)
+
+    def test_wrong_role_profile_is_404(self):
+        self.client.force_login(self.hod)
+        self.assertEqual(self.client.get(reverse('staff_home')).status_code, 404)
+
+
+class PermissionTableTests(ERPTestCase):
+
+    def test_module_defaults_and_declarations(self):
+        table = PermissionTable()
+        self.assertEqual(table.roles[hod_views.admin_home], {HOD})
+        self.assertEqual(table.roles[staff_views.staff_home], {HOD, STAFF})
+        self.assertEqual(table.roles[student_views.student_home], {STUDENT})
+        self.assertTrue(table.allows(views.login_page, ANONYMOUS))
+        self.assertFalse(table.allows(views.student_notifications, STAFF))
+        self.assertFalse(table.allows(views.logout_user, ANONYMOUS))
+        self.assertEqual(table.redirect_url('9'), reverse('login_page'))
+
+    def test_decorator_works_on_functions_and_classes(self):
+        @roles(STAFF)
+        class View:
+            pass
+
+        def view(request):
+            pass
+        view.view_class = View
+        self.assertEqual(view_roles(view), {STAFF})
+        self.assertEqual(view_roles(roles(HOD, STUDENT)(lambda request: None)), {HOD, STUDENT})
+
+    def test_redirects_by_role(self):
+        student = self.create_student('perm@example.com', self.course)
+        cases = [
+            (None, 'admin_home', 'login_page'),
+            (self.hod, 'student_home', 'admin_home'),
+            (self.hod, 'edit_student_result', 'admin_home'),
+            (self.staff.admin, 'admin_home', 'staff_home'),
+            (self.staff.admin, 'student_notifications', 'staff_home'),
+            (student.admin, 'staff_home', 'student_home'),
+            (student.admin, 'admin_manage_kt_applications', 'student_home'),
+        ]
+        for user, url_name, home in cases:
+            with self.subTest(url_name, user=user):
+                self.client.logout()
+                if user:
+                    self.client.force_login(user)
+                response = self.client.get(reverse(url_name))
+                self.assertRedirects(response, reverse(home), fetch_redirect_response=False)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('login_page')).status_code, 200)
+
+    def test_requests_do_not_reverse(self):
+        self.client.get(reverse('login_page'))  # Loads the middleware and its table
+        with mock.patch('main_app.permissions.reverse') as patched:
+            self.client.get(reverse('admin_home'))
+        patched.assert_not_called()
+
+
+class RosterTests(ERPTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.hod)
+
+    def add_students(self, count):
+        return [self.create_student(f'student{Student.objects.count()}@example.com', self.course)
+                for _ in range(count)]
+
+    def page_queries(self, url_name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_page_query_count_does_not_grow_with_rows(self):
+        self.add_students(3)
+        small = self.page_queries('manage_student')
+        self.add_students(40)
+        self.assertEqual(self.page_queries('manage_student'), small)
+        for index in range(10):
+            self.create_staff(f'teacher{index}@example.com', self.course)
+        self.assertEqual(self.page_queries('manage_staff'), self.page_queries('manage_student'))
+
+    def test_keyset_pages_search_and_sort(self):
+        self.add_students(30)
+        response = self.client.get(reverse('manage_student'), {'sort': '-email'})
+        page = response.context['page']
+        self.assertEqual(len(page), 25)
+        self.assertEqual(page.items[0].email, 'student9@example.com')
+        self.assertContains(response, '<td>1</td>')
+        response = self.client.get(reverse('manage_student'), {'sort': '-email', 'after': page.next_cursor,
+                                                               'start': response.context['next_start']})
+        self.assertEqual(len(response.context['page']), 5)
+        self.assertContains(response, '<td>26</td>')
+        self.assertNotContains(response, '<td>1</td>')
+        response = self.client.get(reverse('manage_student'), {
+            'sort': '-email', 'before': response.context['page'].previous_cursor,
+            'start': response.context['previous_start']})
+        self.assertEqual(response.context['start_index'], 1)
+
+        response = self.client.get(reverse('manage_student'), {'q': 'STUDENT2'})
+        self.assertEqual(sorted(user.email for user in response.context['page']),
+                         sorted(f'student{n}@example.com' for n in (2, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29)))
+
+    def test_search_is_served_by_the_lower_indexes(self):
+        self.add_students(3)
+        CustomUser.objects.filter(email='student1@example.com').update(last_name='Zed', first_name='Amy')
+        self.assertEqual([user.email for user in roster_queryset('student', 'zE')], ['student1@example.com'])
+        self.assertEqual([user.email for user in roster_queryset('student', 'aM')], ['student1@example.com'])
+        self.assertFalse(roster_queryset('staff', 'student'))
+        if connection.vendor == 'sqlite':
+            # The planner only prefers the range once statistics show how selective it is
+            CustomUser.objects.bulk_create([
+                CustomUser(email=f'bulk{n}@example.com', first_name='Bulk', last_name=f'User{n}',
+                           user_type=str(n % 3 + 1)) for n in range(300)])
+            sql, params = roster_queryset('student', 'zed').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            for index in ('user_type_lower_last_idx', 'user_type_lower_first_idx', 'user_type_lower_email_idx'):
+                self.assertIn(index, plan)
+
+
+class StudentImportTests(ERPTestCase):
+
+    def sheet(self, rows, header=('Email', 'First Name', 'Last Name', 'Gender', 'Password', 'Course', 'Session')):
+        out = StringIO()
+        writer = csv.writer(out)
+        writer.writerow(header)
+        writer.writerows(rows)
+        return SimpleUploadedFile('students.csv', out.getvalue().encode(), content_type='text/csv')
+
+    def records(self, count, start=0):
+        return [
+            {'email': f'new{n}@example.com', 'first name': 'New', 'last name': f'Student{n}', 'gender': 'F',
+             'password': f'secret{n}' if n % 2 else '', '_row': n + 2}
+            for n in range(start, start + count)
+        ]
+
+    def test_upload_creates_users_and_profiles(self):
+        self.client.force_login(self.hod)
+        response = self.client.post(reverse('import_students'), {
+            'course': self.course.id, 'session': self.session.id,
+            'file': self.sheet([
+                ('a@example.com', 'Ann', 'Lee', 'F', 'pass123', '', ''),
+                ('B@Example.COM', 'Bo', 'Kim', 'male', '', 'computer engineering', '2023-2027'),
+            ]),
+        })
+        self.assertRedirects(response, reverse('import_students'), fetch_redirect_response=False)
+        ann = CustomUser.objects.get(email='a@example.com')
+        self.assertEqual((ann.user_type, ann.gender), ('3', 'F'))
+        self.assertTrue(ann.check_password('pass123'))
+        self.assertEqual((ann.student.course, ann.student.session), (self.course, self.session))
+        bo = CustomUser.objects.get(email='B@example.com')
+        self.assertFalse(bo.has_usable_password())
+        self.assertEqual((bo.gender, bo.student.gender, bo.student.course), ('M', 'M', self.course))
+
+    def test_web_upload_hashes_without_a_process_pool(self):
+        self.client.force_login(self.hod)
+        rows = [(f'p{n}@example.com', 'Pat', f'Lee{n}', 'F', f'secret{n}', '', '')
+                for n in range(hashing.POOL_THRESHOLD)]
+        with mock.patch.object(hashing, 'ProcessPoolExecutor', side_effect=AssertionError('pool started')):
+            response = self.client.post(reverse('import_students'), {
+                'course': self.course.id, 'session': self.session.id, 'file': self.sheet(rows)})
+        self.assertRedirects(response, reverse('import_students'), fetch_redirect_response=False)
+        self.assertTrue(CustomUser.objects.get(email='p0@example.com').check_password('secret0'))
+
+    def test_every_bad_row_is_reported_and_nothing_is_written(self):
+        self.create_student('taken@example.com', self.course)
+        self.client.force_login(self.hod)
+        response = self.client.post(reverse('import_students'), {'file': self.sheet([
+            ('ok@example.com', 'Ok', 'Row', 'F', '', str(self.course.id), str(self.session.id)),
+            ('ok@example.com', 'Dup', 'Row', 'F', '', str(self.course.id), str(self.session.id)),
+            ('TAKEN@example.com', 'Old', 'Row', 'M', '', str(self.course.id), str(self.session.id)),
+            ('not-an-email', '', 'Row', 'X', '', 'Biology', ''),
+        ])})
+        self.assertEqual(response.status_code, 400)
+        errors = [(error['row'], error['error']) for error in response.context['errors']]
+        self.assertEqual(errors, [
+            (3, 'Email listed more than once'),
+            (4, 'A user with this email already exists'),
+            (5, 'Email is not valid'),
+            (5, 'First name is missing'),
+            (5, 'Gender must be one of M, F'),
+            (5, 'Unknown course "Biology"'),
+            (5, 'Session is missing'),
+        ])
+        self.assertFalse(CustomUser.objects.filter(email='ok@example.com').exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        small = self.count_queries(import_student_sheet, self.records(3), self.course, self.session, workers=1)
+        large = self.count_queries(import_student_sheet, self.records(60, start=3), self.course, self.session,
+                                   workers=1)
+        self.assertEqual(small, large)
+        self.assertEqual(Student.objects.filter(course=self.course, session=self.session).count(), 63)
+
+    def test_passwords_hashed_across_processes_keep_their_order(self):
+        passwords = [f'pw{n}' for n in range(20)]
+        hashed = hash_passwords(passwords, workers=2)
+        user = CustomUser()
+        for password, encoded in zip(passwords, hashed):
+            user.password = encoded
+            self.assertTrue(user.check_password(password))
+
+    def test_missing_required_column(self):
+        with self.assertRaises(StudentImportError):
+            import_student_sheet([{'email': 'x@example.com', '_row': 2}])
+
+    def test_command(self):
+        path = os.path.join(tempfile.mkdtemp(), 'students.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'wb') as handle:
+            handle.write(self.sheet([('c@example.com', 'Cy', 'Ng', 'M', 'pw', '', '')]).read())
+        out = StringIO()
+        call_command('import_students', path, course=self.course.id, session=self.session.id, workers=1, stdout=out)
+        self.assertIn('Imported 1 students', out.getvalue())
+        self.assertTrue(Student.objects.filter(admin__email='c@example.com', course=self.course).exists())
@@ -0,0 +1,199 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .grading import GRADE_POINTS
+from .models import Student, StudentResult, Subject
+
+TRANSCRIPT_FIELDS = (
+    'student_id', 'academic_year', 'semester', 'subject__name', 'subject__credits', 'total_marks', 'grade',
+)
+
+
+def transcript_cache_key(student_id):
+    return f'transcript:{student_id}'
+
+
+def rank_list_cache_key(course_id):
+    return f'rank_lists:{course_id}'
+
+
+def _cache_timeout():
+    return getattr(settings, 'TRANSCRIPT_CACHE_TIMEOUT', 0)
+
+
+def semester_order(academic_year, semester):
+    """Sort key for (academic year, semester) pairs"""
+    # '10' must sort after '9'; free-text semesters sort after numbered ones
+    return (academic_year, (0, int(semester), '') if semester.isdigit() else (1, 0, semester))
+
+
+def _gpa(points, credits):
+    return round(points / credits, 2) if credits else None
+
+
+def build_transcript(rows):
+    """
+    Turn one student's result rows (TRANSCRIPT_FIELDS tuples) into a
+    transcript: per-semester SGPA and the running CGPA after each
+    semester, both credit-weighted. Subjects whose grade has no grade
+    points are listed but left out of the averages.
+    """
+    semesters = {}
+    for _, academic_year, semester, subject, credits, total, grade in rows:
+        semesters.setdefault((academic_year, semester), []).append({
+            'subject': subject, 'credits': credits, 'total_marks': total,
+            'grade': grade, 'grade_point': GRADE_POINTS.get(grade),
+        })
+
+    transcript = {'semesters': [], 'credits': 0, 'earned_credits': 0, 'cgpa': None}
+    total_points = total_credits = 0
+    for academic_year, semester in sorted(semesters, key=lambda key: semester_order(*key)):
+        results = sorted(semesters[academic_year, semester], key=lambda result: result['subject'])
+        graded = [result for result in results if result['grade_point'] is not None]
+        credits = sum(result['credits'] for result in graded)
+        points = sum(result['credits'] * result['grade_point'] for result in graded)
+        total_points += points
+        total_credits += credits
+        transcript['semesters'].append({
+            'academic_year': academic_year, 'semester': semester, 'results': results,
+            'credits': credits,
+            'earned_credits': sum(result['credits'] for result in graded if result['grade_point'] > 0),
+            'sgpa': _gpa(points, credits),
+            'cgpa': _gpa(total_points, total_credits),
+        })
+    transcript['credits'] = total_credits
+    transcript['earned_credits'] = sum(semester['earned_credits'] for semester in transcript['semesters'])
+    transcript['cgpa'] = _gpa(total_points, total_credits)
+    return transcript
+
+
+def student_transcript(student_id):
+    """
+    One student's transcript, built from a single query. When
+    TRANSCRIPT_CACHE_TIMEOUT is set it is cached per student; result
+    writes invalidate the entry.
+    """
+    timeout = _cache_timeout()
+    key = transcript_cache_key(student_id)
+    if timeout:
+        transcript = cache.get(key)
+        if transcript is not None:
+            return transcript
+    transcript = build_transcript(
+        StudentResult.objects.filter(student_id=student_id).values_list(*TRANSCRIPT_FIELDS)
+    )
+    if timeout:
+        cache.set(key, transcript, timeout)
+    return transcript
+
+
+def course_transcripts(course_id):
+    """
+    Transcripts of every student with results in a course, from one query
+    ordered by student. All of them are written to the cache in one
+    set_many, so students opening their results afterwards hit the cache.
+    """
+    transcripts = {}
+    current, rows = None, []
+    results = StudentResult.objects.filter(subject__course_id=course_id).order_by('student_id')
+    for row in results.values_list(*TRANSCRIPT_FIELDS).iterator(chunk_size=2000):
+        if row[0] != current and rows:
+            transcripts[current] = build_transcript(rows)
+            rows = []
+        current = row[0]
+        rows.append(row)
+    if rows:
+        transcripts[current] = build_transcript(rows)
+
+    timeout = _cache_timeout()
+    if timeout and transcripts:
+        cache.set_many({
+            transcript_cache_key(student_id): transcript for student_id, transcript in transcripts.items()
+        }, timeout)
+    return transcripts
+
+
+def course_rank_list(course_id, semester=None, academic_year=None):
+    """
+    Rank every student of a course by CGPA, or by SGPA when a semester
+    and academic year are given. Equal GPAs share a rank (1, 2, 2, 4).
+    All rank lists of a course are computed from one course_transcripts()
+    pass and cached together until a result in the course changes.
+    """
+    timeout = _cache_timeout()
+    key = rank_list_cache_key(course_id)
+    rank_lists = (cache.get(key) or {}) if timeout else {}
+    scope = (semester or '', academic_year or '')
+    if scope in rank_lists:
+        return rank_lists[scope]
+
+    transcripts = course_transcripts(course_id)
+    students = Student.objects.filter(id__in=transcripts).values_list(
+        'id', 'admin__first_name', 'admin__last_name', 'admin__email')
+    entries = []
+    for student_id, first_name, last_name, email in students:
+        transcript = transcripts[student_id]
+        if semester and academic_year:
+            term = next((term for term in transcript['semesters']
+                         if term['semester'] == semester and term['academic_year'] == academic_year), None)
+            gpa, credits = (term['sgpa'], term['credits']) if term else (None, 0)
+        else:
+            gpa, credits = transcript['cgpa'], transcript['credits']
+        if gpa is not None:
+            entries.append({
+                'student_id': student_id, 'name': f'{first_name} {last_name}', 'email': email,
+                'gpa': gpa, 'credits': credits,
+            })
+
+    entries.sort(key=lambda entry: (-entry['gpa'], entry['name'], entry['student_id']))
+    for position, entry in enumerate(entries, start=1):
+        previous = entries[position - 2] if position > 1 else None
+        entry['rank'] = previous['rank'] if previous and previous['gpa'] == entry['gpa'] else position
+
+    if timeout:
+        rank_lists[scope] = entries
+        cache.set(key, rank_lists, timeout)
+    return entries
+
+
+def invalidate_transcripts(student_ids, course_ids=(), subject_ids=()):
+    """
+    Drop cached transcripts of the given students and the rank lists of the
+    given courses and of the courses the given subjects belong to.
+    """
+    course_ids = set(course_ids)
+    if subject_ids:
+        course_ids.update(Subject.objects.filter(id__in=set(subject_ids)).values_list('course_id', flat=True))
+    cache.delete_many(
+        [transcript_cache_key(student_id) for student_id in set(student_ids)]
+        + [rank_list_cache_key(course_id) for course_id in course_ids]
+    )
+
+
+# Ids waiting for the current transaction to commit, per thread (and so per connection)
+_pending = threading.local()
+
+
+def invalidate_transcripts_on_commit(student_ids=(), course_ids=(), subject_ids=()):
+    """
+    invalidate_transcripts() once the transaction commits. Calls made in one
+    transaction, such as the post_delete signals of a cascade, are merged so
+    the first callback to run invalidates them all with a single query.
+    """
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = (set(), set(), set())
+    for pending, ids in zip(_pending.ids, (student_ids, course_ids, subject_ids)):
+        pending.update(ids)
+    # Ids left behind by a rolled-back transaction are flushed with the next one
+    transaction.on_commit(_flush_pending_invalidations)
+
+
+def _flush_pending_invalidations():
+    ids = getattr(_pending, 'ids', None)
+    if ids is None or not any(ids):
+        return
+    del _pending.ids
+    invalidate_transcripts(*ids)
@@ -29,8 +29,11 @@ urlpatterns = [
     path("admin/home/", hod_views.admin_home, name='admin_home'),
     path("staff/add", hod_views.add_staff, name='add_staff'),
     path("course/add", hod_views.add_course, name='add_course'),
+    path("course/rank-list/", hod_views.rank_list, name='rank_list'),
     path("send_student_notification/", hod_views.send_student_notification,
          name='send_student_notification'),
+    path("send_bulk_notification/", hod_views.send_bulk_notification,
+         name='send_bulk_notification'),
     path("send_staff_notification/", hod_views.send_staff_notification,
          name='send_staff_notification'),
     path("add_session/", hod_views.add_session, name='add_session'),
@@ -57,6 +60,7 @@ urlpatterns = [
     path("attendance/fetch/", hod_views.get_admin_attendance,
          name='get_admin_attendance'),
     path("student/add/", hod_views.add_student, name='add_student'),
+    path("student/import/", hod_views.import_students, name='import_students'),
     path("subject/add/", hod_views.add_subject, name='add_subject'),
     path("staff/manage/", hod_views.manage_staff, name='manage_staff'),
     path("student/manage/", hod_views.manage_student, name='manage_student'),
@@ -98,6 +102,8 @@ urlpatterns = [
     path("staff/edit-result/", EditResultView.as_view(), name='edit_student_result'),
     path("staff/generate-result/", staff_views.generate_result, name='staff_generate_result'),
     path("staff/download-result/<int:subject_id>/<str:semester>/<str:academic_year>/", staff_views.download_result, name='staff_download_result'),
+    path("staff/export-results/", staff_views.export_results, name='staff_export_results'),
+    path("staff/import-results/", staff_views.import_results, name='staff_import_results'),
     path("staff/apply-leave/", staff_views.staff_apply_leave, name='staff_apply_leave'),
     path("staff/feedback/", staff_views.staff_feedback, name='staff_feedback'),
     path("staff/view/profile", staff_views.staff_view_profile, name='staff_view_profile'),
@@ -147,6 +153,8 @@ urlpatterns = [
     path("student/apply-revaluation/", views.student_apply_revaluation, name='student_apply_revaluation'),
     path("student/revaluation-applications/", views.student_revaluation_applications, name='student_revaluation_applications'),
     path("student/notifications/", views.student_notifications, name='student_notifications'),
+    path("notifications/unread-count/", views.notification_unread_count, name='notification_unread_count'),
+    path("notifications/mark-read/", views.mark_notifications_read, name='mark_notifications_read'),
     path('student/hall-ticket/download/<int:ticket_id>/', views.download_hall_ticket, name='download_hall_ticket'),
 
     # Staff KT and Revaluation Management URLs
@@ -154,12 +162,14 @@ urlpatterns = [
     path("staff/manage-revaluation-applications/", views.staff_manage_revaluation_applications, name='staff_manage_revaluation_applications'),
     path("staff/update-kt-status/<int:application_id>/", views.staff_update_kt_status, name='staff_update_kt_status'),
     path("staff/update-revaluation-status/<int:application_id>/", views.staff_update_revaluation_status, name='staff_update_revaluation_status'),
+    path("staff/bulk-update-applications/<str:kind>/", views.staff_bulk_update_applications, name='staff_bulk_update_applications'),
 
     # Admin KT and Revaluation Management URLs
     path("admin/manage-kt-applications/", views.admin_manage_kt_applications, name='admin_manage_kt_applications'),
     path("admin/manage-revaluation-applications/", views.admin_manage_revaluation_applications, name='admin_manage_revaluation_applications'),
     path("admin/update-kt-status/<int:application_id>/", views.admin_update_kt_status, name='admin_update_kt_status'),
     path("admin/update-revaluation-status/<int:application_id>/", views.admin_update_revaluation_status, name='admin_update_revaluation_status'),
+    path("admin/bulk-update-applications/<str:kind>/", views.admin_bulk_update_applications, name='admin_bulk_update_applications'),
 
     # Hall Ticket URLs
     path('generate-hall-tickets/<int:exam_id>/', views.generate_hall_tickets, name='generate_hall_tickets'),
@@ -1,5 +1,28 @@
-from django.db import transaction
-from .models import HallTicket, Exam, Student
+from django.db import connection
+from .models import Exam
+
+
+class QueryCounter:
+    """
+    Context manager that counts the SQL queries executed inside it.
+    Unlike CaptureQueriesContext it does not need DEBUG and keeps no SQL text.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
 
 def generate_seat_number(row, col):
     """Generate a seat number in the format ROW-COL"""
@@ -9,54 +32,26 @@ def generate_bench_number(row):
     """Generate a bench number based on the row"""
     return f"B{row:02d}"
 
-def allocate_seats(exam_id):
+def allocate_seats(exam_id, hall_ids=None):
     """
     Automatically allocate seats and bench numbers to students for an exam.
+    The exam's own hall is filled first, then any extra `hall_ids`.
+    Students who already hold a ticket for the exam are skipped, so re-runs
+    only fill in newcomers. Capacity is checked before anything is written
+    and all tickets are inserted with a single bulk_create.
     Returns a list of created HallTicket objects.
     """
+    from .seating import allocate_exam_seating
+
     exam = Exam.objects.get(id=exam_id)
-    hall = exam.hall
-    
-    # Get all students enrolled in the course
-    students = Student.objects.filter(course=exam.course)
-    
-    created_tickets = []
-    current_row = 1
-    current_col = 1
-    
-    with transaction.atomic():
-        for student in students:
-            # Generate seat and bench numbers
-            seat_number = generate_seat_number(current_row, current_col)
-            bench_number = generate_bench_number(current_row)
-            
-            # Create hall ticket
-            hall_ticket = HallTicket.objects.create(
-                student=student,
-                exam=exam,
-                seat_number=seat_number,
-                bench_number=bench_number
-            )
-            created_tickets.append(hall_ticket)
-            
-            # Update position for next student
-            current_col += 1
-            if current_col > hall.columns:
-                current_col = 1
-                current_row += 1
-                
-            # Check if we've exceeded hall capacity
-            if current_row > hall.rows:
-                raise ValueError("Hall capacity exceeded")
-    
-    return created_tickets
-
-def generate_hall_tickets_for_exam(exam_id):
+    return allocate_exam_seating([exam.id], [exam.hall_id] + list(hall_ids or []))
+
+def generate_hall_tickets_for_exam(exam_id, hall_ids=None):
     """
     Generate hall tickets for all students in an exam.
     This function handles the entire process of hall ticket generation.
     """
     try:
-        return allocate_seats(exam_id)
+        return allocate_seats(exam_id, hall_ids)
     except Exception as e:
         raise Exception(f"Failed to generate hall tickets: {str(e)}") 
\ No newline at end of file
@@ -2,7 +2,7 @@ import json
 import requests
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render, reverse
 from django.views.decorators.csrf import csrf_exempt
 from datetime import datetime
@@ -14,6 +14,8 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.db.models import Q
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
 import re
 from django.template.loader import render_to_string
 import tempfile
@@ -24,8 +26,11 @@ except (ImportError, OSError):
     pisa = None
 
 PDF_GENERATION_AVAILABLE = pisa is not None
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 
 def is_staff(user):
     return user.user_type == '2'
@@ -33,13 +38,24 @@ def is_staff(user):
 def is_admin(user):
     return user.user_type == '1'
 
+from .applications import (ApplicationDecisionError, application_queue, bulk_decide_applications, decide_applications,
+                           queue_filters, revaluation_marks)
+from .attendance import AttendanceValidationError, correct_attendance
+from .chatbot import get_chatbot_index
+from .hall_ticket_pdf import (get_hall_ticket_pdf, hall_ticket_pdf_key, hall_ticket_pdf_path, hall_ticket_queryset,
+                              queue_pregeneration)
 from .EmailBackend import EmailBackend
-from .models import Attendance, Session, Subject, ExamHall, Exam, HallTicket, Course, ExamSubject, KTApplication, RevaluationApplication, Notification, StudentResult, Student, ChatBot, AttendanceReport
+from .eligibility import kt_eligibility, revaluation_eligibility
+from .inbox import mark_read, unread_count, user_inbox
+from .middleware import get_profile
+from .permissions import HOD, STAFF, STUDENT, public, roles
+from .models import Attendance, Session, Subject, ExamHall, Exam, HallTicket, Course, ExamSubject, KTApplication, RevaluationApplication, StudentResult, Student, Staff, AttendanceReport
 from .utils import generate_hall_tickets_for_exam
 
 # Create your views here.
 
 
+@public
 def login_page(request):
     if request.user.is_authenticated:
         if request.user.user_type == '1':
@@ -51,6 +67,7 @@ def login_page(request):
     return render(request, 'main_app/login.html')
 
 
+@public
 def doLogin(request, **kwargs):
     if request.method != 'POST':
         return HttpResponse("<h4>Denied</h4>")
@@ -169,6 +186,7 @@ messaging.setBackgroundMessageHandler(function (payload) {
     """
     return HttpResponse(data, content_type='application/javascript')
 
+@roles(HOD)
 def manage_exam_halls(request):
     """View for managing exam halls"""
     if request.user.user_type != '1':  # Only HOD can access
@@ -180,6 +198,7 @@ def manage_exam_halls(request):
     }
     return render(request, 'main_app/hod/manage_exam_halls.html', context)
 
+@roles(HOD)
 def add_exam_hall(request):
     """View for adding new exam hall"""
     if request.user.user_type != '1':  # Only HOD can access
@@ -202,6 +221,7 @@ def add_exam_hall(request):
     
     return render(request, 'main_app/hod/add_exam_hall.html')
 
+@roles(HOD)
 def manage_exams(request):
     """View for managing exams"""
     if request.user.user_type != '1':  # Only HOD can access
@@ -213,6 +233,7 @@ def manage_exams(request):
     }
     return render(request, 'main_app/hod/manage_exams.html', context)
 
+@roles(HOD)
 @login_required
 def add_exam(request):
     if request.user.user_type != '1':
@@ -267,19 +288,27 @@ def add_exam(request):
     }
     return render(request, 'main_app/hod/add_exam.html', context)
 
+@roles(HOD)
 def generate_hall_tickets(request, exam_id):
     """View for generating hall tickets for an exam"""
     if request.user.user_type != '1':  # Only HOD can access
         return redirect('login_page')
     
+    # Extra halls (?halls=2&halls=3) are filled once the exam's own hall is full
+    hall_ids = [int(hall_id) for hall_id in request.GET.getlist('halls') if hall_id.isdigit()]
     try:
-        tickets = generate_hall_tickets_for_exam(exam_id)
+        tickets = generate_hall_tickets_for_exam(exam_id, hall_ids)
         messages.success(request, f'Successfully generated {len(tickets)} hall tickets')
+        # ?pregenerate=1 queues every PDF for `pregenerate_hall_tickets --pending` before exam day
+        if request.GET.get('pregenerate') and tickets:
+            queue_pregeneration(exam_id)
+            messages.info(request, 'Hall ticket PDFs are queued to be rendered in the background')
     except Exception as e:
         messages.error(request, str(e))
     
     return redirect('manage_exams')
 
+@roles(HOD)
 def view_hall_tickets(request, exam_id):
     """View for viewing hall tickets of an exam"""
     if request.user.user_type != '1':  # Only HOD can access
@@ -287,7 +316,7 @@ def view_hall_tickets(request, exam_id):
     
     try:
         exam = get_object_or_404(Exam, id=exam_id)
-        tickets = HallTicket.objects.filter(exam=exam)
+        tickets = HallTicket.objects.filter(exam=exam).select_related('hall', 'exam__hall', 'student__admin')
         context = {
             'exam': exam,
             'tickets': tickets
@@ -297,13 +326,14 @@ def view_hall_tickets(request, exam_id):
         messages.error(request, f"Error loading hall tickets: {str(e)}")
         return redirect('manage_exams')
 
+@roles(STUDENT)
 def student_hall_ticket(request):
     """View for students to view their hall ticket"""
     if request.user.user_type != '3':  # Only students can access
         return redirect('login_page')
     
     try:
-        student = request.user.student
+        student = get_profile(request, Student)
         tickets = HallTicket.objects.filter(student=student)
         context = {
             'tickets': tickets
@@ -313,32 +343,26 @@ def student_hall_ticket(request):
         messages.error(request, f"Error loading hall tickets: {str(e)}")
         return redirect('student_home')
 
+@roles(STUDENT)
 @login_required(login_url='login')
 def student_apply_kt(request):
-    student = get_object_or_404(Student, admin=request.user)
-    
-    # Get all subjects for the student's course
-    subjects = Subject.objects.filter(course=student.course_id)
-    
-    # Get failed subjects (where grade is 'F')
-    failed_subjects = []
-    for subject in subjects:
-        result = StudentResult.objects.filter(
-            student=student,
-            subject=subject
-        ).first()
-        if result and result.grade == 'F':
-            failed_subjects.append(subject)
+    student = get_profile(request, Student)
     
-    # Get existing KT applications
-    existing_applications = KTApplication.objects.filter(student=student)
+    # Failed subjects and existing applications, independent of the number of subjects
+    eligibility = kt_eligibility(student)
     
     if request.method == 'POST':
         subject_id = request.POST.get('subject')
         subject = get_object_or_404(Subject, id=subject_id)
         
+        # Only subjects with a failing latest result qualify
+        result = eligibility['results'].get(subject.id)
+        if result is None:
+            messages.error(request, f"You have not failed {subject.name}")
+            return redirect('student_apply_kt')
+        
         # Check if application already exists
-        if KTApplication.objects.filter(student=student, subject=subject).exists():
+        if any(application.subject_id == subject.id for application in eligibility['applications']):
             messages.error(request, f"You have already applied for KT in {subject.name}")
             return redirect('student_apply_kt')
         
@@ -346,6 +370,7 @@ def student_apply_kt(request):
         KTApplication.objects.create(
             student=student,
             subject=subject,
+            semester=result.semester,
             status='pending'
         )
         messages.success(request, f"Successfully applied for KT in {subject.name}")
@@ -353,19 +378,19 @@ def student_apply_kt(request):
     
     context = {
         'student': student,
-        'subjects': subjects,
-        'failed_subjects': failed_subjects,
-        'existing_applications': existing_applications,
+        'failed_subjects': eligibility['subjects'],
+        'existing_applications': eligibility['applications'],
         'page_title': 'Apply for KT'
     }
     return render(request, 'student_template/apply_kt.html', context)
 
+@roles(STUDENT)
 @login_required
 def student_kt_applications(request):
     if request.user.user_type != '3':
         return redirect('login_page')
     
-    student = request.user.student
+    student = get_profile(request, Student)
     applications = KTApplication.objects.filter(student=student).order_by('-created_at')
     context = {
         'applications': applications,
@@ -373,38 +398,29 @@ def student_kt_applications(request):
     }
     return render(request, 'main_app/student/kt_applications.html', context)
 
+@roles(STUDENT)
 @login_required(login_url='login')
 def student_apply_revaluation(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = get_profile(request, Student)
     
-    # Get all subjects for the student's course
-    subjects = Subject.objects.filter(course=student.course_id)
-    
-    # Get all subjects that have results
-    revaluation_subjects = []
-    for subject in subjects:
-        result = StudentResult.objects.filter(
-            student=student,
-            subject=subject
-        ).first()
-        if result:
-            revaluation_subjects.append(subject)
-    
-    # Get existing revaluation applications
-    existing_applications = RevaluationApplication.objects.filter(student=student)
+    # Graded subjects and existing applications, independent of the number of subjects
+    eligibility = revaluation_eligibility(student)
     
     if request.method == 'POST':
         subject_id = request.POST.get('subject')
         subject = get_object_or_404(Subject, id=subject_id)
         
+        # The latest result for the subject is the one being revalued
+        result = eligibility['results'].get(subject.id)
+        if result is None:
+            messages.error(request, f"There is no result to revalue in {subject.name}")
+            return redirect('student_apply_revaluation')
+        
         # Check if application already exists
-        if RevaluationApplication.objects.filter(student=student, subject=subject).exists():
+        if any(application.subject_id == subject.id for application in eligibility['applications']):
             messages.error(request, f"You have already applied for revaluation in {subject.name}")
             return redirect('student_apply_revaluation')
         
-        # Get the current result for the subject
-        result = StudentResult.objects.get(student=student, subject=subject)
-        
         # Create new application
         RevaluationApplication.objects.create(
             student=student,
@@ -418,19 +434,19 @@ def student_apply_revaluation(request):
     
     context = {
         'student': student,
-        'subjects': subjects,
-        'revaluation_subjects': revaluation_subjects,
-        'existing_applications': existing_applications,
+        'revaluation_subjects': eligibility['subjects'],
+        'existing_applications': eligibility['applications'],
         'page_title': 'Apply for Revaluation'
     }
     return render(request, 'student_template/apply_revaluation.html', context)
 
+@roles(STUDENT)
 @login_required
 def student_revaluation_applications(request):
     if request.user.user_type != '3':
         return redirect('login_page')
     
-    student = request.user.student
+    student = get_profile(request, Student)
     applications = RevaluationApplication.objects.filter(student=student).order_by('-created_at')
     context = {
         'applications': applications,
@@ -438,111 +454,51 @@ def student_revaluation_applications(request):
     }
     return render(request, 'main_app/student/revaluation_applications.html', context)
 
+@roles(STAFF)
 @login_required(login_url='login')
 @user_passes_test(is_staff)
 def staff_manage_kt_applications(request):
-    kt_applications = KTApplication.objects.all().order_by('-created_at')
-    return render(request, 'main_app/staff/manage_kt_applications.html', {
-        'kt_applications': kt_applications
-    })
+    context = application_queue(KTApplication, request.GET)
+    context['kt_applications'] = context['page']
+    return render(request, 'main_app/staff/manage_kt_applications.html', context)
 
+@roles(STAFF)
 @login_required(login_url='login')
 @user_passes_test(is_staff)
 def staff_manage_revaluation_applications(request):
-    revaluation_applications = RevaluationApplication.objects.all().order_by('-created_at')
-    return render(request, 'main_app/staff/manage_revaluation_applications.html', {
-        'revaluation_applications': revaluation_applications
-    })
+    context = application_queue(RevaluationApplication, request.GET)
+    context['revaluation_applications'] = context['page']
+    return render(request, 'main_app/staff/manage_revaluation_applications.html', context)
 
+@roles(STAFF)
 @login_required(login_url='login')
 @user_passes_test(is_staff)
 def staff_update_kt_status(request, application_id):
     if request.method == 'POST':
-        application = get_object_or_404(KTApplication, id=application_id)
-        status = request.POST.get('status')
-        remarks = request.POST.get('remarks')
-        
-        application.status = status
-        application.remarks = remarks
-        application.save()
-        
-        # Create notification for student
-        Notification.objects.create(
-            user=application.student.admin,
-            title='KT Application Update',
-            message=f'Your KT application for {application.subject.name} has been {status}. Remarks: {remarks}',
-            notification_type='kt'
-        )
-        
-        messages.success(request, 'KT application status updated successfully.')
+        get_object_or_404(KTApplication, id=application_id)
+        try:
+            decide_applications(KTApplication.objects.filter(id=application_id),
+                                request.POST.get('status'), request.POST.get('remarks'))
+            messages.success(request, 'KT application status updated successfully.')
+        except ApplicationDecisionError as e:
+            messages.error(request, str(e))
     return redirect('staff_manage_kt_applications')
 
+@roles(STAFF)
 @login_required(login_url='login')
 @user_passes_test(is_staff)
 def staff_update_revaluation_status(request, application_id):
     if request.method == 'POST':
-        application = get_object_or_404(RevaluationApplication, id=application_id)
+        get_object_or_404(RevaluationApplication, id=application_id)
         status = request.POST.get('status')
-        remarks = request.POST.get('remarks')
-        
-        application.status = status
-        application.remarks = remarks
-        application.save()
-        
-        if status == 'approved':
-            try:
-                # Get the marks from the form
-                internal_marks = float(request.POST.get('internal_marks', 0))
-                external_marks = float(request.POST.get('external_marks', 0))
-                practical_marks = float(request.POST.get('practical_marks', 0))
-                
-                # Update the result
-                result = StudentResult.objects.get(
-                    student=application.student,
-                    subject=application.subject,
-                    semester=application.semester
-                )
-                
-                result.internal_marks = internal_marks
-                result.external_marks = external_marks
-                result.practical_marks = practical_marks
-                result.total_marks = internal_marks + external_marks + practical_marks
-                
-                # Calculate grade based on total marks
-                total = result.total_marks
-                if total >= 90:
-                    result.grade = 'A+'
-                elif total >= 80:
-                    result.grade = 'A'
-                elif total >= 70:
-                    result.grade = 'B+'
-                elif total >= 60:
-                    result.grade = 'B'
-                elif total >= 50:
-                    result.grade = 'C'
-                else:
-                    result.grade = 'F'
-                
-                result.save()
-
-                # Create notification for student
-                Notification.objects.create(
-                    user=application.student.admin,
-                    title='Revaluation Result Update',
-                    message=f'Your revaluation application for {application.subject.name} has been {status}. New total marks: {result.total_marks}. Grade: {result.grade}. Remarks: {remarks}',
-                    notification_type='revaluation'
-                )
-            except Exception as e:
-                messages.error(request, f'Error updating marks: {str(e)}')
-                return redirect('staff_manage_revaluation_applications')
-        else:
-            # Create notification for rejected status
-            Notification.objects.create(
-                user=application.student.admin,
-                title='Revaluation Application Update',
-                message=f'Your revaluation application for {application.subject.name} has been {status}. Remarks: {remarks}',
-                notification_type='revaluation'
-            )
+        try:
+            # Approving takes the revalued marks from the form; the result is re-graded with them
+            marks = {application_id: revaluation_marks(request.POST)} if status == 'approved' else None
+            decide_applications(RevaluationApplication.objects.filter(id=application_id),
+                                status, request.POST.get('remarks'), marks)
+        except ValueError as e:
+            messages.error(request, f'Error updating marks: {str(e)}')
+            return redirect('staff_manage_revaluation_applications')
         
         messages.success(request, 'Revaluation application status updated successfully.')
         return redirect('staff_manage_revaluation_applications')
@@ -550,83 +506,116 @@ def staff_update_revaluation_status(request, application_id):
     return redirect('staff_manage_revaluation_applications')
 
 # Admin views for KT and Revaluation management
+@roles(HOD)
 @login_required(login_url='login')
 @user_passes_test(is_admin)
 def admin_manage_kt_applications(request):
-    kt_applications = KTApplication.objects.all().order_by('-created_at')
-    return render(request, 'main_app/admin/manage_kt_applications.html', {
-        'kt_applications': kt_applications
-    })
+    context = application_queue(KTApplication, request.GET)
+    context['kt_applications'] = context['page']
+    return render(request, 'main_app/admin/manage_kt_applications.html', context)
 
+@roles(HOD)
 @login_required(login_url='login')
 @user_passes_test(is_admin)
 def admin_manage_revaluation_applications(request):
-    revaluation_applications = RevaluationApplication.objects.all().order_by('-created_at')
-    return render(request, 'main_app/admin/manage_revaluation_applications.html', {
-        'revaluation_applications': revaluation_applications
-    })
+    context = application_queue(RevaluationApplication, request.GET)
+    context['revaluation_applications'] = context['page']
+    return render(request, 'main_app/admin/manage_revaluation_applications.html', context)
 
+@roles(HOD)
 @login_required(login_url='login')
 @user_passes_test(is_admin)
 def admin_update_kt_status(request, application_id):
     if request.method == 'POST':
-        application = get_object_or_404(KTApplication, id=application_id)
-        status = request.POST.get('status')
-        remarks = request.POST.get('remarks')
-        
-        application.status = status
-        application.remarks = remarks
-        application.save()
-        
-        # Create notification for student
-        Notification.objects.create(
-            user=application.student.admin,
-            title='KT Application Update',
-            message=f'Your KT application for {application.subject.name} has been {status}. Remarks: {remarks}',
-            notification_type='kt'
-        )
-        
-        messages.success(request, 'KT application status updated successfully.')
+        get_object_or_404(KTApplication, id=application_id)
+        try:
+            decide_applications(KTApplication.objects.filter(id=application_id),
+                                request.POST.get('status'), request.POST.get('remarks'))
+            messages.success(request, 'KT application status updated successfully.')
+        except ApplicationDecisionError as e:
+            messages.error(request, str(e))
     return redirect('admin_manage_kt_applications')
 
+@roles(HOD)
 @login_required(login_url='login')
 @user_passes_test(is_admin)
 def admin_update_revaluation_status(request, application_id):
     if request.method == 'POST':
-        application = get_object_or_404(RevaluationApplication, id=application_id)
-        status = request.POST.get('status')
-        remarks = request.POST.get('remarks')
-        
-        application.status = status
-        application.remarks = remarks
-        application.save()
-        
-        # Create notification for student
-        Notification.objects.create(
-            user=application.student.admin,
-            title='Revaluation Application Update',
-            message=f'Your revaluation application for {application.subject.name} has been {status}. Remarks: {remarks}',
-            notification_type='revaluation'
-        )
-        
-        messages.success(request, 'Revaluation application status updated successfully.')
+        get_object_or_404(RevaluationApplication, id=application_id)
+        try:
+            decide_applications(RevaluationApplication.objects.filter(id=application_id),
+                                request.POST.get('status'), request.POST.get('remarks'))
+            messages.success(request, 'Revaluation application status updated successfully.')
+        except ApplicationDecisionError as e:
+            messages.error(request, str(e))
     return redirect('admin_manage_revaluation_applications')
 
+APPLICATION_MODELS = {'kt': KTApplication, 'revaluation': RevaluationApplication}
+
+
+def _bulk_update_applications(request, kind, queue):
+    model = APPLICATION_MODELS.get(kind)
+    if model is None:
+        raise Http404
+    if request.method == 'POST':
+        try:
+            counts = bulk_decide_applications(model, request.POST)
+            message = f"{counts['updated']} application(s) marked {request.POST.get('decision')}."
+            if counts['regraded']:
+                message += f" {counts['regraded']} result(s) re-graded."
+            messages.success(request, message)
+        except ApplicationDecisionError as e:
+            details = ', '.join(f"{error['student']} ({error['subject']})" for error in e.errors)
+            messages.error(request, f'{e}: {details}' if details else str(e))
+        except ValueError as e:
+            messages.error(request, f'Error updating marks: {str(e)}')
+    filters = {name: value for name, value in queue_filters(request.POST, 'filter_').items() if value}
+    return redirect(f"{reverse(f'{queue}_{kind}_applications')}?{urlencode(filters)}")
+
+@roles(STAFF)
+@login_required(login_url='login')
+@user_passes_test(is_staff)
+def staff_bulk_update_applications(request, kind):
+    return _bulk_update_applications(request, kind, 'staff_manage')
+
+@roles(HOD)
+@login_required(login_url='login')
+@user_passes_test(is_admin)
+def admin_bulk_update_applications(request, kind):
+    return _bulk_update_applications(request, kind, 'admin_manage')
+
+@roles(STUDENT)
 @login_required(login_url='login')
 def student_notifications(request):
     if request.user.user_type != '3':
         return redirect('login_page')
-    
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    # Mark notifications as read when viewed
-    notifications.update(is_read=True)
-    
+
+    page = user_inbox(request.user, request.GET)
+    # Only what was on screen counts as read, and only rows still unread are written
+    mark_read(request.user, [notification.id for notification in page if not notification.is_read])
+
     context = {
-        'notifications': notifications,
+        'notifications': page,
+        'page': page,
+        'filter_query': '',
         'page_title': 'My Notifications'
     }
     return render(request, 'main_app/student/notifications.html', context)
 
+
+@login_required(login_url='login')
+def notification_unread_count(request):
+    return JsonResponse({'status': 'success', 'unread': unread_count(request.user)})
+
+
+@login_required(login_url='login')
+def mark_notifications_read(request):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    ids = [value for value in request.POST.getlist('notification') if value.isdigit()]
+    updated = mark_read(request.user, ids or None)
+    return JsonResponse({'status': 'success', 'updated': updated, 'unread': unread_count(request.user)})
+
 @csrf_exempt
 def get_students(request):
     print("[DEBUG] get_students view called")
@@ -741,13 +730,14 @@ def save_result(request):
             'message': f'Error saving result: {str(e)}'
         }, status=500)
 
+@roles(STAFF)
 @login_required
 def add_result(request):
     if request.user.user_type != '2':  # Only staff can access
         return redirect('login_page')
         
     try:
-        staff = request.user.staff
+        staff = get_profile(request, Staff)
         # Get subjects taught by this staff member
         subjects = Subject.objects.filter(staff=staff).select_related('course')
         print(f"[DEBUG] Found {subjects.count()} subjects for staff")
@@ -775,52 +765,6 @@ def chatbot_query(request):
             data = json.loads(request.body)
             query = data.get('query', '').strip().lower()
             
-            # Get all chatbot entries
-            all_entries = ChatBot.objects.all()
-            
-            # Initialize best match variables
-            best_match = None
-            best_score = 0
-            
-            # Enhanced keywords for different categories with synonyms
-            category_keywords = {
-                'academic': [
-                    'cgpa', 'attendance', 'kt', 'atkt', 'leave', 'internal', 'grade', 'result',
-                    'marks', 'score', 'study', 'exam', 'test', 'assignment', 'project', 'semester',
-                    'course', 'subject', 'class', 'lecture', 'teacher', 'professor', 'faculty'
-                ],
-                'library': [
-                    'book', 'library', 'borrow', 'fine', 'return', 'study', 'read', 'textbook',
-                    'reference', 'journal', 'magazine', 'research', 'paper', 'publication',
-                    'digital', 'online', 'database', 'catalog', 'shelf', 'librarian'
-                ],
-                'exams': [
-                    'exam', 'hall ticket', 'grade', 'result', 'paper', 'question', 'test',
-                    'midterm', 'final', 'semester', 'schedule', 'date', 'time', 'venue',
-                    'room', 'hall', 'seat', 'admit card', 'marksheet', 'answer sheet'
-                ],
-                'fees': [
-                    'fee', 'payment', 'money', 'pay', 'receipt', 'scholarship', 'tuition',
-                    'cost', 'expense', 'charge', 'due', 'installment', 'refund', 'discount',
-                    'concession', 'financial', 'bank', 'transaction', 'online payment'
-                ],
-                'hostel': [
-                    'hostel', 'room', 'mess', 'food', 'stay', 'accommodation', 'boarding',
-                    'lodging', 'residence', 'dormitory', 'meal', 'dining', 'laundry',
-                    'facility', 'amenity', 'furniture', 'maintenance', 'security'
-                ],
-                'technical': [
-                    'portal', 'password', 'login', 'access', 'website', 'app', 'system',
-                    'computer', 'internet', 'network', 'email', 'account', 'profile',
-                    'settings', 'update', 'download', 'upload', 'file', 'document'
-                ],
-                'general': [
-                    'support', 'help', 'contact', 'profile', 'id card', 'document',
-                    'information', 'guide', 'assistance', 'service', 'office', 'department',
-                    'staff', 'admin', 'head', 'principal', 'campus', 'facility'
-                ]
-            }
-            
             # Common greetings and farewells
             greetings = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening']
             farewells = ['bye', 'goodbye', 'see you', 'thank you', 'thanks']
@@ -841,75 +785,16 @@ def chatbot_query(request):
                     'category': 'general'
                 })
             
-            # Function to calculate similarity score with enhanced matching
-            def calculate_similarity(q1, q2):
-                # Convert to sets for word matching
-                words1 = set(q1.split())
-                words2 = set(q2.split())
-                
-                # Calculate Jaccard similarity
-                intersection = len(words1.intersection(words2))
-                union = len(words1.union(words2))
-                
-                if union == 0:
-                    return 0
-                
-                # Add bonus for exact phrase matches
-                if q1 in q2 or q2 in q1:
-                    return 1.0
-                
-                # Add bonus for word order similarity
-                words1_list = q1.split()
-                words2_list = q2.split()
-                order_similarity = sum(1 for i in range(min(len(words1_list), len(words2_list)))
-                                    if words1_list[i] == words2_list[i]) / max(len(words1_list), len(words2_list))
-                
-                return (intersection / union) + (order_similarity * 0.2)
-            
-            # Function to check if query contains category keywords with context
-            def get_category_score(query, category):
-                score = 0
-                words = query.split()
-                
-                # Check for exact keyword matches
-                for keyword in category_keywords.get(category, []):
-                    if keyword in query:
-                        score += 1
-                
-                # Check for related words and context
-                for word in words:
-                    for keyword in category_keywords.get(category, []):
-                        if word in keyword or keyword in word:
-                            score += 0.5
-                
-                return score
-            
-            # Find best match with context
-            for entry in all_entries:
-                # Calculate similarity with the question
-                similarity = calculate_similarity(query, entry.question.lower())
-                
-                # Add category keyword bonus
-                category_score = get_category_score(query, entry.category)
-                similarity += (category_score * 0.1)  # Add 10% bonus for each matching keyword
-                
-                # Add context bonus for related words
-                if any(word in query for word in entry.question.lower().split()):
-                    similarity += 0.2
-                
-                # Update best match if this is better
-                if similarity > best_score:
-                    best_score = similarity
-                    best_match = entry
+            # Score the query against the in-memory FAQ index
+            index = get_chatbot_index()
+            best_match, best_score = index.best_match(query)
             
             # If we have a good match (similarity > 0.3)
             if best_match and best_score > 0.3:
                 response = best_match.answer
                 
                 # Add related questions based on category and context
-                related_questions = ChatBot.objects.filter(
-                    category=best_match.category
-                ).exclude(id=best_match.id)[:3]
+                related_questions = index.related(best_match, 3)
                 
                 if related_questions:
                     response += "\n\nRelated questions you might want to ask:\n"
@@ -977,7 +862,7 @@ def chatbot_query(request):
 
 def download_hall_ticket(request, ticket_id):
     try:
-        ticket = HallTicket.objects.get(id=ticket_id)
+        ticket = hall_ticket_queryset().get(id=ticket_id)
         
         # Check if user is HOD or Staff
         if request.user.user_type in ['1', '2']:
@@ -986,48 +871,52 @@ def download_hall_ticket(request, ticket_id):
         # Check if user is a student
         elif request.user.user_type == '3':
             try:
-                student = request.user.student
-                if ticket.student != student:
+                student = get_profile(request, Student)
+                if ticket.student_id != student.id:
                     messages.error(request, "You don't have permission to download this hall ticket")
                     return redirect('student_hall_ticket')
-            except Student.DoesNotExist:
+            except Http404:
                 messages.error(request, "Student profile not found")
                 return redirect('student_home')
         else:
             messages.error(request, "You don't have permission to download hall tickets")
             return redirect('login_page')
         
-        # Render the hall ticket template
-        context = {
-            'ticket': ticket
-        }
+        # Answer revalidations from the key alone; the PDF is only rendered on a cache miss
+        key = hall_ticket_pdf_key(ticket)
+        path = hall_ticket_pdf_path(ticket, key)
+        if os.path.exists(path):
+            not_modified = get_conditional_response(
+                request, etag=f'"{key}"', last_modified=int(os.path.getmtime(path))
+            )
+            if not_modified is not None:
+                patch_cache_control(not_modified, private=True, no_cache=True)
+                return not_modified
         
         if not PDF_GENERATION_AVAILABLE:
             messages.error(request, "PDF generation is not available. Please install xhtml2pdf.")
             return redirect('student_hall_ticket')
 
-        html_string = render_to_string('main_app/student/hall_ticket_pdf.html', context)
-        
-        # Create PDF
-        buffer = BytesIO()
-        pisa_status = pisa.pisaDocument(BytesIO(html_string.encode("UTF-8")), buffer)
-        
-        if pisa_status.err:
-             messages.error(request, "Error generating PDF")
-             return redirect('student_hall_ticket')
-            
-        # Get the value of the BytesIO buffer and write it to the response
-        pdf = buffer.getvalue()
-        buffer.close()
+        try:
+            path, key = get_hall_ticket_pdf(ticket)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('student_hall_ticket')
         
-        response = HttpResponse(pdf, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename=hall_ticket_{ticket.hall_ticket_number}.pdf'
+        response = FileResponse(
+            open(path, 'rb'), content_type='application/pdf',
+            as_attachment=True, filename=f'hall_ticket_{ticket.hall_ticket_number}.pdf'
+        )
+        response['ETag'] = f'"{key}"'
+        response['Last-Modified'] = http_date(os.path.getmtime(path))
+        patch_cache_control(response, private=True, no_cache=True)
         return response
     except Exception as e:
         print(f"[DEBUG] Error generating hall ticket PDF: {str(e)}")
         messages.error(request, f"Error generating hall ticket: {str(e)}")
         return redirect('student_hall_ticket')
 
+@roles(HOD)
 def delete_hall_ticket(request, ticket_id):
     """View for deleting a hall ticket"""
     if request.user.user_type != '1':  # Only HOD can delete
@@ -1044,6 +933,7 @@ def delete_hall_ticket(request, ticket_id):
         messages.error(request, f"Error deleting hall ticket: {str(e)}")
         return redirect('manage_exams')
 
+@roles(HOD)
 def delete_exam(request, exam_id):
     """View for deleting an exam"""
     if request.user.user_type != '1':  # Only HOD can delete
@@ -1068,13 +958,14 @@ def delete_exam(request, exam_id):
         messages.error(request, f"Error deleting exam: {str(e)}")
         return redirect('manage_exams')
 
+@roles(STAFF)
 def staff_result(request):
     """View for staff to view and manage results"""
     if request.user.user_type != '2':  # Only staff can access
         return redirect('login_page')
     
     try:
-        staff = request.user.staff
+        staff = get_profile(request, Staff)
         subjects = Subject.objects.filter(staff=staff)
         semesters = ['1', '2', '3', '4', '5', '6', '7', '8']  # All 8 semesters
         academic_years = ['2023-24', '2024-25']  # Add more years as needed
@@ -1089,13 +980,14 @@ def staff_result(request):
         messages.error(request, f"Error loading results: {str(e)}")
         return redirect('staff_home')
 
+@roles(STUDENT)
 def student_view_result(request):
     """View for students to view their results"""
     if request.user.user_type != '3':  # Only students can access
         return redirect('login_page')
     
     try:
-        student = request.user.student
+        student = get_profile(request, Student)
         semesters = ['1', '2', '3', '4', '5', '6', '7', '8']  # Added semester 8
         academic_years = ['2023-24', '2024-25']  # Add more years as needed
         
@@ -1109,13 +1001,14 @@ def student_view_result(request):
         messages.error(request, f"Error loading results: {str(e)}")
         return redirect('student_home')
 
+@roles(STUDENT)
 def student_download_result(request):
     """View for students to download their results"""
     if request.user.user_type != '3':  # Only students can access
         return redirect('login_page')
     
     try:
-        student = request.user.student
+        student = get_profile(request, Student)
         semester = request.GET.get('semester', '')
         academic_year = request.GET.get('academic_year', '')
         
@@ -1210,41 +1103,23 @@ def update_attendance(request):
             return JsonResponse({'error': 'Missing required data'}, status=400)
             
         students = json.loads(student_data)
-        attendance = get_object_or_404(Attendance, id=date)
+        attendance = Attendance.objects.filter(id=date).first() if date.isdigit() else None
+        if attendance is None:
+            return JsonResponse({'error': 'Attendance record not found'}, status=404)
         
-        for student_dict in students:
-            student = get_object_or_404(Student, id=student_dict.get('id'))
-            attendance_report = AttendanceReport.objects.filter(
-                student=student, 
-                attendance=attendance
-            ).first()
-            
-            if attendance_report:
-                attendance_report.status = student_dict.get('status')
-                attendance_report.save()
-            else:
-                # Create new attendance report if it doesn't exist
-                AttendanceReport.objects.create(
-                    student=student,
-                    attendance=attendance,
-                    status=student_dict.get('status')
-                )
-                
+        # All or nothing: one unknown student rejects the whole correction
+        correct_attendance(attendance, students, partial=False)
         return HttpResponse("OK")
     except json.JSONDecodeError:
-        print("Error: Invalid JSON data received")
         return JsonResponse({'error': 'Invalid data format'}, status=400)
-    except Student.DoesNotExist:
-        print("Error: Student not found")
-        return JsonResponse({'error': 'Student not found'}, status=404)
-    except Attendance.DoesNotExist:
-        print("Error: Attendance record not found")
-        return JsonResponse({'error': 'Attendance record not found'}, status=404)
+    except AttendanceValidationError as e:
+        return JsonResponse({'error': str(e), 'errors': e.errors}, status=400)
     except Exception as e:
-        print(f"Error in update_attendance: {str(e)}")
+        logger.exception('Error in update_attendance')
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@public
 def setup_admin(request):
     """
     Emergency view to create admin user manually if scripts fail.